@@ -0,0 +1,274 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+''' The purpose of this module is to scrape the content of
+    the http://books.toscrape.com/ website with coroutines
+    (a single event loop instead of a thread per request).
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urljoin
+import asyncio
+import math
+
+from async_session import AsyncHTTPSession
+from book import Book, as_str, parse_product
+from category import Category, LISTING_STRAINER
+from layout import OutputLayout
+from scraper import HOME_STRAINER
+from policy import fetch_policy
+from metrics import metrics
+from utils import progress_monitor, FileIO, log_error, report_error
+
+
+##################################################
+# AsyncScraper
+##################################################
+
+
+class AsyncScraper:
+    """ The purpose of this class is to collect and store the whole
+        books of the website, as the Scraper class does, with all the
+        requests sent as coroutines on a single event loop
+
+    The home page, the listing pages, the product pages and the images
+    are fetched through an AsyncHTTPSession, at most max_requests at
+    the same time. The output ('data' folder, CSV files and images)
+    is the same as the Scraper one. The pages are parsed in a pool of
+    threads with the parser selected by FileIO.set_parser, or in the parse
+    workers for the product pages (see FileIO.set_parse_workers), and the
+    images are saved through FileIO.download_image in the same threads,
+    so the event loop is never blocked by the parsing or the disk.
+
+    Attributes
+    ----------
+    site_url : str
+    categories : list
+        the collected Category instances (in the menu order)
+    links : list
+    num_books : int
+    max_requests : int
+        the maximum number of requests in flight
+    dl_image : bool
+        determine if the images are downloaded on local drive
+    pool_size : int
+        the maximum number of idle connections kept open per host
+    timeout : float
+        the number of seconds before a request is aborted
+    layout : OutputLayout
+        the paths of the output (default is the 'data' folder)
+    root : str
+        the absolute path of the output folder (None until collected)
+    session : AsyncHTTPSession
+        the session used by the last collect (None until collected)
+
+    Methods
+    -------
+    collect()
+        run the event loop until the whole website is collected
+    collect_async()
+        coroutine collecting the whole website
+    """
+
+    def __init__(self, url, max_requests=100, dl_image=True, pool_size=100,
+                 timeout=30, layout=None):
+        self.site_url = url
+        self.links = []
+        self.categories = []
+        self.num_books = 0
+        self.max_requests = max_requests
+        self.dl_image = dl_image
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.layout = layout or OutputLayout('data')
+        self.root = None
+        self.session = None
+
+        if url is not None:
+            self.collect()
+
+    def collect(self):
+        """ Run the event loop until the whole website is collected """
+        asyncio.run(self.collect_async())
+
+    async def collect_async(self):
+        """ Connect to the home-page and grab the information """
+
+        self.session = AsyncHTTPSession(self.pool_size, self.timeout)
+        self._budget = asyncio.Semaphore(self.max_requests)
+        self._loop = asyncio.get_running_loop()
+        self._executor = ThreadPoolExecutor(self.max_requests)
+
+        try:
+            soup = await self.__parse(await self.__fetch(self.site_url),
+                                      HOME_STRAINER)
+
+            self.num_books = self.__scrap_num_books(soup)
+            self.links = self.__scrap_links(soup) or []
+            soup.decompose()  # release the parsed tree
+
+            self.root = self.layout.create()
+            progress_monitor.allbooks_init(self.num_books, self.site_url)
+            self._categories_done = 0
+
+            self.categories = await asyncio.gather(
+                    *(self.__scrap_category(link) for link in self.links))
+        finally:
+            self._executor.shutdown()
+            await self.session.close()
+
+    # --- PRIVATE METHODS ---
+
+    async def __fetch(self, url):
+        # the budget isn't held while waiting before a retry
+        response = await fetch_policy.get_async(url, self.__send)
+        if FileIO.recorder is not None:
+            FileIO.recorder.save(url, response.body)
+        return response.body
+
+    def __fetch_threadsafe(self, url):
+        # called from the executor threads (see FileIO.download_image)
+        return asyncio.run_coroutine_threadsafe(self.__fetch(url),
+                                                self._loop).result()
+
+    async def __run(self, function, *args, **kwargs):
+        # the blocking calls (parsing, disk) run in the executor threads
+        return await self._loop.run_in_executor(
+                self._executor, partial(function, *args, **kwargs))
+
+    async def __parse(self, html, parse_only):
+        return await self.__run(FileIO.parse, html, parse_only)
+
+    async def __send(self, url, headers=None):
+        async with self._budget:
+            with metrics.time('fetch') as timer:
+                response = await self.session.get(url, headers)
+                timer.size = len(response.body)
+                return response
+
+    @log_error
+    def __scrap_num_books(self, soup):
+        return int(soup.select('form strong')[0].string)
+
+    @log_error
+    def __scrap_links(self, soup):
+        ahrefs = soup.select('div[class=side_categories] li ul a')
+        base_url = urljoin(self.site_url, '.')
+        return [(urljoin(base_url, x.attrs['href']), x.string.strip())
+                for x in ahrefs]
+
+    async def __scrap_category(self, link):
+
+        progress_monitor.category_update(
+                self._categories_done,
+                len(self.links),
+                link[1])
+
+        category = Category(link[0], auto_collect=False,
+                            dl_image=self.dl_image, layout=self.layout)
+        category.books = []
+
+        try:
+            await self.__scrap_listing(category)
+        except Exception as e:
+            report_error(f"Can't load the category page ::\n{link[0]}\n{e}",
+                         url=link[0], stage='listing')
+            return category
+
+        category.folder = self.layout.category_folder(category.name)
+
+        progress_monitor.catbooks_update(0, category.num_books, '',
+                                         category.name)
+
+        # the books are collected concurrently but stored in the listing order
+        tasks = [asyncio.ensure_future(self.__scrap_book(category, link))
+                 for link in category.links]
+
+        for done, task in enumerate(asyncio.as_completed(tasks), 1):
+            book, book_link = await task
+            progress_monitor.catbooks_update(done, category.num_books,
+                                             book_link[1], category.name)
+
+        category.books = [task.result()[0] for task in tasks
+                          if task.result()[0] is not None]
+        if category.books:
+            await self.__run(category.write_csv, mode='w')
+
+        self._categories_done += 1
+        return category
+
+    async def __scrap_listing(self, category):
+        """ Set the name, the number of books and the product links
+            of the category from its listing pages
+        """
+
+        def get_links(soup):
+            return [(urljoin(category.category_url, x.attrs['href']),
+                     x.attrs['title']) for x in soup.select('section a[title]')]
+
+        soup = await self.__parse(await self.__fetch(category.category_url),
+                                  LISTING_STRAINER)
+        category.name = as_str(soup.find('h1').string)
+        category.num_books = int(soup.find('form', class_='form-horizontal')
+                                     .find('strong').string)
+        category.links = get_links(soup)
+        soup.decompose()
+
+        # the number of pages is known from the first one
+        per_page = len(category.links)
+        if not 0 < per_page < category.num_books:
+            return
+
+        urls = [urljoin(category.category_url, f'page-{page}.html')
+                for page in range(2, math.ceil(category.num_books / per_page) + 1)]
+        pages = await asyncio.gather(*(self.__fetch(url) for url in urls),
+                                     return_exceptions=True)
+
+        for url, html in zip(urls, pages):
+            if isinstance(html, Exception):
+                report_error(f"Can't load the listing page ::\n{url}\n{html}",
+                             url=url, stage='listing')
+                break
+
+            soup = await self.__parse(html, LISTING_STRAINER)
+            page_links = get_links(soup)
+            soup.decompose()
+            category.links.extend(page_links)
+
+            if len(page_links) < per_page and \
+                    len(category.links) < category.num_books:
+                report_error(f"Incomplete listing page ::\n{url}",
+                             url=url, stage='listing')
+                break
+
+    async def __scrap_book(self, category, link):
+        book = Book(link[0])
+
+        try:
+            html = await self.__fetch(link[0])
+        except Exception as e:
+            # the book is left out rather than stored half-empty
+            report_error(f"Can't load the product page ::\n{link[0]}\n{e}",
+                         url=link[0], stage='fetch')
+            return None, link
+
+        try:
+            if FileIO.parse_pool is None:
+                await self.__run(book.collect_from, html)
+            else:
+                # parsed in the worker processes while the loop keeps running
+                fields, errors = await self._loop.run_in_executor(
+                        FileIO.parse_pool, parse_product, html, link[0])
+                book.set_fields(fields, errors)
+
+            if self.dl_image:
+                # same path as the Scraper (image store, metric), but the
+                # image is fetched by the event loop
+                path = book.set_image_local(category.folder)
+                await self.__run(FileIO.download_image, book.image_url, path,
+                                 fetch=self.__fetch_threadsafe)
+        except Exception as e:
+            report_error(e, url=link[0], stage='book')
+
+        return book, link
@@ -0,0 +1,261 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+''' The purpose of this module is to provide the asyncio counterpart
+    of the HTTP session, so thousands of requests can be in flight
+    on a single event loop (see async_scraper.py).
+'''
+
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit, urljoin
+import asyncio
+import http.client
+import io
+import ssl
+
+from session import USER_AGENT, REDIRECT_CODES, Response
+
+
+##################################################
+# AsyncHTTPSession
+##################################################
+
+
+class AsyncHTTPSession:
+    """ The purpose of this class is to send the GET requests as
+        coroutines, through a pool of persistent (keep-alive)
+        HTTP/1.1 connections per host
+
+    It behaves like the HTTPSession class of session.py (same Response,
+    same errors, same counters) but must be used from a single event loop.
+
+    Attributes
+    ----------
+    pool_size : int
+        the maximum number of idle connections kept open per host
+    timeout : float
+        the number of seconds before a request is aborted
+    user_agent : str
+        the User-Agent header sent with every request
+    connections_opened : int
+        the number of TCP connections opened so far
+    connections_reused : int
+        the number of requests sent on an already opened connection
+    requests : int
+        the number of requests sent so far
+
+    Methods
+    -------
+    get(url, headers=None)
+        send a GET request and return a Response(url, status, headers, body)
+    stats()
+        return the connection counters
+    close()
+        close all the idle connections
+    """
+
+    def __init__(self, pool_size=100, timeout=30, user_agent=USER_AGENT):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self.requests = 0
+        self._pools = {}  # idle connections: {(scheme, host, port): [(r, w)]}
+
+    async def get(self, url, headers=None, max_redirects=5):
+        """ Send a GET request to the given URL and follow the redirections
+
+        Parameters
+        ----------
+        url : str
+            The internet address to request
+        headers : dict
+            The additional request headers
+        max_redirects : int (default is 5)
+            The maximum number of redirections followed
+
+        Returns
+        -------
+        Response
+            A namedtuple with the final url, the status code,
+            the response headers and the body (bytes)
+
+        Raises
+        ------
+        HTTPError
+            if the server answers with an error status code (4xx or 5xx)
+        URLError
+            if the server can't be reached
+        """
+
+        for _ in range(max_redirects + 1):
+            try:
+                response, reason = await asyncio.wait_for(
+                        self.__request(url, headers), self.timeout)
+            except asyncio.TimeoutError:
+                raise URLError(TimeoutError(f"Timeout :: {url}"))
+
+            if response.status in REDIRECT_CODES and \
+                    response.headers.get('Location'):
+                url = urljoin(url, response.headers['Location'])
+                continue
+
+            if response.status >= 400:
+                raise HTTPError(url, response.status, reason,
+                                response.headers, None)
+
+            return response
+
+        raise URLError(f"Too many redirections :: {url}")
+
+    def stats(self):
+        """ Return a dict with the connection counters """
+        return {
+                'requests': self.requests,
+                'connections_opened': self.connections_opened,
+                'connections_reused': self.connections_reused,
+                }
+
+    async def close(self):
+        """ Close all the idle connections """
+        pools, self._pools = self._pools, {}
+
+        for pool in pools.values():
+            for reader, writer in pool:
+                writer.close()
+
+    # --- PRIVATE METHODS ---
+
+    async def __request(self, url, headers):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        target = parts.path or '/'
+        if parts.query:
+            target += '?' + parts.query
+
+        request_headers = {'Host': parts.netloc,
+                           'User-Agent': self.user_agent,
+                           'Accept-Encoding': 'identity'}
+        request_headers.update(headers or {})
+        request = f"GET {target} HTTP/1.1\r\n" + \
+            ''.join(f"{k}: {v}\r\n" for k, v in request_headers.items()) + \
+            "\r\n"
+
+        conn, reused = await self.__acquire(key)
+        try:
+            try:
+                result = await self.__exchange(conn, request.encode('latin-1'))
+            except (http.client.HTTPException, asyncio.IncompleteReadError,
+                    OSError):
+                if not reused:
+                    raise
+                # the server closed the idle connection, use a fresh one
+                conn[1].close()
+                conn, reused = await self.__acquire(key, fresh=True)
+                result = await self.__exchange(conn, request.encode('latin-1'))
+        except (OSError, asyncio.IncompleteReadError) as e:
+            conn[1].close()
+            raise e if isinstance(e, URLError) else URLError(e)
+        except BaseException:
+            # including the cancellation by the timeout
+            conn[1].close()
+            raise
+
+        status, reason, response_headers, body, will_close = result
+
+        if will_close:
+            conn[1].close()
+        else:
+            self.__release(key, conn)
+
+        return Response(url, status, response_headers, body), reason
+
+    async def __exchange(self, conn, request):
+        reader, writer = conn
+        writer.write(request)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise http.client.RemoteDisconnected("Connection closed")
+
+        try:
+            version, status, reason = \
+                status_line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+            status = int(status)
+        except ValueError:
+            # the reason phrase is optional
+            version, status = status_line.decode('latin-1').split()[:2]
+            status, reason = int(status), ''
+
+        lines = []
+        while True:
+            line = await reader.readline()
+            lines.append(line)
+            if line in (b'\r\n', b'\n', b''):
+                break
+        response_headers = http.client.parse_headers(io.BytesIO(b''.join(lines)))
+
+        connection = response_headers.get('Connection', '').lower()
+        will_close = connection == 'close' or \
+            (version == 'HTTP/1.0' and connection != 'keep-alive')
+
+        if response_headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            body = await self.__read_chunked(reader)
+        elif response_headers.get('Content-Length') is not None:
+            body = await reader.readexactly(
+                    int(response_headers['Content-Length']))
+        elif status in (204, 304) or 100 <= status < 200:
+            body = b''
+        else:
+            body = await reader.read()  # the end of the body is the close
+            will_close = True
+
+        return status, reason, response_headers, body, will_close
+
+    async def __read_chunked(self, reader):
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()  # CRLF following the chunk
+
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass  # trailer headers
+
+        return b''.join(chunks)
+
+    async def __acquire(self, key, fresh=False):
+        self.requests += int(not fresh)
+        pool = self._pools.get(key)
+        if pool and not fresh:
+            self.connections_reused += 1
+            return pool.pop(), True
+        self.connections_opened += 1
+
+        scheme, host, port = key
+        try:
+            if scheme == 'https':
+                conn = await asyncio.open_connection(
+                        host, port or 443, ssl=ssl.create_default_context())
+            elif scheme == 'http':
+                conn = await asyncio.open_connection(host, port or 80)
+            else:
+                raise URLError(f"Unsupported URL scheme :: {scheme}")
+        except URLError:
+            raise
+        except OSError as e:
+            raise URLError(e)
+
+        return conn, False
+
+    def __release(self, key, conn):
+        pool = self._pools.setdefault(key, [])
+        if len(pool) < self.pool_size:
+            pool.append(conn)
+            return
+
+        conn[1].close()
@@ -0,0 +1,333 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+''' The purpose of this module is to measure the whole crawl pipeline
+    offline, against a recorded copy of the website served by replay.py
+    (or a synthetic copy when none is given): Book.collect,
+    Category.collect, Category.write_csv and a full Scraper run.
+
+    The results are written as JSON, so two runs can be compared
+    (the metrics worse than the baseline by more than --tolerance %
+    are listed and the exit code is 1).
+
+    python3 benchmarks/bench_crawl.py [--corpus .site] [--latency 0.01]
+                                      [-w 8] [-o results.json]
+                                      [--baseline previous.json]
+'''
+
+from contextlib import redirect_stdout
+import argparse
+import datetime
+import glob
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+try:
+    import resource  # peak RSS (Unix only)
+except ImportError:
+    resource = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from book import Book, parse_product  # noqa: E402
+from category import Category  # noqa: E402
+from layout import OutputLayout  # noqa: E402
+from replay import ReplayServer, sample_site  # noqa: E402
+from scraper import Scraper  # noqa: E402
+from session import http_session  # noqa: E402
+from utils import FileIO  # noqa: E402
+
+
+##################################################
+# Measures
+##################################################
+
+def percentile(values, rank):
+    """ Return the <rank> percentile of the values (nearest rank) """
+    if not values:
+        return None
+    values = sorted(values)
+    index = max(0, min(len(values) - 1,
+                       round(rank / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+
+def peak_rss_mb():
+    """ Return the peak resident memory of the process in MB """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024**2 if sys.platform == 'darwin' else peak / 1024
+
+
+class FetchRecorder:
+    """ Record the duration and the size of each request sent through
+        the shared HTTP session (while used as a context manager) """
+
+    def __init__(self):
+        self.latencies = []
+        self.page_bytes = 0
+        self.image_bytes = 0
+        self.images = 0
+
+    def __enter__(self):
+        send = http_session.get
+
+        def timed_get(url, headers=None, **kwargs):
+            start = time.perf_counter()
+            response = send(url, headers, **kwargs)
+            self.latencies.append(time.perf_counter() - start)
+
+            size = len(response.body)
+            if (response.headers.get('Content-Type') or '') \
+                    .startswith('image/'):
+                self.image_bytes += size
+                self.images += 1
+            else:
+                self.page_bytes += size
+            return response
+
+        http_session.get = timed_get  # list.append is thread safe
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        del http_session.get  # back to the method of the class
+
+    def metrics(self, duration):
+        """ Return the request metrics of a run of <duration> seconds """
+        pages = len(self.latencies) - self.images
+        return {
+                'requests': len(self.latencies),
+                'pages_per_s': pages / duration,
+                'image_mb_per_s': self.image_bytes / 1024**2 / duration,
+                'fetch_p50_ms': 1000 * percentile(self.latencies, 50),
+                'fetch_p95_ms': 1000 * percentile(self.latencies, 95),
+                'fetch_p99_ms': 1000 * percentile(self.latencies, 99),
+                }
+
+
+def product_urls(corpus, site_url):
+    """ Return the urls of the product pages of the corpus """
+    urls = []
+    for path in sorted(glob.glob(os.path.join(corpus, 'catalogue', '*',
+                                              'index.html'))):
+        relative = os.path.relpath(path, corpus).replace(os.sep, '/')
+        if not relative.startswith('catalogue/category/'):
+            urls.append(site_url + relative)
+    return urls
+
+
+##################################################
+# Benchmarks
+##################################################
+
+def bench_parse(corpus, site_url, number):
+    """ Measure the CPU time spent parsing a product page """
+    urls = product_urls(corpus, site_url)[:number]
+    pages = []
+    for url in urls:
+        with open(os.path.join(corpus, url[len(site_url):]), 'rb') as f:
+            pages.append(f.read())
+
+    start = time.thread_time()
+    for html, url in zip(pages, urls):
+        parse_product(html, url)
+    cpu = time.thread_time() - start
+
+    return {'pages': len(pages),
+            'parse_cpu_ms_per_page': 1000 * cpu / len(pages)}
+
+
+def bench_book(corpus, site_url, number):
+    """ Measure Book.collect (fetch, parse and extract) one at a time """
+    urls = product_urls(corpus, site_url)[:number]
+
+    with FetchRecorder() as recorder:
+        start = time.perf_counter()
+        for url in urls:
+            Book(url).collect()
+        duration = time.perf_counter() - start
+
+    metrics = recorder.metrics(duration)
+    metrics.update({'books': len(urls), 'books_per_s': len(urls) / duration})
+    return metrics
+
+
+def bench_category(site, workers, folder):
+    """ Measure Category.collect (with the images) and Category.write_csv
+        on each category of the site (written in the <folder> folder) """
+
+    books = 0
+    categories = []
+    with FetchRecorder() as recorder:
+        start = time.perf_counter()
+        for url, _ in site.links:
+            category = Category(url, workers=workers,
+                                layout=OutputLayout(folder))
+            books += len(category.books)
+            categories.append(category)
+        duration = time.perf_counter() - start
+
+    metrics = recorder.metrics(duration)
+    metrics.update({'books': books, 'books_per_s': books / duration})
+
+    start = time.perf_counter()
+    for category in categories:
+        category.write_csv(mode='w')
+    write = time.perf_counter() - start
+
+    metrics.update({'csv_write_ms': 1000 * write,
+                    'csv_write_us_per_book': 1e6 * write / max(books, 1)})
+    return metrics
+
+
+def bench_scraper(site_url, workers, category_workers, folder):
+    """ Measure a full Scraper run (a new 'data' folder in <folder>) """
+
+    with FetchRecorder() as recorder:
+        start = time.perf_counter()
+        site = Scraper(site_url, workers=workers,
+                       category_workers=category_workers,
+                       layout=OutputLayout(os.path.join(folder, 'data')))
+        duration = time.perf_counter() - start
+
+    books = sum(len(category.books) for category in site.categories)
+    metrics = recorder.metrics(duration)
+    metrics.update({'books': books, 'books_per_s': books / duration,
+                    'duration_s': duration})
+    return metrics, site
+
+
+def run(args, corpus):
+    """ Run the benchmarks against a replay of the corpus """
+
+    results = {}
+    with ReplayServer(corpus, latency=args.latency) as server, \
+            tempfile.TemporaryDirectory() as folder, \
+            redirect_stdout(io.StringIO()):  # no progress bars
+        # the Scraper runs first, so the peak of the process is its own
+        results['scraper'], site = bench_scraper(
+                server.url, args.workers, args.categories, folder)
+        results['scraper']['peak_rss_mb'] = peak_rss_mb()
+
+        results['parse'] = bench_parse(corpus, server.url, args.number)
+        results['book_collect'] = bench_book(corpus, server.url, args.number)
+        results['category_collect'] = bench_category(site, args.workers,
+                                                     folder)
+
+    return results
+
+
+##################################################
+# Comparison
+##################################################
+
+def higher_is_better(name):
+    return name.endswith('_per_s')
+
+
+def compare(results, baseline, tolerance):
+    """ Return the (benchmark, metric, old, new, change %) of the metrics
+        worse than the baseline by more than <tolerance> % """
+
+    regressions = []
+    for bench, metrics in results.items():
+        for name, new in metrics.items():
+            old = baseline.get(bench, {}).get(name)
+            if not isinstance(new, float) or not old:
+                continue
+
+            change = 100 * (new - old) / old
+            worse = -change if higher_is_better(name) else change
+            if worse > tolerance:
+                regressions.append((bench, name, old, new, change))
+    return regressions
+
+
+def report(results):
+    for bench, metrics in results.items():
+        print(f"\n{bench}")
+        for name, value in metrics.items():
+            if isinstance(value, float):
+                value = f"{value:.2f}"
+            print(f"  {name:<24}{value:>12}")
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--corpus', type=str, default=None,
+                        help="recorded copy of the website "
+                             "(default is a synthetic copy)")
+    parser.add_argument('--sample-categories', type=int, default=8,
+                        help="number of categories of the synthetic copy")
+    parser.add_argument('--sample-books', type=int, default=50,
+                        help="number of books per category of the synthetic copy")
+    parser.add_argument('-l', '--latency', type=float, default=0.0,
+                        help="seconds waited by the server before each answer")
+    parser.add_argument('-w', '--workers', type=int, default=8,
+                        help="number of product pages fetched at the same time")
+    parser.add_argument('-c', '--categories', type=int, default=1,
+                        help="number of categories scraped at the same time")
+    parser.add_argument('-n', '--number', type=int, default=200,
+                        help="number of product pages of the book benchmarks")
+    parser.add_argument('--parser', type=str, default=None,
+                        choices=['lxml', 'html.parser'])
+    parser.add_argument('-o', '--output', type=str, default=None,
+                        help="JSON file of the results")
+    parser.add_argument('--baseline', type=str, default=None,
+                        help="JSON file of previous results to compare with")
+    parser.add_argument('--tolerance', type=float, default=10.0,
+                        help="accepted regression (in %%) against the baseline")
+    args = parser.parse_args()
+
+    FileIO.set_parser(args.parser)
+
+    with tempfile.TemporaryDirectory() as sample:
+        corpus = args.corpus
+        if corpus is None:
+            corpus = sample
+            sample_site(sample, [(f'Category {number}', args.sample_books)
+                                 for number in range(args.sample_categories)])
+        results = run(args, os.path.abspath(corpus))
+
+    output = {
+            'meta': {
+                'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpus': os.cpu_count(),
+                'parser': FileIO.parser,
+                'corpus': args.corpus or f'sample {args.sample_categories}'
+                                         f'x{args.sample_books}',
+                'latency': args.latency,
+                'workers': args.workers,
+                'categories': args.categories,
+                },
+            'results': results,
+            }
+
+    report(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+
+        regressions = compare(results, baseline, args.tolerance)
+        for bench, name, old, new, change in regressions:
+            print(f"REGRESSION {bench}.{name}: {old:.2f} -> {new:.2f} "
+                  f"({change:+.1f}%)")
+        if regressions:
+            sys.exit(1)
+        print(f"\nNo regression above {args.tolerance}% "
+              f"against {args.baseline}")
@@ -0,0 +1,129 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+''' The purpose of this module is to measure the peak memory of a full
+    crawl, compared with a crawl keeping the parsed tree of every
+    product page (as the Book objects used to do).
+
+    Each crawl runs in its own process against a recorded copy of the
+    website served by replay.py (or a synthetic copy with product pages
+    of --page-size bytes when none is given). Its peak resident memory
+    (ru_maxrss) is reported, along with the growth of the peak during
+    the crawl per collected book (the interpreter and the imports left out).
+
+    python3 benchmarks/bench_memory.py [--corpus .site] [-w 8]
+                                       [--page-size 50000]
+'''
+
+from contextlib import redirect_stdout
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import book  # noqa: E402
+from bench_crawl import peak_rss_mb  # noqa: E402
+from layout import OutputLayout  # noqa: E402
+from replay import ReplayServer, sample_site  # noqa: E402
+from scraper import Scraper  # noqa: E402
+from utils import FileIO  # noqa: E402
+
+
+MODES = ('trees', 'compact')
+
+
+def crawl(url, workers, folder, keep_trees):
+    """ Crawl the whole site and return the number of books collected
+        (keeping the parsed tree of each product page if keep_trees) """
+
+    trees = []
+    if keep_trees:
+        def parse_product(html, url):
+            soup = FileIO.parse(html, book.PRODUCT_STRAINER)
+            trees.append(soup)
+            return book.extract_product(soup, url)
+
+        book.parse_product = parse_product  # used by Book.collect_from
+
+    with redirect_stdout(io.StringIO()):  # no progress bars
+        site = Scraper(url, workers=workers,
+                       layout=OutputLayout(os.path.join(folder, 'data')))
+
+    return sum(len(category.books) for category in site.categories)
+
+
+def measure(url, workers, mode):
+    """ Return the books collected, the peak RSS (MB) before and after
+        a crawl run in a new process (the peak never goes down) """
+
+    output = subprocess.run(
+            [sys.executable, __file__, '--crawl', mode, '--url', url,
+             '-w', str(workers)],
+            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--corpus', type=str, default=None,
+                        help="recorded copy of the website "
+                             "(default is a synthetic copy)")
+    parser.add_argument('--sample-categories', type=int, default=8,
+                        help="number of categories of the synthetic copy")
+    parser.add_argument('--sample-books', type=int, default=50,
+                        help="number of books per category of the synthetic copy")
+    parser.add_argument('--page-size', type=int, default=50000,
+                        help="size in bytes of the product pages of the "
+                             "synthetic copy")
+    parser.add_argument('-w', '--workers', type=int, default=8,
+                        help="number of product pages fetched at the same time")
+    parser.add_argument('--crawl', type=str, default=None, choices=MODES,
+                        help=argparse.SUPPRESS)  # the measured process
+    parser.add_argument('--url', type=str, default=None,
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.crawl:
+        start_rss_mb = peak_rss_mb()  # the interpreter and the imports
+        with tempfile.TemporaryDirectory() as folder:
+            books = crawl(args.url, args.workers, folder,
+                          args.crawl == 'trees')
+        print(json.dumps({'books': books, 'start_rss_mb': start_rss_mb,
+                          'peak_rss_mb': peak_rss_mb()}))
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as sample:
+        corpus = args.corpus
+        if corpus is None:
+            corpus = sample
+            sample_site(sample, [(f'Category {number}', args.sample_books)
+                                 for number in range(args.sample_categories)],
+                        page_size=args.page_size)
+
+        with ReplayServer(corpus) as server:
+            results = {mode: measure(server.url, args.workers, mode)
+                       for mode in MODES}
+
+    if any(result['peak_rss_mb'] is None for result in results.values()):
+        sys.exit("The peak RSS can't be measured on this platform")
+
+    for result in results.values():
+        result['kb_per_book'] = 1024 * (result['peak_rss_mb'] -
+                                        result['start_rss_mb']) / \
+            max(result['books'], 1)
+
+    trees, compact = results['trees'], results['compact']
+    print(f"{'':<22}{'books':>8}{'peak RSS (MB)':>16}{'per book (kB)':>16}")
+    for label, result in (('books + parsed trees', trees),
+                          ('compact books', compact)):
+        print(f"{label:<22}{result['books']:>8}"
+              f"{result['peak_rss_mb']:>16.1f}{result['kb_per_book']:>16.1f}")
+    print(f"{'ratio':<22}{'':>8}"
+          f"{trees['peak_rss_mb'] / compact['peak_rss_mb']:>15.1f}x"
+          f"{trees['kb_per_book'] / compact['kb_per_book']:>15.1f}x")
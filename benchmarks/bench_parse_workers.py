@@ -0,0 +1,94 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+''' The purpose of this module is to measure how the product page
+    parsing scales with the number of parse worker processes
+    (see FileIO.set_parse_workers).
+
+    The pages are parsed through FileIO.run_parser from a pool of
+    threads, as the scraping threads do, once the worker processes
+    are started (the start of the processes isn't measured).
+
+    python3 benchmarks/bench_parse_workers.py [-n 2000] [-w 1 2 4 8 16]
+                                              [-t 32] [url_or_file]
+'''
+
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from book import parse_product  # noqa: E402
+from utils import FileIO  # noqa: E402
+
+
+PRODUCT_URL = 'http://books.toscrape.com/catalogue/a-light-in-the-attic_1000/index.html'
+
+
+def load(source):
+    """ Return the html bytes of the given url or local file """
+    if os.path.exists(source):
+        with open(source, 'rb') as f:
+            return f.read()
+    return FileIO.fetch(source)
+
+
+def warm_up(html, url):
+    """ Parse a page in a worker process, then keep the process busy
+        long enough for the next warm_up call to go to another one """
+    parse_product(html, url)
+    time.sleep(0.5)
+
+
+def bench(html, workers, threads, number):
+    """ Return the number of product pages parsed per second """
+    FileIO.set_parse_workers(workers)
+    if FileIO.parse_pool is not None:
+        # start every process (and its imports) before the measure
+        list(FileIO.parse_pool.map(warm_up, [html] * workers,
+                                   [PRODUCT_URL] * workers))
+
+    with ThreadPoolExecutor(threads) as executor:
+        start = time.perf_counter()
+        # the same path as the scraping threads (see Book.collect_from)
+        list(executor.map(lambda page: FileIO.run_parser(
+                parse_product, page, PRODUCT_URL), [html] * number))
+        duration = time.perf_counter() - start
+
+    FileIO.set_parse_workers(0)
+    return number / duration
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=2000,
+                        help="number of product pages parsed per measure")
+    parser.add_argument('-w', '--workers', type=int, nargs='*',
+                        default=[1, 2, 4, 8, 16],
+                        help="numbers of parse workers to measure")
+    parser.add_argument('-t', '--threads', type=int, default=32,
+                        help="number of scraping threads calling the parser")
+    parser.add_argument('--parser', type=str, default=None,
+                        choices=['lxml', 'html.parser'])
+    parser.add_argument('--strain', action='store_true')
+    parser.add_argument('page', nargs='?', default=PRODUCT_URL,
+                        help="product page (url or file)")
+    args = parser.parse_args()
+
+    FileIO.set_parser(args.parser, args.strain)
+    html = load(args.page)
+
+    print(f"{os.cpu_count()} cores, parser: {FileIO.parser}, "
+          f"strain: {FileIO.strain}\n")
+    print(f"{'workers':<10}{'pages/s':>10}{'speedup':>10}")
+
+    reference = bench(html, 0, args.threads, args.number)
+    print(f"{'none':<10}{reference:>10.0f}{1:>9.1f}x")
+
+    for workers in args.workers:
+        rate = bench(html, workers, args.threads, args.number)
+        print(f"{workers:<10}{rate:>10.0f}{rate / reference:>9.1f}x")
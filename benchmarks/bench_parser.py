@@ -0,0 +1,83 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+''' The purpose of this module is to compare the HTML parser backends
+    (html.parser / lxml, with or without SoupStrainer) on the pages
+    scraped by the Book, Category and Scraper classes.
+
+    python3 benchmarks/bench_parser.py [-n 200] [url_or_file ...]
+'''
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from book import PRODUCT_STRAINER, extract_product  # noqa: E402
+from category import LISTING_STRAINER  # noqa: E402
+from scraper import HOME_STRAINER  # noqa: E402
+from utils import FileIO, DEFAULT_PARSER  # noqa: E402
+
+
+SITE_URL = 'http://books.toscrape.com/'
+PAGES = [
+        ('home', SITE_URL + 'index.html', HOME_STRAINER),
+        ('category', SITE_URL + 'catalogue/category/books/fiction_10/index.html',
+         LISTING_STRAINER),
+        ('product', SITE_URL + 'catalogue/a-light-in-the-attic_1000/index.html',
+         PRODUCT_STRAINER),
+        ]
+
+
+def load(source):
+    """ Return the html bytes of the given url or local file """
+    if os.path.exists(source):
+        with open(source, 'rb') as f:
+            return f.read()
+    return FileIO.fetch(source)
+
+
+def bench(html, strainer, parser, strain, number):
+    """ Return the average time (in ms) to parse (and extract) a page """
+    FileIO.set_parser(parser, strain)
+
+    def run():
+        soup = FileIO.parse(html, strainer)
+        if strainer is PRODUCT_STRAINER:
+            extract_product(soup, SITE_URL)
+
+    return timeit.timeit(run, number=number) / number * 1000
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-n', '--number', type=int, default=200,
+                        help="number of parses per measure")
+    parser.add_argument('pages', nargs='*',
+                        help="home, category and product page (url or file)")
+    args = parser.parse_args()
+
+    pages = PAGES
+    if args.pages:
+        pages = [(name, source, strainer) for (name, _, strainer), source
+                 in zip(PAGES, args.pages)]
+
+    configs = [('html.parser', False), ('html.parser', True)]
+    if DEFAULT_PARSER == 'lxml':
+        configs += [('lxml', False), ('lxml', True)]
+    else:
+        print("lxml is not installed: only html.parser is measured")
+
+    print(f"{'page':<10}{'parser':<14}{'strain':<8}{'ms/page':>10}{'speedup':>10}")
+
+    for name, source, strainer in pages:
+        html = load(source)
+        reference = None
+        for parser_name, strain in configs:
+            duration = bench(html, strainer, parser_name, strain, args.number)
+            reference = reference or duration
+            print(f"{name:<10}{parser_name:<14}{str(strain):<8}"
+                  f"{duration:>10.3f}{reference / duration:>9.1f}x")
@@ -10,7 +10,180 @@ import re
 import os.path
 from urllib.parse import urljoin
 
-from utils import FileIO, log_error
+from bs4 import SoupStrainer
+
+from utils import FileIO, CSVWriter, log_error, report_error
+from metrics import metrics
+
+
+##################################################
+# Product page extraction
+##################################################
+
+# the parts of the product page used by extract_product
+PRODUCT_STRAINER = SoupStrainer(class_=['breadcrumb', 'product_page'])
+
+RATINGS = {'One': 1, 'Two': 2, 'Three': 3, 'Four': 4, 'Five': 5}
+
+# <th> label of the product table: (attribute, name used in the errors)
+TABLE_FIELDS = {
+        'UPC': ('universal_product_code', 'UPC'),
+        'Price (incl. tax)': ('price_including_tax', 'Price including tax'),
+        'Price (excl. tax)': ('price_excluding_tax', 'Price excluding tax'),
+        'Availability': ('number_available', 'Availability'),
+        }
+
+# the other fields: (attribute, name used in the errors)
+PAGE_FIELDS = [
+        ('title', 'Title'),
+        ('product_description', 'Description'),
+        ('category', 'Category'),
+        ('review_rating', 'Rating'),
+        ('image_url', 'Image URL'),
+        ]
+
+
+def as_str(string):
+    """ Return a plain str copy of a NavigableString (None stays None),
+        so the value doesn't keep a reference to the whole parsed tree
+    """
+    return None if string is None else str(string)
+
+
+def extract_product(soup, url):
+    """ Walk the product page tree once and collect all the product fields
+
+    The first matching node is used for each field (<h1>, the <td>
+    following each <th> of the product table, the <p> following
+    #product_description, the 3rd link of the breadcrumb, the first
+    .star-rating and the first <img>), as the former per-field searches did.
+
+    Parameters
+    ----------
+    soup : BeautifulSoup
+        The parsed product page
+    url : str
+        The internet address of the product page
+
+    Returns
+    -------
+    tuple
+        A dict of the fields (None when not found) and a list of
+        error messages for the fields not found
+    """
+
+    found = {}
+    pending = []  # table fields waiting for the next <td>
+    description_next = False  # the next <p> is the description
+    remaining = len(TABLE_FIELDS) + len(PAGE_FIELDS)
+
+    for tag in soup.descendants:
+        name = tag.name
+        if name is None:
+            continue
+
+        if name == 'td' and pending:
+            for key in pending:
+                found[key] = as_str(tag.string)
+            remaining -= len(pending)
+            pending = []
+
+        elif name == 'th':
+            field = TABLE_FIELDS.get(tag.string)
+            if field is not None and field[0] not in found \
+                    and field[0] not in pending:
+                pending.append(field[0])
+
+        elif name == 'h1' and 'title' not in found:
+            found['title'] = as_str(tag.string)
+            remaining -= 1
+
+        elif name == 'p' and description_next:
+            found['product_description'] = as_str(tag.string)
+            description_next = False
+            remaining -= 1
+
+        if name == 'p' and 'review_rating' not in found \
+                and 'star-rating' in tag.get('class', ()):
+            found['review_rating'] = tag
+            remaining -= 1
+
+        elif name == 'img' and 'image_url' not in found:
+            found['image_url'] = tag
+            remaining -= 1
+
+        elif name == 'ul' and 'category' not in found \
+                and 'breadcrumb' in tag.get('class', ()):
+            found['category'] = tag
+            remaining -= 1
+
+        elif tag.get('id') == 'product_description' \
+                and 'product_description' not in found:
+            description_next = True
+
+        if remaining == 0:
+            break
+
+    fields, errors = {}, []
+
+    for key, label in list(TABLE_FIELDS.values()) + PAGE_FIELDS:
+        try:
+            value = found[key]
+
+            if key == 'number_available':
+                value = int(re.search(r'[0-9]+', value).group())
+            elif key == 'review_rating':
+                value = RATINGS[value.attrs['class'][1]]
+            elif key == 'category':
+                value = as_str(value.find_all('a')[2].string)
+            elif key == 'image_url':
+                relative_url = value.attrs['src']
+                value = urljoin(urljoin(url, '.'), relative_url)  # absolute
+
+            fields[key] = value
+        except Exception:
+            fields[key] = None
+            errors.append(f"Can't find the {label} ::\n{url}")
+
+    return fields, errors
+
+
+def error_field(error):
+    """ Return the attribute concerned by an error message of
+        extract_product (None for the other messages) """
+
+    for key, label in list(TABLE_FIELDS.values()) + PAGE_FIELDS:
+        if error.startswith(f"Can't find the {label} ::"):
+            return key
+    return None
+
+
+def parse_product(html, url):
+    """ Parse the product page and return the fields found by extract_product
+
+    Only plain data comes in and out, so it can run in the parse
+    worker processes (see FileIO.run_parser).
+
+    Parameters
+    ----------
+    html : bytes
+        The utf8 encoded html of the product page
+    url : str
+        The internet address of the product page
+
+    Returns
+    -------
+    tuple
+        A dict of the fields (None when not found) and a list of
+        error messages for the fields not found
+    """
+
+    soup = FileIO.parse(html, PRODUCT_STRAINER)
+    try:
+        with metrics.time('extract'):
+            return extract_product(soup, url)
+    finally:
+        soup.decompose()  # release the parsed tree right away
 
 
 ##################################################
@@ -36,18 +209,47 @@ class Book():
     image_url : str
     image_local : str
 
+    The attributes are stored in __slots__ (in the CSV columns order)
+    and the parsed page isn't kept once the fields are extracted.
+
     Methods
     -------
     get_headers()
         return a list of the attributes names to use in the CSV
     to_dict()
         return a dict of the attributes and values to use in the CSV
-    collect()
+    from_dict(data)
+        return a Book built from a dict (such as a row of a previous CSV)
+    collect(budget=None)
         connect to the given url and collect the product data
+    collect_from(html)
+        collect the product data from the given product page
+    set_fields(fields, errors=())
+        set the product data returned by parse_product
+    save_image(folder=None, downloader=None, journal=None, budget=None)
+        copy the remote image in the given folder
+    set_image_local(folder=None)
+        set the name of the local image and return its path
     to_csv(path='demo', mode='a')
         write the content of this instance in the given CSV
     """
 
+    FIELDS = (
+            'product_page_url',
+            'universal_product_code',
+            'title',
+            'price_including_tax',
+            'price_excluding_tax',
+            'number_available',
+            'product_description',
+            'category',
+            'review_rating',
+            'image_url',
+            'image_local',
+            )
+
+    __slots__ = FIELDS
+
     def __init__(self, url):
         """
         Parameters
@@ -76,7 +278,7 @@ class Book():
         list:
             The list of the selected attributes names
         """
-        return [h for h in self.__dict__.keys() if not h.startswith('_')]
+        return list(self.FIELDS)
 
     def to_dict(self):
         """ Return a dictionary containing the appropriate key/value
@@ -87,27 +289,124 @@ class Book():
         dict:
             The dict of the selected attributes names along with their values
         """
-        return {k: v for k, v in self.__dict__.items() if not k.startswith('_')}
+        return {k: getattr(self, k) for k in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data):
+        """ Return a Book built from the given dictionary
+            (such as a row read from a previous CSV export)
+
+        Parameters
+        ----------
+        data : dict
+            The attributes names along with their values
+
+        Returns
+        -------
+        Book:
+            The book holding the given values
+        """
+
+        book = cls(data['product_page_url'])
+        for key in book.get_headers():
+            value = data.get(key)
+            if key in ('number_available', 'review_rating') and \
+                    isinstance(value, str) and value.isdigit():
+                value = int(value)
+            setattr(book, key, value)
+
+        return book
+
+    def collect(self, budget=None):
+        """ Connect to the product page and grab the information
+
+        Parameters
+        ----------
+        budget : BoundedSemaphore (default is None)
+            The request budget of the crawl (see FileIO.request_budget)
+        """
+
+        self.collect_from(FileIO.fetch(self.product_page_url, budget))
+
+    def collect_from(self, html):
+        """ Grab the information from the already fetched product page
+
+        Parameters
+        ----------
+        html : bytes
+            The utf8 encoded html of the product page
+        """
+
+        fields, errors = FileIO.run_parser(parse_product, html,
+                                           self.product_page_url)
+        self.set_fields(fields, errors)
+
+    def set_fields(self, fields, errors=()):
+        """ Set the product data returned by parse_product
+
+        Parameters
+        ----------
+        fields : dict
+            The attributes names along with their values
+        errors : list (default is empty)
+            The error messages of the fields not found
+        """
+
+        for key, value in fields.items():
+            setattr(self, key, value)
+
+        for error in errors:
+            report_error(error, url=self.product_page_url, stage='extract',
+                         field=error_field(error))
+
+    def save_image(self, folder=None, downloader=None, journal=None,
+                   budget=None):
+        """ Copy the remote image in the given folder
+            (default is the current local directory)
+
+        Parameters
+        ----------
+        folder : str (default is None)
+            The folder where the image is saved
+        downloader : ImageDownloader (default is None)
+            The background stage downloading the image
+            (by default, the image is downloaded right away)
+        journal : CrawlJournal (default is None)
+            The record of the crawl where the downloaded image is added
+        budget : BoundedSemaphore (default is None)
+            The request budget of the crawl (see FileIO.request_budget)
+        """
+        name = self.set_image_local(folder)
+
+        if downloader is None:
+            FileIO.download_image(self.image_url, name, journal, budget)
+        else:
+            downloader.submit(self.image_url, name, journal, budget)
+
+    def set_image_local(self, folder=None):
+        """ Set the name of the local image (image_local)
+            and return the path where the image is saved
+
+        Parameters
+        ----------
+        folder : str (default is None)
+            The folder where the image is saved
 
-    def collect(self):
-        """ Connect to the product page and grab the information """
+        Returns
+        -------
+        str
+            The path of the local image
+        """
 
-        self._soup = FileIO.connect_with_bs4(self.product_page_url)
+        name = self.__get_image_name()
+        if folder is not None:
+            name = os.path.join(folder, name)
 
-        self.universal_product_code = self.__scrap_upc()
-        self.title = self.__scrap_title()
-        self.price_including_tax = self.__scrap_price_inc_tax()
-        self.price_excluding_tax = self.__scrap_price_exc_tax()
-        self.number_available = self.__scrap_number_available()
-        self.product_description = self.__scrap_product_description()
-        self.category = self.__scrap_category()
-        self.review_rating = self.__scrap_review_rating()
-        self.image_url = self.__scrap_image_url()
+        # another image may already use this name (see FileIO.claim_image)
+        name = FileIO.claim_image(name, self.image_url)
+        self.image_local = os.path.basename(name)
 
-    def save_image(self):
-        """ Copy the remote image in the current local directory """
-        self.image_local = self.__get_image_name()
-        FileIO.download_image(self.image_url, self.image_local)
+        return name
 
     def write_csv(self, path=None, mode='a'):
         """ Write the collected books information to a given CSV file
@@ -127,99 +426,11 @@ class Book():
         if path is None:
             path = self.name.lower().replace(' ', '_')
 
-        fields = self.get_headers()
-        headers = {fields[i]: fields[i] for i in range(len(fields))}
-
-        if not os.path.exists(f'{path}.csv') or (mode != 'a' and mode != 'a+'):
-            FileIO.write(path, fields, headers, mode)
-        FileIO.write(path, fields, self.to_dict(), 'a')
+        with CSVWriter(path, self.get_headers(), mode) as writer:
+            writer.writerow(self.to_dict())
 
     # --- PRIVATE METHODS ---
 
-    @log_error
-    def __scrap_upc(self):
-        try:
-            return self._soup.find('th', string='UPC').find_next('td').string
-        except Exception:
-            raise(Exception(f"Can't find the UPC ::\n{self.product_page_url}"))
-
-    @log_error
-    def __scrap_title(self):
-        try:
-            return self._soup.find('h1').string
-        except Exception:
-            raise(Exception(f"Can't find the Title ::\
-                    \n{self.product_page_url}"))
-
-    @log_error
-    def __scrap_price_inc_tax(self):
-        try:
-            return self._soup.find('th', string="Price (incl. tax)") \
-                            .find_next('td').string
-        except Exception:
-            raise(Exception(f"Can't find the Price including tax ::\
-                    \n{self.product_page_url}"))
-
-    @log_error
-    def __scrap_price_exc_tax(self):
-        try:
-            return self._soup.find('th', string="Price (excl. tax)") \
-                            .find_next('td').string
-        except Exception:
-            raise(Exception(f"Can't find the Price excluding tax ::\
-                    \n{self.product_page_url}"))
-
-    @log_error
-    def __scrap_number_available(self):
-        try:
-            number_available_txt = self._soup                               \
-                                        .find('th', string='Availability')  \
-                                        .find_next('td').string
-
-            return int(re.search(r'[0-9]+', number_available_txt).group())
-        except Exception:
-            raise(Exception(f"Can't find the Availability ::\
-                    \n{self.product_page_url}"))
-
-    @log_error
-    def __scrap_product_description(self):
-        try:
-            return self._soup.select("#product_description")[0]  \
-                            .find_next('p').string
-        except Exception:
-            raise(Exception(f"Can't find the Description ::\
-                    \n{self.product_page_url}"))
-
-    @log_error
-    def __scrap_category(self):
-        try:
-            return self._soup.find('ul', class_='breadcrumb')    \
-                            .findAll('a')[2].string
-        except Exception:
-            raise(Exception(f"Can't find the Category ::\
-                    \n{self.product_page_url}"))
-
-    @log_error
-    def __scrap_review_rating(self):
-        try:
-            trans = {'One': 1, 'Two': 2, 'Three': 3, 'Four': 4, 'Five': 5}
-            return trans[
-                    (self._soup.find('p', class_='star-rating')
-                        .attrs['class'][1])]
-        except Exception:
-            raise(Exception(f"Can't find the Rating ::\
-                    \n{self.product_page_url}"))
-
-    @log_error
-    def __scrap_image_url(self):
-        try:
-            relative_url = self._soup.img.attrs['src']  # relative
-            base_url = urljoin(self.product_page_url, '.')
-            return urljoin(base_url, relative_url)  # absolute
-        except Exception:
-            raise(Exception(f"Can't find the Image URL ::\
-                    \n{self.product_page_url}"))
-
     @log_error
     def __get_image_name(self):
         try:
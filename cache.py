@@ -0,0 +1,231 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+''' The purpose of this module is to keep the fetched pages and images
+    on the local storage, so the next runs can skip the unchanged
+    content using conditional requests (ETag / Last-Modified) or a TTL.
+'''
+
+from hashlib import sha1
+from threading import Lock, get_ident
+import json
+import os
+import time
+
+
+##################################################
+# HTTPCache
+##################################################
+
+
+class HTTPCache:
+    """ The purpose of this class is to store the HTTP responses
+        on disk, keyed by URL, and to revalidate them when needed
+
+    Each entry is made of a <key>.body file holding the content and a
+    <key>.json file holding the url, the ETag, the Last-Modified date
+    and the fetch time. The least recently used entries are removed
+    once the total size of the bodies exceeds max_size.
+
+    Attributes
+    ----------
+    dirname : str
+        the folder where the entries are stored
+    max_size : int
+        the maximum total size of the stored bodies (in bytes)
+    ttl : float
+        the number of seconds during which an entry is used without
+        asking the server (0 means always revalidate)
+    hits : int
+        the number of entries used without asking the server
+    revalidated : int
+        the number of entries confirmed by the server (304 Not Modified)
+    misses : int
+        the number of responses fetched and stored
+    evictions : int
+        the number of entries removed to respect max_size
+
+    Methods
+    -------
+    fetch(url, get)
+        return the body of the given url, from the cache when possible
+    stats()
+        return the cache counters
+    clear()
+        remove all the entries
+    """
+
+    def __init__(self, dirname='.cache', max_size=500*1024*1024, ttl=0):
+        self.dirname = os.path.abspath(dirname)
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = Lock()
+        self._index = {}  # {key: [size, last_access]}
+        self._size = 0
+
+        os.makedirs(self.dirname, exist_ok=True)
+        self.__load_index()
+
+    def fetch(self, url, get):
+        """ Return the body of the given url, from the cache when it is
+            still fresh or confirmed by the server, otherwise from the
+            server (and store it)
+
+        Parameters
+        ----------
+        url : str
+            The internet address of the content
+        get : function
+            The function sending the request: get(url, headers) -> Response
+
+        Returns
+        -------
+        bytes
+            The body of the response
+        """
+
+        key = sha1(url.encode('utf8')).hexdigest()
+        meta = self.__read_meta(key)
+
+        if meta is not None and time.time() - meta['fetched_at'] < self.ttl:
+            body = self.__read_body(key)
+            if body is not None:
+                self.__count('hits')
+                return body
+
+        headers = {}
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        response = get(url, headers)
+
+        if response.status == 304 and meta is not None:
+            body = self.__read_body(key)
+            if body is not None:
+                meta['fetched_at'] = time.time()
+                self.__write(key + '.json', json.dumps(meta).encode('utf8'))
+                self.__count('revalidated')
+                return body
+
+            response = get(url, {})
+
+        self.__store(key, url, response)
+        self.__count('misses')
+
+        return response.body
+
+    def stats(self):
+        """ Return a dict with the cache counters """
+        with self._lock:
+            return {
+                    'hits': self.hits,
+                    'revalidated': self.revalidated,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'size': self._size,
+                    }
+
+    def clear(self):
+        """ Remove all the entries """
+        with self._lock:
+            for key in list(self._index):
+                self.__remove(key)
+
+    # --- PRIVATE METHODS ---
+
+    def __path(self, filename):
+        return os.path.join(self.dirname, filename[:2], filename)
+
+    def __load_index(self):
+        for dirpath, dirnames, filenames in os.walk(self.dirname):
+            for filename in filenames:
+                if filename.endswith('.body'):
+                    stat = os.stat(os.path.join(dirpath, filename))
+                    self._index[filename[:-5]] = [stat.st_size, stat.st_mtime]
+                    self._size += stat.st_size
+
+    def __read_meta(self, key):
+        try:
+            with open(self.__path(key + '.json'), 'rb') as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+
+    def __read_body(self, key):
+        try:
+            with open(self.__path(key + '.body'), 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None
+
+        with self._lock:
+            if key in self._index:
+                self._index[key][1] = time.time()
+
+        try:
+            os.utime(self.__path(key + '.body'))  # keep the LRU order on disk
+        except OSError:
+            pass
+
+        return body
+
+    def __store(self, key, url, response):
+        meta = {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'fetched_at': time.time(),
+                }
+
+        self.__write(key + '.body', response.body)
+        self.__write(key + '.json', json.dumps(meta).encode('utf8'))
+
+        with self._lock:
+            if key in self._index:
+                self._size -= self._index[key][0]
+            self._index[key] = [len(response.body), time.time()]
+            self._size += len(response.body)
+
+            if self._size > self.max_size:
+                self.__evict(key)
+
+    def __write(self, filename, data):
+        path = self.__path(filename)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # write then rename, so a reader never sees a partial file
+        tmp_path = f'{path}.{os.getpid()}.{get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def __evict(self, keep):
+        by_access = sorted(self._index.items(), key=lambda item: item[1][1])
+
+        for key, (size, last_access) in by_access:
+            if self._size <= self.max_size * 0.9:
+                break
+            if key != keep:
+                self.__remove(key)
+                self.evictions += 1
+
+    def __remove(self, key):
+        size, last_access = self._index.pop(key)
+        self._size -= size
+
+        for ext in ('.body', '.json'):
+            try:
+                os.remove(self.__path(key + ext))
+            except OSError:
+                pass
+
+    def __count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
@@ -6,17 +6,33 @@
     http://books.toscrape.com/ website.
 '''
 
+import math
 import os.path
+from collections import deque
+from contextlib import nullcontext
 from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor
 
-from book import Book
-from utils import progress_monitor, FileIO, log_error
+from bs4 import SoupStrainer
+
+from book import Book, as_str
+from layout import OutputLayout
+from utils import progress_monitor, FileIO, CSVWriter, log_error, report_error
 
 
 ##################################################
 # Category
 ##################################################
 
+# the parts of the listing pages used by the Category class
+LISTING_STRAINER = SoupStrainer(['h1', 'form', 'section'])
+
+# number of rows written at once to the CSV in stream mode
+STREAM_BATCH_SIZE = 20
+
+# minimum number of listing pages fetched at the same time
+LISTING_WORKERS = 4
+
 
 class Category:
     """ The purpose of this class is to collect
@@ -35,6 +51,41 @@ class Category:
     dl_image : bool
         determine if the images are downloaded on local
         drive when scraping the products infos
+    workers : int
+        the maximum number of product pages fetched at the same time
+        (the listing pages use max(workers, LISTING_WORKERS) threads,
+        so they are fetched in parallel even with a single worker)
+    layout : OutputLayout
+        the paths of the output: the <name> folder of the category (with
+        its CSV file and its images) is created in its root folder
+    folder : str
+        the absolute path of the category folder (None until collected)
+    listing : dict
+        the title, price and availability shown on the listing pages
+        for each product url
+    incremental : bool
+        determine if the books of the previous CSV export are kept
+        when their listing information didn't change (only the new
+        or changed books are collected)
+    stream : bool
+        determine if each book is written to the category CSV as soon as
+        it is collected instead of being kept in the books list
+    downloader : ImageDownloader
+        the background stage downloading the images
+        (when None, each image is downloaded after its product page)
+    journal : CrawlJournal
+        the record of the crawl progress: the listing and the books
+        already recorded are reused, the new ones are recorded
+        (None means no record)
+    failed_books : int
+        the number of books whose product page couldn't be fetched
+    sink : SQLiteWriter or ColumnarWriter
+        the output shared by the categories, receiving the rows as soon
+        as they are collected, instead of the category CSV
+        (None means the CSV file of the category)
+    budget : BoundedSemaphore
+        the request budget of the crawl, shared by the categories
+        (None means no limit, see FileIO.request_budget)
 
     Methods
     -------
@@ -44,13 +95,27 @@ class Category:
         write the content of the collected books in the given CSV
     """
 
-    def __init__(self, url=None, auto_collect=True, dl_image=True):
+    def __init__(self, url=None, auto_collect=True, dl_image=True, workers=1,
+                 root=None, incremental=False, stream=False, downloader=None,
+                 journal=None, sink=None, layout=None, budget=None):
         self.category_url = url
         self.name = None
         self.book_list = []
         self.links = []
         self.num_books = 0
         self.dl_image = dl_image
+        self.workers = workers
+        # root is a shorthand for the layout (default is the current folder)
+        self.layout = layout or OutputLayout(root if root is not None else '.')
+        self.folder = None
+        self.listing = {}
+        self.incremental = incremental
+        self.stream = stream
+        self.downloader = downloader
+        self.journal = journal
+        self.failed_books = 0
+        self.sink = sink
+        self.budget = budget
 
         if url is not None and auto_collect:
             self.collect()
@@ -58,11 +123,31 @@ class Category:
     def collect(self):
         """ Connect to the category page and grab the information """
 
-        self._soup = FileIO.connect_with_bs4(self.category_url)
+        state = None
+        if self.journal is not None:
+            state = self.journal.category(self.category_url)
+
+        if state is not None:
+            # the listing pages were collected by an interrupted crawl
+            self.name = state['name']
+            self.num_books = state['num_books']
+            self.links = state['links']
+            self.listing = state['listing']
+        else:
+            self._soup = FileIO.connect_with_bs4(self.category_url,
+                                                 LISTING_STRAINER, self.budget)
+
+            self.name = self.__scrap_name()
+            self.num_books = self.__scrap_num_books()
+            self.links = self.__scrap_links()
+            self._soup = None  # release the parsed tree
+
+            if self.journal is not None and self.links and \
+                    len(self.links) == self.num_books:
+                self.journal.add_category(self.category_url, self.name,
+                                          self.num_books, self.links,
+                                          self.listing)
 
-        self.name = self.__scrap_name()
-        self.num_books = self.__scrap_num_books()
-        self.links = self.__scrap_links()
         self.books = self.__scrap_books()
 
     def write_csv(self, path=None, mode='a'):
@@ -81,23 +166,23 @@ class Category:
             self.collect()
 
         if path is None:
-            path = self.name.lower().replace(' ', '_')
+            path = self.__default_path()
 
         fields = self.books[0].get_headers()
-        headers = {fields[i]: fields[i] for i in range(len(fields))}
 
-        if not os.path.exists(f'{path}.csv') or (mode != 'a' and mode != 'a+'):
-            FileIO.write(path, fields, headers, mode)
-
-        for book in self.books:
-            FileIO.write(path, fields, book.to_dict(), 'a')
+        with CSVWriter(path, fields, mode) as writer:
+            for book in self.books:
+                writer.writerow(book.to_dict())
 
     # --- PRIVATE METHODS ---
 
+    def __default_path(self):
+        return self.layout.category_csv(self.name)
+
     @log_error
     def __scrap_name(self):
         try:
-            return self._soup.find('h1').string
+            return as_str(self._soup.find('h1').string)
         except Exception:
             raise(Exception(f"Can't find the Category name ::\
                     \n{self.product_page_url}"))
@@ -117,13 +202,50 @@ class Category:
 
         try:
             links = get_links(self._soup)
-
-            page = 2
-            while(len(links) < self.num_books):
-                base = urljoin(self.category_url, 'page-{}.html'.format(page))
-                soup = FileIO.connect_with_bs4(base)
-                links.extend(get_links(soup))
-                page += 1
+            per_page = len(links)
+
+            # the number of pages is known from the first one
+            if 0 < per_page < self.num_books:
+                num_pages = math.ceil(self.num_books / per_page)
+                urls = [urljoin(self.category_url, f'page-{page}.html')
+                        for page in range(2, num_pages + 1)]
+
+                listing_workers = max(self.workers, LISTING_WORKERS)
+                with ThreadPoolExecutor(listing_workers) as executor:
+                    futures = [executor.submit(FileIO.connect_with_bs4, url,
+                                               LISTING_STRAINER, self.budget)
+                               for url in urls]
+
+                    for url, future in zip(urls, futures):
+                        try:
+                            page_links = get_links(future.result())
+                        except Exception as e:
+                            report_error(f"Can't load the listing page ::"
+                                         f"\n{url}\n{e}",
+                                         url=url, stage='listing')
+                            break
+
+                        links.extend(page_links)
+
+                        if len(page_links) < per_page and \
+                                len(links) < self.num_books:
+                            report_error(f"Incomplete listing page ::"
+                                         f"\n{url}", url=url, stage='listing')
+                            break
+
+                    for future in futures:
+                        future.cancel()
+
+            for x in links:
+                article = x.find_parent('article')
+                price = article.find('p', class_='price_color')
+                availability = article.find('p', class_='availability')
+                self.listing[urljoin(self.category_url, x.attrs['href'])] = {
+                        'title': x.attrs['title'],
+                        'price': price.get_text(strip=True) if price else None,
+                        'availability': availability.get_text(strip=True)
+                        if availability else None,
+                        }
 
             return [(urljoin(self.category_url, x.attrs['href']),
                      x.attrs['title']) for x in links]
@@ -133,30 +255,138 @@ class Category:
 
     @log_error
     def __scrap_books(self):
-        books = []
-        book = Book(self.links[0][0]).collect()
+        self.folder = self.layout.category_folder(self.name)
+
+        previous = {}
+        if self.incremental:
+            if self.sink is not None:
+                rows = self.sink.read(category=self.name)
+            else:
+                rows = FileIO.read(self.__default_path())
+            previous = {row['universal_product_code']: row for row in rows}
+            previous.update({row['product_page_url']: row for row in rows})
+
+            # the kept images keep their names (see FileIO.claim_image)
+            for row in rows:
+                if row['image_local']:
+                    FileIO.claim_image(os.path.join(self.folder,
+                                                    row['image_local']),
+                                       row['image_url'])
 
-        FileIO.open_category(self.name)
-
-        for link in self.links:
-
-            progress_monitor.catbooks_update(
-                    len(books),
-                    self.num_books,
-                    link[1])
-
-            book = Book(link[0])
-            book.collect()
-            books.append(book)
+        books = []
+        if self.sink is not None:
+            sink = nullcontext(self.sink)  # closed by its owner
+        elif self.stream:
+            sink = CSVWriter(self.__default_path(), list(Book.FIELDS),
+                             'w', STREAM_BATCH_SIZE)
+        else:
+            sink = nullcontext()
+
+        progress_monitor.catbooks_update(0, self.num_books, '', self.name)
+
+        with sink as writer:
+            for done, (book, link) in enumerate(self.__iter_books(previous), 1):
+                progress_monitor.catbooks_update(
+                        done,
+                        self.num_books,
+                        link[1],
+                        self.name)
+
+                if book is None:
+                    self.failed_books += 1
+                    continue  # not fetched (the error is in errors.log)
+
+                if self.journal is not None:
+                    self.journal.add_book(self.category_url, book.to_dict())
+
+                if writer is not None:
+                    writer.writerow(book.to_dict())
+                if not self.stream:
+                    books.append(book)
 
-            if self.dl_image:
-                book.save_image()
+        return books
 
-        progress_monitor.catbooks_update(
-                    len(books),
-                    self.num_books,
-                    link[1])
+    def __iter_books(self, previous):
+        """ Yield the (book, link) of each link in the listing order,
+            while the next books are collected in the thread pool
+            (book is None when its product page couldn't be fetched)
+        """
 
-        FileIO.close_category()
+        window = deque()  # (book, link, task, row) in the listing order
+        limit = self.workers * 4
+
+        recorded = {}  # the books collected by an interrupted crawl
+        if self.journal is not None:
+            recorded = self.journal.books(self.category_url)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for link in self.links:
+                row = previous.get(link[0])
+                if link[0] in recorded or \
+                        (row is not None and self.__is_unchanged(row)):
+                    # keep the recorded or previous row of the book
+                    # (and download the image if missing)
+                    book = Book.from_dict(recorded.get(link[0]) or row)
+                    task = None
+                    if self.dl_image and not self.__has_image(book):
+                        task = executor.submit(self.__scrap_book, book, None)
+                else:
+                    book = Book(link[0])
+                    task = executor.submit(self.__scrap_book, book, previous)
+
+                window.append((book, link, task, row))
+
+                while window and (len(window) > limit or window[0][2] is None
+                                  or window[0][2].done()):
+                    yield self.__next_book(window)
+
+            while window:
+                yield self.__next_book(window)
+
+    def __next_book(self, window):
+        book, link, task, row = window.popleft()
+        if task is not None and task.result() is None:
+            # keep the previous row (if any) rather than a half-empty book
+            book = Book.from_dict(row) if row is not None else None
+        return book, link
 
-        return books
+    @log_error
+    def __scrap_book(self, book, previous=None):
+        if previous is None:
+            # unchanged book whose image is missing
+            book.save_image(self.folder, self.downloader, self.journal,
+                            self.budget)
+            return book
+
+        book.collect(self.budget)
+
+        if self.dl_image:
+            # the image is only downloaded again if it changed
+            row = previous.get(book.product_page_url) or \
+                  previous.get(book.universal_product_code)
+            if row is not None and row['image_url'] == book.image_url and \
+                    self.__has_image(Book.from_dict(row)):
+                book.image_local = row['image_local']
+            else:
+                book.save_image(self.folder, self.downloader,
+                                self.journal, self.budget)
+
+        return book
+
+    def __is_unchanged(self, row):
+        listing = self.listing.get(row['product_page_url'], {})
+        in_stock = row['number_available'].isdigit() and \
+            int(row['number_available']) > 0
+
+        return row['title'] == listing.get('title') and \
+            row['price_including_tax'] == listing.get('price') and \
+            in_stock == (listing.get('availability') == 'In stock')
+
+    def __has_image(self, book):
+        if not book.image_local:
+            return False
+
+        path = os.path.join(self.folder or '', book.image_local)
+        if self.journal is not None and not self.journal.has_image(path):
+            return False  # possibly interrupted while downloading
+        return os.path.exists(path)
@@ -0,0 +1,287 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+''' The purpose of this module is to export the collected books in a
+    columnar file (Parquet or Arrow IPC) with typed columns, for the
+    analytics tools. It needs pyarrow (pip install pyarrow).
+'''
+
+from decimal import Decimal, InvalidOperation
+from threading import RLock
+import os
+import re
+
+from metrics import metrics
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+
+# the formats written by ColumnarWriter and their file extension
+COLUMNAR_FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+# the column types of the books ('decimal', 'int' or 'str')
+BOOK_TYPES = {
+        'price_including_tax': 'decimal',
+        'price_excluding_tax': 'decimal',
+        'number_available': 'int',
+        'review_rating': 'int',
+        }
+
+
+##################################################
+# ColumnarWriter
+##################################################
+
+
+class ColumnarWriter:
+    """ The purpose of this class is to write the rows in a columnar file
+        (Parquet or Arrow IPC) with typed columns
+
+    The rows are buffered by group (the value of the group column) and
+    each group is written as a row group (a record batch for Arrow)
+    when it is flushed, so the categories are written as they complete.
+    The prices ('£51.77') are stored as decimals and the integer columns
+    as int64. The file is written next to its path and moved in place
+    when closed, so the previous file stays readable until then.
+
+    It has the same methods as SQLiteWriter, so it can be used as a
+    context manager and from several threads at the same time.
+
+    Attributes
+    ----------
+    path : str
+        The path of the columnar file
+    fields : list
+        The columns identifiers
+    format : str
+        The file format ('parquet' or 'arrow')
+    group : str
+        The column grouping the rows in row groups
+    types : dict
+        The type of the columns ('decimal', 'int', default is 'str')
+    currency : str
+        The prefix of the prices, removed from the decimal columns
+    batch_size : int
+        The number of buffered rows of a group triggering a write
+
+    Methods
+    -------
+    writerow(data)
+        add a row to the buffer of its group
+    writerows(rows)
+        add several rows to the buffers
+    flush(group=None)
+        write the buffered rows of the group (of all the groups if None)
+    read(**where)
+        return the rows of the previous file matching the given values
+    close()
+        write the buffered rows and move the file in place
+    """
+
+    def __init__(self, path, fields, format=None, group='category',
+                 types=None, currency='£', batch_size=10000):
+        """
+        Parameters
+        ----------
+        path : str
+            The path of the columnar file (replaced when closed)
+        fields : list
+            The columns identifiers
+        format : str (default is None)
+            The file format ('parquet' or 'arrow', default is given by
+            the extension of the path)
+        group : str (default is 'category')
+            The column grouping the rows in row groups
+        types : dict (default is None)
+            The type of the columns ('decimal', 'int', default is 'str')
+        currency : str (default is '£')
+            The prefix of the prices, removed from the decimal columns
+        batch_size : int (default is 10000)
+            The number of buffered rows of a group triggering a write
+
+        Raises
+        ------
+        ImportError
+            pyarrow isn't installed
+        """
+
+        if not HAS_PYARROW:
+            raise ImportError("The columnar output needs pyarrow "
+                              "(pip install pyarrow)")
+
+        if format is None:
+            format = 'arrow' if os.path.splitext(path)[1] in \
+                ('.arrow', '.feather', '.ipc') else 'parquet'
+
+        self.path = path
+        self.fields = list(fields)
+        self.format = format
+        self.group = group
+        self.types = types or {}
+        self.currency = currency
+        self.batch_size = batch_size
+        self._groups = {}  # {group value: [rows]}
+        self._writer = None
+        self._sink = None
+        self._previous = None
+        self._closed = False
+        self._lock = RLock()
+
+        self.schema = pa.schema(
+                [(field, self.__arrow_type(field)) for field in self.fields],
+                metadata={'currency': currency})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def writerow(self, data):
+        """ Add the given row (dict) to the buffer of its group """
+        with self._lock:
+            key = data.get(self.group)
+            rows = self._groups.setdefault(key, [])
+            rows.append(data)
+            if len(rows) >= self.batch_size:
+                self.flush(key)
+
+    def writerows(self, rows):
+        """ Add the given rows (dicts) to the buffers """
+        for data in rows:
+            self.writerow(data)
+
+    def flush(self, group=None):
+        """ Write the buffered rows of the group as a row group
+
+        Parameters
+        ----------
+        group : str (default is None)
+            The value of the group column (None writes all the groups)
+        """
+
+        with self._lock:
+            keys = list(self._groups) if group is None else [group]
+            for key in keys:
+                rows = self._groups.pop(key, None)
+                if rows:
+                    self.__write(rows)
+
+    def read(self, **where):
+        """ Return the rows of the previous file (the one being replaced)
+            matching the given column values, as dicts of strings
+            ('' for the missing values), as read from a CSV file
+
+        Parameters
+        ----------
+        **where
+            The values of the selected rows (column=value)
+
+        Returns
+        -------
+        list
+            The rows (dicts)
+        """
+
+        with self._lock:
+            if self._previous is None:
+                self._previous = self.__read_previous()
+
+        return [row for row in self._previous
+                if all(row.get(k) == v for k, v in where.items())]
+
+    def close(self):
+        """ Write the buffered rows and move the file in place """
+        with self._lock:
+            if self._closed:
+                return
+
+            self.flush()
+            if self._writer is None:
+                self.__open()  # an empty file with the schema
+
+            self._writer.close()
+            if self._sink is not None:
+                self._sink.close()
+            os.replace(self.path + '.tmp', self.path)
+            self._closed = True
+
+    # --- PRIVATE METHODS ---
+
+    def __arrow_type(self, field):
+        kind = self.types.get(field, 'str')
+        if kind == 'decimal':
+            return pa.decimal128(12, 2)
+        if kind == 'int':
+            return pa.int64()
+        return pa.string()
+
+    def __convert(self, field, value):
+        """ Return the value of the column type (None if missing) """
+
+        if value is None or value == '':
+            return None
+
+        kind = self.types.get(field, 'str')
+        try:
+            if kind == 'decimal':
+                if isinstance(value, str):
+                    value = re.sub(r'[^0-9.\-]', '', value)
+                return Decimal(value).quantize(Decimal('0.01'))
+            if kind == 'int':
+                return int(value)
+        except (InvalidOperation, ValueError):
+            return None
+        return str(value)
+
+    def __format(self, field, value):
+        """ Return the value as written in a CSV file """
+
+        if value is None:
+            return ''
+        if self.types.get(field) == 'decimal':
+            return f"{self.currency}{value}"
+        return str(value)
+
+    def __open(self):
+        tmp_path = self.path + '.tmp'
+        if self.format == 'arrow':
+            self._sink = pa.OSFile(tmp_path, 'wb')
+            self._writer = pa.ipc.new_file(self._sink, self.schema)
+        else:
+            self._writer = pq.ParquetWriter(tmp_path, self.schema)
+
+    def __write(self, rows):
+        if self._writer is None:
+            self.__open()
+
+        columns = [pa.array([self.__convert(field, row.get(field))
+                             for row in rows], type=self.schema.field(field).type)
+                   for field in self.fields]
+        batch = pa.RecordBatch.from_arrays(columns, schema=self.schema)
+
+        with metrics.time('columnar'):
+            if self.format == 'arrow':
+                self._writer.write_batch(batch)
+            else:
+                self._writer.write_table(pa.Table.from_batches([batch]),
+                                         row_group_size=len(rows))
+
+    def __read_previous(self):
+        if not os.path.exists(self.path):
+            return []
+
+        if self.format == 'arrow':
+            with pa.memory_map(self.path) as source:
+                table = pa.ipc.open_file(source).read_all()
+        else:
+            table = pq.read_table(self.path)
+
+        fields = [field for field in self.fields if field in table.column_names]
+        return [{field: self.__format(field, row[field]) for field in fields}
+                for row in table.select(fields).to_pylist()]
@@ -0,0 +1,106 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+''' The purpose of this module is to handle the download of the
+    book images separately from the scraping of the product pages.
+'''
+
+from queue import Queue
+from threading import Thread
+
+from utils import progress_monitor, FileIO
+
+
+##################################################
+# ImageDownloader
+##################################################
+
+
+class ImageDownloader:
+    """ The purpose of this class is to download the images in the
+        background, with its own worker threads fed by a bounded queue
+
+    The scraping threads only wait when the queue is full, so the
+    product pages keep being parsed while the images are downloaded.
+    The failed downloads are written in errors.log by FileIO.
+
+    Attributes
+    ----------
+    workers : int
+        the number of images downloaded at the same time
+    queue_size : int
+        the maximum number of images waiting to be downloaded
+
+    Methods
+    -------
+    submit(url, name, journal=None, budget=None)
+        add an image to the download queue
+    join()
+        wait until all the submitted images are downloaded
+    close()
+        wait for the downloads and stop the worker threads
+    """
+
+    def __init__(self, workers=4, queue_size=100):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._queue = Queue(maxsize=queue_size)
+        self._threads = [Thread(target=self.__work, daemon=True)
+                         for _ in range(workers)]
+
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def submit(self, url, name, journal=None, budget=None):
+        """ Add the image to the download queue
+            (wait for a free place if the queue is full)
+
+        Parameters
+        ----------
+        url : str
+            The internet address of the image
+        name : str
+            The path of the local file
+        journal : CrawlJournal (default is None)
+            The record of the crawl where the downloaded image is added
+        budget : BoundedSemaphore (default is None)
+            The request budget of the crawl (see FileIO.request_budget)
+        """
+
+        progress_monitor.images_update(queued=1)
+        self._queue.put((url, name, journal, budget))
+
+    def join(self):
+        """ Wait until all the submitted images are downloaded """
+        self._queue.join()
+
+    def close(self):
+        """ Wait for the downloads and stop the worker threads """
+        for _ in self._threads:
+            self._queue.put(None)
+
+        for thread in self._threads:
+            thread.join()
+
+    # --- PRIVATE METHODS ---
+
+    def __work(self):
+        while True:
+            item = self._queue.get()
+
+            try:
+                if item is None:
+                    return
+
+                url, name, journal, budget = item
+                failed = FileIO.download_image(url, name, journal,
+                                               budget) is None
+                progress_monitor.images_update(done=1, failed=int(failed))
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,200 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+''' The purpose of this module is to record the progress of a crawl,
+    so an interrupted crawl can be resumed without collecting again
+    what was already done.
+'''
+
+from threading import Lock
+import json
+import os.path
+import sqlite3
+
+
+##################################################
+# CrawlJournal
+##################################################
+
+
+class CrawlJournal:
+    """ The purpose of this class is to record the completed categories,
+        listing pages, books and images of a crawl in a SQLite database
+
+    Each record is committed right away (the database uses a write-ahead
+    log), so the journal stays usable when the crawl is killed.
+
+    Attributes
+    ----------
+    path : str
+        the path of the SQLite database
+
+    Methods
+    -------
+    clear()
+        remove the categories and books records (a new crawl starts)
+    category(url)
+        return the recorded listing of a category (None if not recorded)
+    add_category(url, name, num_books, links, listing)
+        record the complete listing of a category
+    done_category(url)
+        record that the CSV of a category is complete
+    books(category_url)
+        return the recorded rows of the books of a category
+    add_book(category_url, row)
+        record the row of a collected book
+    has_image(path)
+        return True if the image was completely downloaded
+    add_image(path, url)
+        record a downloaded image
+    close()
+        close the database
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = Lock()
+        self._db = sqlite3.connect(path, isolation_level=None,
+                                   check_same_thread=False)
+
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS categories (
+                    url TEXT PRIMARY KEY,
+                    name TEXT,
+                    num_books INTEGER,
+                    links TEXT,
+                    listing TEXT,
+                    done INTEGER DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS books (
+                    url TEXT PRIMARY KEY,
+                    category_url TEXT,
+                    row TEXT
+                );
+                CREATE TABLE IF NOT EXISTS images (
+                    path TEXT PRIMARY KEY,
+                    url TEXT
+                );
+                """)
+
+    def clear(self):
+        """ Remove the categories and books records (a new crawl starts),
+            the records of the downloaded images stay valid
+        """
+        with self._lock:
+            self._db.executescript("""
+                DELETE FROM categories;
+                DELETE FROM books;
+                """)
+
+    def category(self, url):
+        """ Return the recorded listing of the category
+
+        Parameters
+        ----------
+        url : str
+            The internet address of the category
+
+        Returns
+        -------
+        dict
+            The name, num_books, links, listing and done values
+            (None if the category isn't recorded)
+        """
+
+        with self._lock:
+            row = self._db.execute(
+                    "SELECT name, num_books, links, listing, done "
+                    "FROM categories WHERE url = ?", (url,)).fetchone()
+
+        if row is None:
+            return None
+
+        return {
+                'name': row[0],
+                'num_books': row[1],
+                'links': [tuple(link) for link in json.loads(row[2])],
+                'listing': json.loads(row[3]),
+                'done': bool(row[4]),
+                }
+
+    def add_category(self, url, name, num_books, links, listing):
+        """ Record the complete listing of the category
+
+        Parameters
+        ----------
+        url : str
+            The internet address of the category
+        name : str
+            The name of the category
+        num_books : int
+            The number of books of the category
+        links : list
+            The (url, title) of the books
+        listing : dict
+            The information of the listing pages for each book url
+        """
+
+        with self._lock:
+            self._db.execute(
+                    "INSERT OR REPLACE INTO categories "
+                    "(url, name, num_books, links, listing, done) "
+                    "VALUES (?, ?, ?, ?, ?, 0)",
+                    (url, name, num_books, json.dumps(links),
+                     json.dumps(listing)))
+
+    def done_category(self, url):
+        """ Record that the CSV of the category is complete """
+        with self._lock:
+            self._db.execute("UPDATE categories SET done = 1 WHERE url = ?",
+                             (url,))
+
+    def books(self, category_url):
+        """ Return the recorded rows of the books of the category
+
+        Parameters
+        ----------
+        category_url : str
+            The internet address of the category
+
+        Returns
+        -------
+        dict
+            The rows (as given by Book.to_dict) for each product url
+        """
+
+        with self._lock:
+            rows = self._db.execute(
+                    "SELECT url, row FROM books WHERE category_url = ?",
+                    (category_url,)).fetchall()
+
+        return {url: json.loads(row) for url, row in rows}
+
+    def add_book(self, category_url, row):
+        """ Record the row (as given by Book.to_dict) of a collected book """
+        with self._lock:
+            self._db.execute(
+                    "INSERT OR REPLACE INTO books (url, category_url, row) "
+                    "VALUES (?, ?, ?)",
+                    (row['product_page_url'], category_url, json.dumps(row)))
+
+    def has_image(self, path):
+        """ Return True if the image was completely downloaded to <path> """
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM images WHERE path = ?",
+                                    (os.path.abspath(path),)) \
+                           .fetchone() is not None
+
+    def add_image(self, path, url):
+        """ Record the image downloaded from <url> to <path> """
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO images (path, url) "
+                             "VALUES (?, ?)", (os.path.abspath(path), url))
+
+    def close(self):
+        """ Close the database """
+        with self._lock:
+            self._db.close()
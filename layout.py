@@ -0,0 +1,89 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+''' The purpose of this module is to compute the paths of the files
+    written by a scraping (the CSV files, the images, the journal and
+    the databases), so the output never depends on the current directory.
+'''
+
+from shutil import rmtree
+import os
+
+
+class OutputLayout:
+    """ The purpose of this class is to compute the absolute paths of the
+        output of a scraping: a folder per category (with its CSV file and
+        its images) in the root folder, and the files shared by the
+        categories at the root
+
+    The root is made absolute when the layout is created, so the paths
+    stay the same whatever the current directory becomes, and several
+    categories (or several scrapings, with their own layout) can be
+    written at the same time.
+
+    Attributes
+    ----------
+    root : str
+        the absolute path of the output folder
+
+    Methods
+    -------
+    create(delete_prev=True)
+        remove and re-create (if needed) the root folder
+    path(name)
+        return the path of the <name> file of the root folder
+    category_folder(name)
+        create (if needed) the folder of the category and return its path
+    category_csv(name)
+        return the path (without the .csv extension) of the category CSV
+    """
+
+    def __init__(self, root='data'):
+        """
+        Parameters
+        ----------
+        root : str (default is 'data')
+            The output folder (relative to the current directory)
+        """
+
+        self.root = os.path.abspath(root)
+
+    def __repr__(self):
+        return f"OutputLayout({self.root!r})"
+
+    def create(self, delete_prev=True):
+        """ Remove and re-create (if needed) the root folder
+
+        Parameters
+        ----------
+        delete_prev : bool (default is True)
+            determine if the previous root folder (if any) is removed
+
+        Returns
+        -------
+        str
+            The absolute path of the root folder
+        """
+
+        if delete_prev and os.path.exists(self.root):
+            rmtree(self.root)
+
+        os.makedirs(self.root, exist_ok=True)
+        return self.root
+
+    def path(self, name):
+        """ Return the absolute path of the <name> file of the root folder """
+        return os.path.join(self.root, name)
+
+    def category_folder(self, name):
+        """ Create (if needed) the folder of the <name> category
+            and return its absolute path """
+
+        folder = self.path(name)
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    def category_csv(self, name):
+        """ Return the absolute path (without the .csv extension)
+            of the CSV file of the <name> category """
+        return os.path.join(self.path(name), name.lower().replace(' ', '_'))
@@ -0,0 +1,319 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+''' The purpose of this module is to measure the time spent in each
+    stage of the scraping (fetch, parse, extract, image, csv...)
+    and to export the counters and latency histograms (JSON summary,
+    Prometheus text file or a periodic stats line).
+'''
+
+from bisect import bisect_left
+from threading import Lock, Event, Thread
+import json
+import os
+import sys
+import time
+
+
+# upper bounds (in seconds) of the latency histogram buckets
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+           0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+##################################################
+# Histogram
+##################################################
+
+
+class Histogram:
+    """ The purpose of this class is to count the observed durations in
+        fixed buckets, so the percentiles can be estimated at a low cost
+
+    Attributes
+    ----------
+    bounds : tuple
+        the upper bounds of the buckets (the last bucket has no bound)
+    counts : list
+        the number of observations of each bucket
+    count : int
+        the number of observations
+    sum : float
+        the sum of the observations
+    max : float
+        the highest observation
+
+    Methods
+    -------
+    observe(value)
+        count the value in its bucket
+    percentile(rank)
+        return an estimate of the <rank> percentile
+    """
+
+    def __init__(self, bounds=BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        """ Count the value in its bucket (not thread safe, see Metrics) """
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, rank):
+        """ Return an estimate of the <rank> percentile (interpolated in
+            its bucket), None if nothing was observed """
+
+        if self.count == 0:
+            return None
+
+        target = rank / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= target:
+                low = self.bounds[index - 1] if index > 0 else 0.0
+                high = self.bounds[index] if index < len(self.bounds) \
+                    else self.max
+                return min(self.max,
+                           low + (high - low) * (target - seen) / count)
+            seen += count
+        return self.max
+
+
+##################################################
+# Metrics
+##################################################
+
+
+class Timer:
+    """ Measure the duration of a block and record it in the metrics
+        (the block may set the size attribute to count the bytes) """
+
+    __slots__ = ('metrics', 'stage', 'size', 'start')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+        self.size = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start,
+                             self.size, exc_type is not None)
+
+
+class Metrics:
+    """ The purpose of this class is to keep the counters and the latency
+        histograms of the stages and to send them to the exporters
+
+    Attributes
+    ----------
+    exporters : list
+        the exporters called periodically and when completed
+
+    Methods
+    -------
+    time(stage)
+        return a context manager measuring a block of the stage
+    observe(stage, seconds, size=0, error=False)
+        record a duration of the stage
+    snapshot()
+        return the counters and the percentiles of each stage
+    reset()
+        remove all the recorded durations
+    add_exporter(exporter)
+        send the metrics to the given exporter
+    start(interval)
+        call the exporters every <interval> seconds in background
+    complete()
+        stop the periodic exports and call the exporters a last time
+    """
+
+    def __init__(self):
+        self.exporters = []
+        self._stages = {}  # {stage: [Histogram, errors, bytes]}
+        self._started = time.monotonic()
+        self._lock = Lock()
+        self._stop = None
+
+    def time(self, stage):
+        """ Return a context manager measuring the duration of a block
+            of the stage (an exception counts as an error)
+
+        Parameters
+        ----------
+        stage : str
+            The name of the stage ('fetch', 'parse'...)
+
+        Returns
+        -------
+        Timer
+            The context manager (set its size attribute to count bytes)
+        """
+
+        return Timer(self, stage)
+
+    def observe(self, stage, seconds, size=0, error=False):
+        """ Record a duration (in seconds) of the stage """
+        with self._lock:
+            record = self._stages.get(stage)
+            if record is None:
+                record = self._stages[stage] = [Histogram(), 0, 0]
+            record[0].observe(seconds)
+            record[1] += error
+            record[2] += size
+
+    def snapshot(self):
+        """ Return a dict with the elapsed time and, for each stage, the
+            count, errors, bytes, total time and the latency percentiles
+            (in ms) and cumulated buckets """
+
+        with self._lock:
+            stages = {}
+            for stage, (histogram, errors, size) in self._stages.items():
+                cumulated = 0
+                buckets = []
+                for bound, count in zip(histogram.bounds + ('+Inf',),
+                                        histogram.counts):
+                    cumulated += count
+                    buckets.append((bound, cumulated))
+
+                stages[stage] = {
+                        'count': histogram.count,
+                        'errors': errors,
+                        'bytes': size,
+                        'total_s': histogram.sum,
+                        'mean_ms': 1000 * histogram.sum / histogram.count,
+                        'p50_ms': 1000 * histogram.percentile(50),
+                        'p95_ms': 1000 * histogram.percentile(95),
+                        'p99_ms': 1000 * histogram.percentile(99),
+                        'max_ms': 1000 * histogram.max,
+                        'buckets': buckets,
+                        }
+
+            return {'elapsed_s': time.monotonic() - self._started,
+                    'stages': stages}
+
+    def reset(self):
+        """ Remove all the recorded durations """
+        with self._lock:
+            self._stages = {}
+            self._started = time.monotonic()
+
+    def add_exporter(self, exporter):
+        """ Send the metrics to the exporter (see JSONExporter,
+            PrometheusExporter and StatsLineExporter) """
+        self.exporters.append(exporter)
+
+    def start(self, interval):
+        """ Call the exporters every <interval> seconds in background """
+
+        if not interval or self._stop is not None:
+            return
+
+        self._stop = Event()
+        Thread(target=self.__export_periodically,
+               args=(interval, self._stop), daemon=True).start()
+
+    def complete(self):
+        """ Stop the periodic exports and call the exporters a last time """
+
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
+
+        snapshot = self.snapshot()
+        for exporter in self.exporters:
+            exporter.export(snapshot, final=True)
+
+    # --- PRIVATE METHODS ---
+
+    def __export_periodically(self, interval, stop):
+        while not stop.wait(interval):
+            snapshot = self.snapshot()
+            for exporter in self.exporters:
+                exporter.export(snapshot, final=False)
+
+
+##################################################
+# Exporters
+##################################################
+
+
+def write_atomic(path, text):
+    """ Write the text in a file replaced at once (never read half-written) """
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class JSONExporter:
+    """ Write the metrics summary in a JSON file when completed """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+
+    def export(self, snapshot, final=False):
+        if final:
+            write_atomic(self.path, json.dumps(snapshot, indent=2))
+
+
+class PrometheusExporter:
+    """ Write the metrics in a file using the Prometheus text format
+        (for the textfile collector of node_exporter), on each export """
+
+    def __init__(self, path, prefix='bookscraper'):
+        self.path = os.path.abspath(path)
+        self.prefix = prefix
+
+    def export(self, snapshot, final=False):
+        name = f'{self.prefix}_stage_seconds'
+        lines = [f'# HELP {name} Duration of the scraping stages.',
+                 f'# TYPE {name} histogram']
+
+        stages = snapshot['stages']
+        for stage, values in stages.items():
+            for bound, count in values['buckets']:
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} '
+                             f'{count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {values["total_s"]}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {values["count"]}')
+
+        for counter, key, description in (
+                ('errors', 'errors', 'Failed calls of the scraping stages.'),
+                ('bytes', 'bytes', 'Bytes handled by the scraping stages.')):
+            name = f'{self.prefix}_stage_{counter}_total'
+            lines += [f'# HELP {name} {description}',
+                      f'# TYPE {name} counter']
+            lines += [f'{name}{{stage="{stage}"}} {values[key]}'
+                      for stage, values in stages.items()]
+
+        write_atomic(self.path, '\n'.join(lines) + '\n')
+
+
+class StatsLineExporter:
+    """ Write a line with the count and latencies of each stage on each
+        export (to the standard error by default) """
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+
+    def export(self, snapshot, final=False):
+        stages = ' | '.join(
+                f"{stage} {values['count']} x {values['mean_ms']:.1f}ms "
+                f"(p95 {values['p95_ms']:.1f}ms)"
+                for stage, values in snapshot['stages'].items())
+        print(f"[{snapshot['elapsed_s']:.1f}s] {stages}", file=self.stream,
+              flush=True)
+
+
+metrics = Metrics()
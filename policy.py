@@ -0,0 +1,416 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+''' The purpose of this module is to provide the fetch policy shared
+    by all the requests: a rate limit per host, the retries of the
+    transient errors and a concurrency adapted to the server health.
+'''
+
+from email.utils import parsedate_to_datetime
+from threading import Lock, Condition
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit
+import asyncio
+import random
+import socket
+import time
+
+
+# HTTP status codes worth retrying (the server is overloaded or restarting)
+RETRY_CODES = (429, 500, 502, 503, 504)
+
+
+##################################################
+# TokenBucket
+##################################################
+
+
+class TokenBucket:
+    """ The purpose of this class is to limit the rate of the requests
+        sent to a host, while allowing short bursts
+
+    Attributes
+    ----------
+    rate : float
+        the number of tokens added per second
+    burst : int
+        the maximum number of tokens kept
+
+    Methods
+    -------
+    reserve()
+        take a token and return the number of seconds to wait before using it
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def reserve(self):
+        """ Take a token (possibly one that will only be available later)
+
+        Returns
+        -------
+        float
+            The number of seconds to wait before sending the request
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst,
+                               self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+
+##################################################
+# AdaptiveLimiter
+##################################################
+
+
+class AdaptiveLimiter:
+    """ The purpose of this class is to adapt the number of requests
+        running at the same time to the latency and the errors observed
+
+    The limit grows by one request once per <limit> successful requests
+    and is reduced when the server fails (halved) or when the latency
+    exceeds <tolerance> times the lowest latency observed (10% less).
+
+    Attributes
+    ----------
+    limit : float
+        the current number of requests allowed at the same time
+    minimum : int
+        the lowest limit
+    maximum : int
+        the highest limit
+    tolerance : float
+        the latency increase (compared to the lowest one) considered as
+        a sign of overload
+
+    Methods
+    -------
+    acquire()
+        wait until a request can be sent
+    release(latency=None, ok=True)
+        record the end of a request
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=64, tolerance=2.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.tolerance = tolerance
+        self._in_flight = 0
+        self._baseline = None  # lowest latency observed
+        self._cond = Condition()
+
+    def acquire(self):
+        """ Wait until the number of running requests is below the limit """
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, latency=None, ok=True):
+        """ Record the end of a request and adapt the limit
+
+        Parameters
+        ----------
+        latency : float (default is None)
+            The duration of the request in seconds (None if it failed)
+        ok : bool (default is True)
+            Determine if the server answered properly
+        """
+
+        with self._cond:
+            self._in_flight -= 1
+
+            if not ok:
+                self.limit = max(self.minimum, self.limit / 2)
+            elif latency is not None:
+                if self._baseline is None or latency < self._baseline:
+                    self._baseline = latency
+                else:
+                    # let the baseline follow a slowly changing server
+                    self._baseline *= 1.01
+
+                if latency > self._baseline * self.tolerance:
+                    self.limit = max(self.minimum, self.limit * 0.9)
+                else:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+            self._cond.notify_all()
+
+
+##################################################
+# FetchPolicy
+##################################################
+
+
+class FetchPolicy:
+    """ The purpose of this class is to send the requests through a
+        rate limit per host, to retry the transient errors and to adapt
+        the concurrency to the server health
+
+    The timeouts, the connection errors and the 429 / 5xx answers are
+    retried up to <retries> times, after an exponential backoff with
+    full jitter (random delay between 0 and backoff * 2**attempt, at
+    most max_backoff, or the Retry-After delay sent by the server).
+
+    Attributes
+    ----------
+    rate : float
+        the maximum number of requests per second sent to each host
+        (None means no limit)
+    burst : int
+        the number of requests that may be sent at once to a host
+    max_retries : int
+        the maximum number of retries of a request
+    backoff : float
+        the base delay (in seconds) of the exponential backoff
+    max_backoff : float
+        the maximum delay (in seconds) between two attempts
+    limiter : AdaptiveLimiter
+        the adaptive concurrency limit (None when not adaptive)
+    retries : int
+        the number of retries so far
+    failures : int
+        the number of requests still failing after their retries
+    throttled : float
+        the total number of seconds waited because of the rate limit
+
+    Methods
+    -------
+    configure(rate, burst, retries, backoff, max_backoff, adaptive, max_concurrency)
+        change the settings of the policy
+    get(url, send, headers=None)
+        send the request with the policy
+    get_async(url, send, headers=None)
+        coroutine sending the request with the policy (no adaptive limit)
+    stats()
+        return the policy counters
+    """
+
+    def __init__(self, rate=None, burst=10, retries=3, backoff=0.5,
+                 max_backoff=10):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limiter = None
+        self.retries = 0
+        self.failures = 0
+        self.throttled = 0.0
+        self._buckets = {}  # {host: TokenBucket}
+        self._lock = Lock()
+
+    def configure(self, rate=None, burst=None, retries=None, backoff=None,
+                  max_backoff=None, adaptive=None, max_concurrency=64):
+        """ Change the settings of the policy (None keeps the current value)
+
+        Parameters
+        ----------
+        rate : float
+            The maximum number of requests per second sent to each host
+            (0 means no limit)
+        burst : int
+            The number of requests that may be sent at once to a host
+        retries : int
+            The maximum number of retries of a request
+        backoff : float
+            The base delay (in seconds) of the exponential backoff
+        max_backoff : float
+            The maximum delay (in seconds) between two attempts
+        adaptive : bool
+            Determine if the concurrency is adapted to the server health
+        max_concurrency : int (default is 64)
+            The highest concurrency reached by the adaptive limit
+        """
+
+        if rate is not None:
+            self.rate = rate or None
+        if burst is not None:
+            self.burst = burst
+        if retries is not None:
+            self.max_retries = retries
+        if backoff is not None:
+            self.backoff = backoff
+        if max_backoff is not None:
+            self.max_backoff = max_backoff
+        if adaptive is not None:
+            self.limiter = AdaptiveLimiter(maximum=max_concurrency) \
+                if adaptive else None
+
+        with self._lock:
+            self._buckets = {}
+
+    def get(self, url, send, headers=None):
+        """ Send the request with the policy
+
+        Parameters
+        ----------
+        url : str
+            The internet address to request
+        send : function
+            Send the request: send(url, headers) -> Response
+        headers : dict
+            The additional request headers
+
+        Returns
+        -------
+        Response
+            The response returned by send
+
+        Raises
+        ------
+        HTTPError, URLError
+            the error of the last attempt
+        """
+
+        for attempt in range(self.max_retries + 1):
+            delay = self.__reserve(url)
+            if delay:
+                time.sleep(delay)
+
+            if self.limiter is not None:
+                self.limiter.acquire()
+            start = time.monotonic()
+            try:
+                response = send(url, headers)
+            except Exception as e:
+                if self.limiter is not None:
+                    self.limiter.release(ok=not self.is_retryable(e))
+                delay = self.__retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+
+            if self.limiter is not None:
+                self.limiter.release(time.monotonic() - start)
+            return response
+
+    async def get_async(self, url, send, headers=None):
+        """ Send the request with the policy, as a coroutine
+            (the concurrency is bounded by the caller)
+
+        Parameters
+        ----------
+        url : str
+            The internet address to request
+        send : coroutine function
+            Send the request: await send(url, headers) -> Response
+        headers : dict
+            The additional request headers
+
+        Returns
+        -------
+        Response
+            The response returned by send
+        """
+
+        for attempt in range(self.max_retries + 1):
+            delay = self.__reserve(url)
+            if delay:
+                await asyncio.sleep(delay)
+
+            try:
+                return await send(url, headers)
+            except Exception as e:
+                delay = self.__retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def is_retryable(error):
+        """ Return True if the error may disappear when retrying """
+        if isinstance(error, HTTPError):
+            return error.code in RETRY_CODES
+        if isinstance(error, URLError):
+            # network errors only (not the unknown hosts, bad urls...)
+            return isinstance(error.reason, OSError) and \
+                not isinstance(error.reason, socket.gaierror)
+        return isinstance(error, (TimeoutError, ConnectionError))
+
+    def stats(self):
+        """ Return a dict with the policy counters """
+        with self._lock:
+            return {
+                    'retries': self.retries,
+                    'failures': self.failures,
+                    'throttled': self.throttled,
+                    'concurrency': None if self.limiter is None
+                    else int(self.limiter.limit),
+                    }
+
+    # --- PRIVATE METHODS ---
+
+    def __reserve(self, url):
+        if self.rate is None:
+            return 0
+
+        host = urlsplit(url).netloc
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate,
+                                                           self.burst)
+
+        delay = bucket.reserve()
+        if delay:
+            with self._lock:
+                self.throttled += delay
+        return delay
+
+    def __retry_delay(self, error, attempt):
+        """ Return the delay before the next attempt (None: no retry) """
+
+        if not self.is_retryable(error):
+            return None
+
+        if attempt >= self.max_retries:
+            with self._lock:
+                self.failures += 1
+            return None
+
+        with self._lock:
+            self.retries += 1
+
+        delay = random.uniform(0, min(self.max_backoff,
+                                      self.backoff * 2 ** attempt))
+
+        retry_after = self.__retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_backoff))
+
+        return delay
+
+    def __retry_after(self, error):
+        headers = getattr(error, 'headers', None)
+        value = headers.get('Retry-After') if headers is not None else None
+        if not value:
+            return None
+
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp()
+                       - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+fetch_policy = FetchPolicy()
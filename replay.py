@@ -0,0 +1,420 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+''' The purpose of this module is to replay a recorded copy of the
+    http://books.toscrape.com/ website from a local HTTP server,
+    optionally slowed down or failing, so the scraper can be tested and
+    measured offline and in a reproducible way.
+
+    A copy is recorded while scraping with 'python3 scraper.py --record <dirname>'
+    and served with 'python3 replay.py <dirname>'.
+'''
+
+from functools import partial
+from hashlib import md5
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from threading import Lock, Thread
+from urllib.parse import urlsplit, unquote
+import argparse
+import os
+import random
+import time
+
+
+##################################################
+# Corpus
+##################################################
+
+
+class Corpus:
+    """ The purpose of this class is to store the recorded responses
+        in a folder laid out as the website, so it can be served as is
+
+    Each body is stored at the path of its url in the <dirname> folder
+    (the host and the query are ignored, 'index.html' is added to the
+    folders), so the relative links of the pages keep working.
+
+    Attributes
+    ----------
+    dirname : str
+        the absolute path of the folder holding the recorded responses
+    recorded : int
+        the number of responses recorded so far
+
+    Methods
+    -------
+    path(url)
+        return the path of the file holding the response of the url
+    save(url, body)
+        record the body of the response of the url
+    """
+
+    def __init__(self, dirname):
+        self.dirname = os.path.abspath(dirname)
+        self.recorded = 0
+        self._lock = Lock()
+
+        os.makedirs(self.dirname, exist_ok=True)
+
+    def path(self, url):
+        """ Return the path of the file holding the response of the url """
+        path = unquote(urlsplit(url).path)
+        if path == '' or path.endswith('/'):
+            path += 'index.html'
+
+        parts = [part for part in path.split('/') if part not in ('', '.', '..')]
+        return os.path.join(self.dirname, *parts)
+
+    def save(self, url, body):
+        """ Record the body (bytes) of the response of the url """
+
+        path = self.path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.recorded += 1
+
+
+##################################################
+# ReplayServer
+##################################################
+
+
+class ReplayHandler(SimpleHTTPRequestHandler):
+    """ Serve the files of the corpus, after the latency of the server
+        and with the errors injected by the server """
+
+    protocol_version = 'HTTP/1.1'  # keep the connections alive
+    disable_nagle_algorithm = True  # no delayed small writes
+
+    def do_GET(self):
+        if self.server.replay.inject():
+            self.send_response(self.server.replay.error_code)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+class ReplayHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # many scraper connections at once
+
+
+class ReplayServer:
+    """ The purpose of this class is to serve a recorded copy of the
+        website on a local port, in a background thread
+
+    Attributes
+    ----------
+    dirname : str
+        the folder holding the recorded copy
+    url : str
+        the address of the home page of the served copy
+    latency : float
+        the number of seconds waited before answering each request
+    error_rate : float
+        the probability (0 to 1) of answering a request with error_code
+    error_code : int
+        the HTTP status code of the injected errors
+    requests : int
+        the number of requests received
+    errors : int
+        the number of errors injected
+
+    Methods
+    -------
+    start()
+        serve the copy in a background thread
+    serve_forever()
+        serve the copy in the current thread (until close is called)
+    close()
+        stop the server
+    inject()
+        wait the latency and return True if the request must fail
+    """
+
+    def __init__(self, dirname, host='127.0.0.1', port=0, latency=0.0,
+                 error_rate=0.0, error_code=503, seed=None):
+        """
+        Parameters
+        ----------
+        dirname : str
+            The folder holding the recorded copy
+        host : str (default is '127.0.0.1')
+            The interface listened
+        port : int (default is 0)
+            The port listened (0 picks a free port)
+        latency : float (default is 0)
+            The number of seconds waited before answering each request
+        error_rate : float (default is 0)
+            The probability (0 to 1) of answering a request with error_code
+        error_code : int (default is 503)
+            The HTTP status code of the injected errors
+        seed : int (default is None)
+            The seed of the injected errors (for reproducible runs)
+        """
+
+        self.dirname = os.path.abspath(dirname)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = Lock()
+        self._thread = None
+
+        handler = partial(ReplayHandler, directory=self.dirname)
+        self._server = ReplayHTTPServer((host, port), handler)
+        self._server.replay = self
+        self.url = f'http://{host}:{self._server.server_port}/'
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self):
+        """ Serve the copy in a background thread and return the server """
+        self._thread = Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """ Serve the copy in the current thread (until close is called) """
+        self._server.serve_forever()
+
+    def close(self):
+        """ Stop the server """
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread = None
+        self._server.server_close()
+
+    def inject(self):
+        """ Wait the latency and return True if the request must fail """
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self._lock:
+            self.requests += 1
+            failed = self.error_rate > 0 and \
+                self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+            return failed
+
+
+##################################################
+# Sample site
+##################################################
+
+SAMPLE_CATEGORIES = (('Travel', 11), ('Poetry', 25))
+
+HOME_PAGE = """<!DOCTYPE html>
+<html lang="en-us"><head><title>All products | Books to Scrape - Sandbox</title></head>
+<body id="default" class="default">
+<div class="side_categories"><ul class="nav nav-list"><li>
+<a href="catalogue/category/books_1/index.html">Books</a>
+<ul>{categories}</ul></li></ul></div>
+<form method="get" class="form-horizontal"><strong>{num_books}</strong> results.</form>
+</body></html>"""
+
+HOME_CATEGORY = """
+<li><a href="catalogue/category/books/{slug}/index.html">
+        {name}
+    </a></li>"""
+
+LISTING_PAGE = """<!DOCTYPE html>
+<html lang="en-us"><head><title>{name} | Books to Scrape - Sandbox</title></head>
+<body id="default" class="default">
+<div class="page-header action"><h1>{name}</h1></div>
+<form method="get" class="form-horizontal"><strong>{num_books}</strong> results.</form>
+<section><ol class="row">{books}</ol>
+<ul class="pager">{next}</ul></section>
+</body></html>"""
+
+LISTING_BOOK = """
+<li><article class="product_pod">
+<a href="../../../{slug}/index.html"><img src="../../../../{image}" alt="{title}" class="thumbnail"></a>
+<p class="star-rating {rating}"></p>
+<h3><a href="../../../{slug}/index.html" title="{title}">{title}</a></h3>
+<div class="product_price"><p class="price_color">{price}</p>
+<p class="instock availability">
+        In stock
+</p></div></article></li>"""
+
+PRODUCT_PAGE = """<!DOCTYPE html>
+<html lang="en-us"><head><title>{title} | Books to Scrape - Sandbox</title></head>
+<body id="default" class="default">
+<ul class="breadcrumb"><li><a href="../../index.html">Home</a></li>
+<li><a href="../category/books_1/index.html">Books</a></li>
+<li><a href="../category/books/{category_slug}/index.html">{category}</a></li>
+<li class="active">{title}</li></ul>
+<article class="product_page"><div class="row">
+<div class="item active"><img src="../../{image}" alt="{title}" /></div>
+<div class="col-sm-6 product_main"><h1>{title}</h1>
+<p class="price_color">{price}</p>
+<p class="star-rating {rating}"></p></div></div>
+<div id="product_description" class="sub-header"><h2>Product Description</h2></div>
+<p>{description}</p>
+<table class="table table-striped">
+<tr><th>UPC</th><td>{upc}</td></tr>
+<tr><th>Product Type</th><td>Books</td></tr>
+<tr><th>Price (excl. tax)</th><td>{price}</td></tr>
+<tr><th>Price (incl. tax)</th><td>{price}</td></tr>
+<tr><th>Tax</th><td>£0.00</td></tr>
+<tr><th>Availability</th><td>In stock ({available} available)</td></tr>
+</table></article>
+</body></html>"""
+
+
+# the markup added to the product pages up to the page_size of sample_site
+# (after the product, as the "recently viewed" books of the website)
+PRODUCT_FILLER = """
+<li class="col-xs-6 col-sm-4 col-md-3 col-lg-3"><article class="product_pod">
+<div class="image_container"><a href="../recent-{number}/index.html">
+<img src="../../media/cache/recent-{number}.jpg" alt="Recent book {number}" class="thumbnail"></a></div>
+<p class="star-rating Three"><i class="icon-star"></i><i class="icon-star"></i>
+<i class="icon-star"></i><i class="icon-star"></i><i class="icon-star"></i></p>
+<h3><a href="../recent-{number}/index.html" title="Recent book {number}">Recent book {number}</a></h3>
+<div class="product_price"><p class="price_color">£{number}.00</p>
+<p class="instock availability"><i class="icon-ok"></i> In stock</p>
+<form><button type="submit" class="btn btn-primary btn-block">Add to basket</button></form>
+</div></article></li>"""
+
+
+def sample_site(dirname, categories=SAMPLE_CATEGORIES, per_page=20,
+                image_size=2048, seed=0, page_size=0):
+    """ Write a small synthetic copy of the website (with the markup of
+        the parts used by the scraper) in the <dirname> folder, for the
+        tests and the benchmarks when no recorded copy is available
+
+    Parameters
+    ----------
+    dirname : str
+        The folder of the copy (created if needed)
+    categories : list (default is Travel: 11 books, Poetry: 25 books)
+        The (name, number of books) of the categories
+    per_page : int (default is 20)
+        The number of books of each listing page
+    image_size : int (default is 2048)
+        The size of the images in bytes
+    seed : int (default is 0)
+        The seed of the titles, prices and images
+    page_size : int (default is 0)
+        The minimum size of the product pages in bytes, reached with
+        filler markup after the product (0: no filler)
+
+    Returns
+    -------
+    Corpus
+        The corpus of the copy
+    """
+
+    corpus = Corpus(dirname)
+    rand = random.Random(seed)
+    base = 'http://books.toscrape.com/'
+    book_id = 1000
+    menu = ''
+
+    for category_id, (name, num_books) in enumerate(categories, 2):
+        category_slug = f'{name.lower().replace(" ", "-")}_{category_id}'
+        category_url = f'{base}catalogue/category/books/{category_slug}/'
+        menu += HOME_CATEGORY.format(slug=category_slug, name=name)
+
+        books = []
+        for number in range(num_books):
+            title = f'{name} Book {number + 1}'
+            slug = f'{name.lower().replace(" ", "-")}-book-{number + 1}_{book_id}'
+            key = md5(slug.encode()).hexdigest()
+            book = {
+                    'slug': slug,
+                    'title': title,
+                    'description': f'The description of {title}.',
+                    'image': f'media/cache/{key[:2]}/{key[2:4]}/{key}.jpg',
+                    'price': f'£{rand.randint(10, 59)}.{rand.randint(0, 99):02}',
+                    'rating': rand.choice(['One', 'Two', 'Three', 'Four', 'Five']),
+                    'upc': key[:16],
+                    'available': rand.randint(1, 22),
+                    'category': name,
+                    'category_slug': category_slug,
+                    }
+            books.append(book)
+            book_id -= 1
+
+            page = PRODUCT_PAGE.format(**book)
+            filler, recent = '', 0
+            while len(page) + len(filler) < page_size:
+                recent += 1
+                filler += PRODUCT_FILLER.format(number=recent)
+            if filler:
+                page = page.replace('</body>', f'<ol class="row">{filler}</ol>\n</body>')
+            corpus.save(f'{base}catalogue/{slug}/index.html', page.encode())
+            corpus.save(base + book['image'],
+                        bytes(rand.getrandbits(8) for _ in range(image_size)))
+
+        pages = [books[i:i + per_page] for i in range(0, num_books, per_page)]
+        for number, page in enumerate(pages, 1):
+            next_page = f'<li class="next"><a href="page-{number + 1}.html">next</a></li>' \
+                if number < len(pages) else ''
+            corpus.save(category_url + ('' if number == 1 else f'page-{number}.html'),
+                        LISTING_PAGE.format(
+                            name=name, num_books=num_books, next=next_page,
+                            books=''.join(LISTING_BOOK.format(**book)
+                                          for book in page)).encode())
+
+    corpus.save(base, HOME_PAGE.format(
+            categories=menu,
+            num_books=sum(num_books for _, num_books in categories)).encode())
+
+    return corpus
+
+
+##################################################
+# Main
+##################################################
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+            description="Serve a recorded copy of the website")
+    parser.add_argument('dirname', type=str,
+                        help="folder of the copy (see scraper.py --record)")
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, default=8765)
+    parser.add_argument('-l', '--latency', type=float, default=0.0,
+                        help="seconds waited before answering each request")
+    parser.add_argument('-e', '--error-rate', type=float, default=0.0,
+                        help="probability of answering with an error")
+    parser.add_argument('--error-code', type=int, default=503,
+                        help="status code of the injected errors")
+    parser.add_argument('--seed', type=int, default=None,
+                        help="seed of the injected errors")
+    parser.add_argument('--sample', action='store_true',
+                        help="write a small synthetic copy in the folder first")
+    args = parser.parse_args()
+
+    if args.sample:
+        sample_site(args.dirname)
+
+    server = ReplayServer(args.dirname, args.host, args.port, args.latency,
+                          args.error_rate, args.error_code, args.seed)
+    print(f"Serving {server.dirname} on {server.url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
@@ -6,17 +6,40 @@
 '''
 
 from urllib.request import urljoin
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import argparse
-from os import chdir, mkdir
+
+from bs4 import SoupStrainer
 
 from book import Book
 from category import Category
-from utils import progress_monitor, FileIO, log_error
+from images import ImageDownloader
+from journal import CrawlJournal
+from layout import OutputLayout
+from columnar import ColumnarWriter, COLUMNAR_FORMATS, BOOK_TYPES, HAS_PYARROW
+from utils import progress_monitor, FileIO, SQLiteWriter, log_error, \
+    report_error, error_channel
+from session import http_session
+from policy import fetch_policy
+from metrics import metrics, JSONExporter, PrometheusExporter, \
+    StatsLineExporter
 
 ##################################################
 # Scraper
 ##################################################
 
+# the parts of the home page used by the Scraper class
+HOME_STRAINER = SoupStrainer(class_=['form-horizontal', 'side_categories'])
+
+# the record of the crawl progress, in the 'data' folder
+JOURNAL_NAME = '.journal.sqlite'
+
+# the database of the 'sqlite' output, in the 'data' folder
+DATABASE_NAME = 'books.sqlite'
+
+# the file of the 'parquet' and 'arrow' outputs (+ extension), in the 'data' folder
+COLUMNAR_NAME = 'books'
+
 
 class Scraper():
     """ The purpose of this class is to collect
@@ -28,6 +51,47 @@ class Scraper():
     categories : list
     links : list
     num_books : int
+    workers : int
+        the maximum number of product pages fetched at the same time
+        in each category
+    category_workers : int
+        the maximum number of categories scraped at the same time
+    max_requests : int
+        the maximum number of requests (listing pages, product pages
+        and images) running at the same time for the whole scraping
+        (None means no limit)
+    budget : BoundedSemaphore
+        the request budget of this scraping, given to its categories
+        (None means no limit, see FileIO.request_budget)
+    layout : OutputLayout
+        the paths of the output (default is the 'data' folder)
+    root : str
+        the absolute path of the output folder (None until collected)
+    incremental : bool
+        determine if the previous 'data' folder is updated instead of
+        being replaced (only the new or changed books are collected)
+    stream : bool
+        determine if each book is written to the CSV as soon as it is
+        collected (the books aren't kept in the categories)
+    image_workers : int
+        the number of images downloaded at the same time in background
+        (when 0, each image is downloaded after its product page)
+    resume : bool
+        determine if the crawl recorded in the journal of the previous
+        'data' folder is finished, instead of starting a new crawl
+        (what was already collected isn't collected again)
+    journaling : bool
+        determine if the crawl progress is recorded in a journal, so it
+        can be resumed if interrupted (always the case when resuming)
+    journal : CrawlJournal
+        the record of the crawl progress (None until collected, or
+        without journaling)
+    output : str
+        'csv' to write a CSV file per category, or 'sqlite' to write
+        all the books in the 'books' table of the data/books.sqlite
+        database (indexed on the UPC, the category and the url), or
+        'parquet' / 'arrow' to write them in the data/books.parquet or
+        data/books.arrow file (typed columns, a row group per category)
 
     Methods
     -------
@@ -35,11 +99,28 @@ class Scraper():
         connect to the given url and collect the data
     """
 
-    def __init__(self, url):
+    def __init__(self, url, workers=1, category_workers=1, max_requests=None,
+                 incremental=False, stream=False, image_workers=0,
+                 resume=False, output='csv', layout=None, journaling=False):
         self.site_url = url
         self.links = []
         self.categories = []
         self.num_books = 0
+        self.workers = workers
+        self.category_workers = category_workers
+        self.max_requests = max_requests
+        self.budget = None
+        self.layout = layout or OutputLayout('data')
+        self.root = None
+        self.incremental = incremental
+        self.stream = stream
+        self.image_workers = image_workers
+        self.resume = resume
+        self.journaling = journaling or resume
+        self.journal = None
+        self.output = output
+        self._sink = None
+        self._downloader = None
 
         if(url is not None):
             self.collect()
@@ -47,10 +128,14 @@ class Scraper():
     def collect(self):
         """ Connect to the home-page and grab the information """
 
-        self._soup = FileIO.connect_with_bs4(self.site_url)
+        self.budget = FileIO.request_budget(self.max_requests)
+
+        self._soup = FileIO.connect_with_bs4(self.site_url, HOME_STRAINER,
+                                             self.budget)
 
         self.num_books = self.__scrap_num_books()
         self.links = self.__scrap_links()
+        self._soup = None  # release the parsed tree
         self.categories = self.__scrap_categories()
 
     # --- PRIVATE METHODS ---
@@ -75,64 +160,226 @@ class Scraper():
     @log_error
     def __scrap_categories(self, to_csv=False):
 
-        FileIO.init_root('data', False)
-        categories = []
+        self.root = self.layout.create(not (self.incremental or self.resume))
+
+        # the recorded crawl can be resumed if interrupted
+        if self.journaling:
+            self.journal = CrawlJournal(self.layout.path(JOURNAL_NAME))
+            if not self.resume:
+                self.journal.clear()
 
         progress_monitor.allbooks_init(self.num_books, self.site_url)
+        self._categories_done = 0
+
+        if self.image_workers > 0:
+            self._downloader = ImageDownloader(self.image_workers,
+                                               self.image_workers * 25)
+
+        if self.output == 'sqlite':
+            self._sink = SQLiteWriter(
+                    self.layout.path(DATABASE_NAME), Book.FIELDS,
+                    key='product_page_url',
+                    indexes=['universal_product_code', 'category'],
+                    types={'number_available': 'INTEGER',
+                           'review_rating': 'INTEGER'})
+        elif self.output in COLUMNAR_FORMATS:
+            self._sink = ColumnarWriter(
+                    self.layout.path(COLUMNAR_NAME
+                                     + COLUMNAR_FORMATS[self.output]),
+                    Book.FIELDS, self.output, types=BOOK_TYPES)
 
-        for link in self.links:
+        try:
+            # the categories are scraped in parallel but stored in the menu order
+            with ThreadPoolExecutor(max_workers=self.category_workers) as executor:
+                futures = [executor.submit(self.__scrap_category, link)
+                           for link in self.links]
+
+                for future in as_completed(futures):
+                    self._categories_done += 1
+
+                # a failed category is left out, not the whole list
+                categories = []
+                for link, future in zip(self.links, futures):
+                    try:
+                        categories.append(future.result())
+                    except Exception as e:
+                        report_error(f"Can't load the category page ::"
+                                     f"\n{link[0]}\n{e}",
+                                     url=link[0], stage='listing')
+        finally:
+            if self._downloader is not None:
+                self._downloader.close()  # wait for the remaining images
+
+            if self._sink is not None:
+                self._sink.close()
+
+            if self.journal is not None:
+                self.journal.close()
 
-            progress_monitor.category_update(
-                    len(categories),
-                    len(self.links),
-                    link[1])
+        return categories
 
-            category = Category(link[0])
-            categories.append(category)
+    def __scrap_category(self, link):
 
-            FileIO.open_category(category.name)
-            category.write_csv()
-            FileIO.close_category()
+        progress_monitor.category_update(
+                self._categories_done,
+                len(self.links),
+                link[1])
 
-        return categories
+        done = False
+        if self.journal is not None:
+            state = self.journal.category(link[0])
+            done = state is not None and state['done']
+
+        category = Category(link[0], workers=self.workers, layout=self.layout,
+                            incremental=self.incremental, stream=self.stream,
+                            downloader=self._downloader, journal=self.journal,
+                            sink=self._sink, budget=self.budget)
+        if self._sink is None and not self.stream and category.books \
+                and not done:
+            category.write_csv(mode='w')
+
+        if self.output in COLUMNAR_FORMATS:
+            self._sink.flush(category.name)  # one row group per category
+
+        # books is None when the collect of the books raised part-way
+        if self.journal is not None and category.books is not None and \
+                category.failed_books == 0:
+            self.journal.done_category(link[0])
+
+        return category
 
 
 ##################################################
 # Main
 ##################################################
 
-@log_error
-def move_to_path(path):
-    path_list = path.split('/')
-    for dirname in path_list:
-        try:
-            mkdir(dirname)
-        except Exception:
-            pass
-        chdir(dirname)
-
-
 if __name__ == '__main__':
 
     parser = argparse.ArgumentParser()
     parser.add_argument('-s', '--slide', type=int, help="Hello world")
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help="number of product pages fetched at the same time")
+    parser.add_argument('-c', '--categories', type=int, default=1,
+                        help="number of categories scraped at the same time")
+    parser.add_argument('-r', '--max-requests', type=int, default=None,
+                        help="maximum number of requests running at the same time")
+
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help="only scrape the new or changed books")
+    parser.add_argument('-o', '--output', type=str, default='csv',
+                        choices=['csv', 'sqlite'] + list(COLUMNAR_FORMATS),
+                        help="write a CSV per category, a SQLite database "
+                             "or a Parquet / Arrow file (needs pyarrow)")
+    parser.add_argument('--resume', action='store_true',
+                        help="finish the interrupted scraping of the 'data' folder")
+    parser.add_argument('--journal', dest='journaling', action='store_true',
+                        help="record the scraping progress, so it can be resumed")
+    parser.add_argument('--stream', action='store_true',
+                        help="write each book as soon as it is collected")
+    parser.add_argument('--image-workers', type=int, default=0,
+                        help="number of images downloaded at the same time in background")
+    parser.add_argument('--async', dest='async_engine', action='store_true',
+                        help="send all the requests from a single event loop")
+    parser.add_argument('--rate', type=float, default=None,
+                        help="maximum number of requests per second sent to the website")
+    parser.add_argument('--retries', type=int, default=None,
+                        help="number of retries of the failed requests (default is 3)")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="adapt the number of requests to the website response times")
+    parser.add_argument('-p', '--pool-size', type=int, default=None,
+                        help="number of idle connections kept open per host")
+    parser.add_argument('-t', '--timeout', type=float, default=None,
+                        help="number of seconds before a request is aborted")
+
+    parser.add_argument('--parser', type=str, default=None,
+                        choices=['lxml', 'html.parser'],
+                        help="HTML parser (default is lxml when installed)")
+    parser.add_argument('--strain', action='store_true',
+                        help="only parse the parts of the pages used")
+    parser.add_argument('--parse-workers', type=int, default=0,
+                        help="number of processes parsing the product pages")
+    parser.add_argument('--cache', type=str, default=None,
+                        help="folder where the fetched pages and images are kept")
+    parser.add_argument('--cache-size', type=int, default=500,
+                        help="maximum size of the cache folder (in MB)")
+    parser.add_argument('--cache-ttl', type=float, default=0,
+                        help="number of seconds before a cached page is revalidated")
+    parser.add_argument('--image-store', type=str, default=None,
+                        help="folder where a single copy of each image is kept")
+    parser.add_argument('--verify-images', action='store_true',
+                        help="check the sha256 of the stored images before use")
+    parser.add_argument('--url', type=str, default='http://books.toscrape.com',
+                        help="address of the website (or of a replay.py server)")
+    parser.add_argument('--record', type=str, default=None,
+                        help="folder where a copy of the fetched website is recorded")
+    parser.add_argument('--progress', type=str, default='auto',
+                        choices=['auto', 'bar', 'log', 'off'],
+                        help="progress bars, status lines or nothing "
+                             "(default: bars in a terminal, else lines)")
+    parser.add_argument('--progress-rate', type=float, default=10,
+                        help="maximum number of redraws per second of the bars")
+    parser.add_argument('--metrics', type=str, default=None,
+                        help="JSON file of the time spent in each stage")
+    parser.add_argument('--metrics-prom', type=str, default=None,
+                        help="file of the stage metrics in the Prometheus text format")
+    parser.add_argument('--metrics-interval', type=float, default=0,
+                        help="seconds between two stats lines (on stderr)")
+    parser.add_argument('--error-report', type=str, default=None,
+                        help="JSON-lines file of the errors (url, stage, field)")
 
     args = parser.parse_args()
+    if args.output in COLUMNAR_FORMATS and not HAS_PYARROW:
+        parser.error(f"the {args.output} output needs pyarrow "
+                     "(pip install pyarrow)")
+
+    if args.async_engine:
+        # the options of the threaded engine only
+        unsupported = [option for option, used in (
+                ('--cache', args.cache),
+                (f'--output {args.output}', args.output != 'csv'),
+                ('--stream', args.stream),
+                ('--incremental', args.incremental),
+                ('--resume', args.resume),
+                ('--journal', args.journaling),
+                ('--image-workers', args.image_workers)) if used]
+        if unsupported:
+            parser.error(f"--async doesn't support {', '.join(unsupported)}")
+
+    http_session.configure(args.pool_size, args.timeout)
+    fetch_policy.configure(rate=args.rate, retries=args.retries,
+                           adaptive=args.adaptive,
+                           max_concurrency=args.max_requests or 64)
+    FileIO.set_parser(args.parser, args.strain)
+    FileIO.set_parse_workers(args.parse_workers)
+    FileIO.set_cache(args.cache, args.cache_size*1024*1024, args.cache_ttl)
+    FileIO.set_image_store(args.image_store, args.verify_images)
+    FileIO.set_recorder(args.record)
+    progress_monitor.configure(args.progress, args.progress_rate)
+    error_channel.configure(report=args.error_report)
+
+    if args.metrics:
+        metrics.add_exporter(JSONExporter(args.metrics))
+    if args.metrics_prom:
+        metrics.add_exporter(PrometheusExporter(args.metrics_prom))
+    if args.metrics_interval:
+        metrics.add_exporter(StatsLineExporter())
+        metrics.start(args.metrics_interval)
 
     if(args.slide == 1):
         # play with Book class
         print("This part runs the product page scraping only.")
         print("You can check the generated files in demo/slide1")
 
-        move_to_path('demo/slide1')
+        layout = OutputLayout('demo/slide1')
+        layout.create(False)
 
         prod_url = 'http://books.toscrape.com/catalogue/a-light-in-the-attic_1000/index.html'
         book = Book(prod_url)
-        book.write_csv('OnProductAppend')
+        book.write_csv(layout.path('OnProductAppend'))
         book.collect()
-        book.write_csv('OnProductAlone', 'w')
-        book.write_csv('OnProductAlone', 'w')
-        book.write_csv('OnProductAppend')
+        book.write_csv(layout.path('OnProductAlone'), 'w')
+        book.write_csv(layout.path('OnProductAlone'), 'w')
+        book.write_csv(layout.path('OnProductAppend'))
         progress_monitor.complete()
 
     elif(args.slide == 2):
@@ -140,12 +387,13 @@ if __name__ == '__main__':
         print("This runs the category page scraping (and hence the product pages)'")
         print("You can check the generated files in demo/slide2")
 
-        move_to_path('demo/slide2')
+        layout = OutputLayout('demo/slide2')
+        layout.create(False)
 
         cat_url = 'http://books.toscrape.com/catalogue/category/books/fiction_10/index.html'
-        cat1 = Category(cat_url)
-        cat1.write_csv('cat1')
-        cat1.write_csv('cat1')
+        cat1 = Category(cat_url, workers=args.workers, layout=layout)
+        cat1.write_csv(layout.path('cat1'))
+        cat1.write_csv(layout.path('cat1'))
         progress_monitor.complete()
 
     elif(args.slide == 3):
@@ -153,10 +401,11 @@ if __name__ == '__main__':
         print("This runs the whole website scraping")
         print("You can check the generated files in demo/slide3")
 
-        move_to_path('demo/slide3')
-
-        site_url = 'http://books.toscrape.com'
-        site = Scraper(site_url)
+        site_url = args.url
+        site = Scraper(site_url, args.workers, args.categories,
+                       args.max_requests, args.incremental, args.stream,
+                       args.image_workers, args.resume, args.output,
+                       OutputLayout('demo/slide3/data'), args.journaling)
         progress_monitor.complete()
 
     elif(args.slide == 4):
@@ -164,13 +413,28 @@ if __name__ == '__main__':
         print("This scrape an image")
         print("You can check the generated files in demo/slide4")
 
-        move_to_path('demo/slide4')
+        layout = OutputLayout('demo/slide4')
+        layout.create(False)
 
         image_url = 'http://books.toscrape.com/media/cache/a3/9e/a39e7c5c9fc61c2ae0f81116aa8cbb0e.jpg'
-        FileIO.download_image(image_url, 'demo.jpg')
+        FileIO.download_image(image_url, layout.path('demo.jpg'))
+
+    elif args.async_engine:
+        # Scrap the website with the asyncio engine
+        # (imported here as async_scraper imports this module)
+        from async_scraper import AsyncScraper
+
+        site_url = args.url
+        site = AsyncScraper(site_url, args.max_requests or 100,
+                            pool_size=args.pool_size or 100,
+                            timeout=args.timeout or 30)
+        progress_monitor.complete(site.session)
 
     else:
         # Scrap the website
-        site_url = 'http://books.toscrape.com'
-        site = Scraper(site_url)
+        site_url = args.url
+        site = Scraper(site_url, args.workers, args.categories,
+                       args.max_requests, args.incremental, args.stream,
+                       args.image_workers, args.resume, args.output,
+                       journaling=args.journaling)
         progress_monitor.complete()
@@ -0,0 +1,224 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+''' The purpose of this module is to provide the shared HTTP session
+    used to fetch the pages and the images, keeping the connections
+    alive between the requests sent to the same host.
+'''
+
+from collections import namedtuple
+from threading import Lock
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit, urljoin
+import http.client
+
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 '\
+             '(KHTML, like Gecko) Chrome/36.0.1941.0 Safari/537.36'
+
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+Response = namedtuple('Response', ['url', 'status', 'headers', 'body'])
+
+
+##################################################
+# HTTPSession
+##################################################
+
+
+class HTTPSession:
+    """ The purpose of this class is to send the GET requests through
+        a pool of persistent (keep-alive) connections per host
+
+    Attributes
+    ----------
+    pool_size : int
+        the maximum number of idle connections kept open per host
+    timeout : float
+        the number of seconds before a connection or a read is aborted
+    user_agent : str
+        the User-Agent header sent with every request
+    connections_opened : int
+        the number of TCP connections opened so far
+    connections_reused : int
+        the number of requests sent on an already opened connection
+    requests : int
+        the number of requests sent so far
+
+    Methods
+    -------
+    configure(pool_size=None, timeout=None, user_agent=None)
+        change the settings of the session
+    get(url, headers=None)
+        send a GET request and return a Response(url, status, headers, body)
+    stats()
+        return the connection counters
+    close()
+        close all the idle connections
+    """
+
+    def __init__(self, pool_size=10, timeout=30, user_agent=USER_AGENT):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self.requests = 0
+        self._pools = {}  # idle connections: {(scheme, host, port): [conn]}
+        self._lock = Lock()
+
+    def configure(self, pool_size=None, timeout=None, user_agent=None):
+        """ Change the settings of the session (None keeps the current value)
+
+        Parameters
+        ----------
+        pool_size : int
+            The maximum number of idle connections kept open per host
+        timeout : float
+            The number of seconds before a connection or a read is aborted
+        user_agent : str
+            The User-Agent header sent with every request
+        """
+
+        if pool_size is not None:
+            self.pool_size = pool_size
+        if timeout is not None:
+            self.timeout = timeout
+        if user_agent is not None:
+            self.user_agent = user_agent
+
+        self.close()
+
+    def get(self, url, headers=None, max_redirects=5):
+        """ Send a GET request to the given URL and follow the redirections
+
+        Parameters
+        ----------
+        url : str
+            The internet address to request
+        headers : dict
+            The additional request headers
+        max_redirects : int (default is 5)
+            The maximum number of redirections followed
+
+        Returns
+        -------
+        Response
+            A namedtuple with the final url, the status code,
+            the response headers and the body (bytes)
+
+        Raises
+        ------
+        HTTPError
+            if the server answers with an error status code (4xx or 5xx)
+        URLError
+            if the server can't be reached
+        """
+
+        for _ in range(max_redirects + 1):
+            response, reason = self.__request(url, headers)
+
+            if response.status in REDIRECT_CODES and \
+                    response.headers.get('Location'):
+                url = urljoin(url, response.headers['Location'])
+                continue
+
+            if response.status >= 400:
+                raise HTTPError(url, response.status, reason,
+                                response.headers, None)
+
+            return response
+
+        raise URLError(f"Too many redirections :: {url}")
+
+    def stats(self):
+        """ Return a dict with the connection counters """
+        with self._lock:
+            return {
+                    'requests': self.requests,
+                    'connections_opened': self.connections_opened,
+                    'connections_reused': self.connections_reused,
+                    }
+
+    def close(self):
+        """ Close all the idle connections """
+        with self._lock:
+            pools, self._pools = self._pools, {}
+
+        for pool in pools.values():
+            for conn in pool:
+                conn.close()
+
+    # --- PRIVATE METHODS ---
+
+    def __request(self, url, headers):
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        target = parts.path or '/'
+        if parts.query:
+            target += '?' + parts.query
+
+        request_headers = {'User-Agent': self.user_agent}
+        request_headers.update(headers or {})
+
+        conn, reused = self.__acquire(key)
+        try:
+            try:
+                conn.request('GET', target, headers=request_headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except (http.client.HTTPException, OSError) as e:
+                if not reused or isinstance(e, TimeoutError):
+                    raise
+                # the server closed the idle connection, use a fresh one
+                conn.close()
+                conn, reused = self.__acquire(key, fresh=True)
+                conn.request('GET', target, headers=request_headers)
+                resp = conn.getresponse()
+                body = resp.read()
+        except OSError as e:
+            conn.close()
+            raise URLError(e)
+        except Exception:
+            conn.close()
+            raise
+
+        if resp.will_close:
+            conn.close()
+        else:
+            self.__release(key, conn)
+
+        return Response(url, resp.status, resp.headers, body), resp.reason
+
+    def __acquire(self, key, fresh=False):
+        with self._lock:
+            self.requests += int(not fresh)
+            pool = self._pools.get(key)
+            if pool and not fresh:
+                self.connections_reused += 1
+                return pool.pop(), True
+            self.connections_opened += 1
+
+        scheme, host, port = key
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(host, port,
+                                               timeout=self.timeout)
+        elif scheme == 'http':
+            conn = http.client.HTTPConnection(host, port,
+                                              timeout=self.timeout)
+        else:
+            raise URLError(f"Unsupported URL scheme :: {scheme}")
+
+        return conn, False
+
+    def __release(self, key, conn):
+        with self._lock:
+            pool = self._pools.setdefault(key, [])
+            if len(pool) < self.pool_size:
+                pool.append(conn)
+                return
+
+        conn.close()
+
+
+http_session = HTTPSession()
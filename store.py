@@ -0,0 +1,191 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+''' The purpose of this module is to keep a single copy of each book
+    image on the local storage, shared by all the category folders
+    and by the next runs.
+'''
+
+from hashlib import sha1, sha256
+from threading import Lock, get_ident
+from urllib.parse import urlsplit
+import json
+import os
+import shutil
+
+
+##################################################
+# ImageStore
+##################################################
+
+
+class ImageStore:
+    """ The purpose of this class is to store the images in a
+        content-addressed folder and to link them into the category folders
+
+    The images are stored as <dirname>/<xx>/<key><ext> (the key being
+    the sha1 of the image url) along with a <key>.json file holding the
+    url, the size and the sha256 of the content. An image whose stored
+    file has the expected size (and sha256 when verify is True) isn't
+    downloaded again: the image urls of the website are derived from
+    the image content, so a changed image comes with a new url.
+
+    Attributes
+    ----------
+    dirname : str
+        the folder where the images are stored
+    verify : bool
+        determine if the sha256 of a stored file is checked before use
+    downloaded : int
+        the number of images downloaded
+    downloaded_bytes : int
+        the number of image bytes downloaded
+    reused : int
+        the number of images linked from the store without download
+
+    Methods
+    -------
+    claim(path, url)
+        return a local path for the image that no other image uses
+    save(url, path, fetch)
+        store the image (if needed) and link it to the given path
+    stats()
+        return the store counters
+    """
+
+    def __init__(self, dirname='.images', verify=False):
+        self.dirname = os.path.abspath(dirname)
+        self.verify = verify
+        self.downloaded = 0
+        self.downloaded_bytes = 0
+        self.reused = 0
+        self._claimed = {}  # local paths given during this run: {path: url}
+        self._lock = Lock()
+
+        os.makedirs(self.dirname, exist_ok=True)
+
+    def claim(self, path, url):
+        """ Return the given local path, or a variant of it if the path
+            was already given to another image during this run
+            (different titles may give the same image name)
+
+        Parameters
+        ----------
+        path : str
+            The wanted path of the local file
+        url : str
+            The internet address of the image
+
+        Returns
+        -------
+        str
+            The path to use for the image
+        """
+
+        with self._lock:
+            if self._claimed.setdefault(os.path.abspath(path), url) == url:
+                return path
+
+            root, ext = os.path.splitext(path)
+            path = f"{root}_{self.__key(url)[:8]}{ext}"
+            self._claimed[os.path.abspath(path)] = url
+
+        return path
+
+    def save(self, url, path, fetch):
+        """ Store the image if it isn't already stored,
+            then link the stored file to the given path
+
+        The stored file is hard linked, or symlinked when the hard links
+        aren't possible (other file system), or copied as a last resort.
+
+        Parameters
+        ----------
+        url : str
+            The internet address of the image
+        path : str
+            The path of the local file
+        fetch : function
+            Return the content of the given url: fetch(url) -> bytes
+
+        Returns
+        -------
+        str
+            The path of the local file
+        """
+
+        stored = self.__store(url, fetch)
+
+        # link to a temporary name then replace the previous file (if any)
+        tmp_path = f"{path}.{os.getpid()}.{get_ident()}.tmp"
+        try:
+            os.link(stored, tmp_path)
+        except OSError:
+            try:
+                os.symlink(stored, tmp_path)
+            except OSError:
+                shutil.copyfile(stored, tmp_path)
+        os.replace(tmp_path, path)
+
+        return path
+
+    def stats(self):
+        """ Return a dict with the store counters """
+        with self._lock:
+            return {
+                    'downloaded': self.downloaded,
+                    'downloaded_bytes': self.downloaded_bytes,
+                    'reused': self.reused,
+                    }
+
+    # --- PRIVATE METHODS ---
+
+    def __key(self, url):
+        return sha1(url.encode('utf8')).hexdigest()
+
+    def __store(self, url, fetch):
+        key = self.__key(url)
+        ext = os.path.splitext(urlsplit(url).path)[1]
+        stored = os.path.join(self.dirname, key[:2], key + ext)
+
+        if self.__is_valid(stored):
+            with self._lock:
+                self.reused += 1
+            return stored
+
+        body = fetch(url)
+
+        os.makedirs(os.path.dirname(stored), exist_ok=True)
+        tmp_path = f"{stored}.{os.getpid()}.{get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        os.replace(tmp_path, stored)
+
+        meta = {'url': url, 'size': len(body),
+                'sha256': sha256(body).hexdigest()}
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(self.dirname, key[:2], key + '.json'))
+
+        with self._lock:
+            self.downloaded += 1
+            self.downloaded_bytes += len(body)
+
+        return stored
+
+    def __is_valid(self, stored):
+        meta_path = os.path.splitext(stored)[0] + '.json'
+
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            if os.path.getsize(stored) != meta['size']:
+                return False
+
+            if self.verify:
+                with open(stored, 'rb') as f:
+                    return sha256(f.read()).hexdigest() == meta['sha256']
+        except (OSError, ValueError, KeyError):
+            return False
+
+        return True
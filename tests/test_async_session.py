@@ -0,0 +1,141 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+'''
+The purpose of this module is to test the AsyncHTTPSession class
+defined in async_session.py
+'''
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from os import mkdir
+from shutil import rmtree
+from threading import Thread
+from urllib.error import HTTPError, URLError
+import asyncio
+
+import pytest
+
+from async_session import AsyncHTTPSession
+
+
+class KeepAliveHandler(SimpleHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+##################################################
+# AsyncHTTPSession
+##################################################
+
+class TestAsyncHTTPSession:
+
+    @classmethod
+    def setup_class(cls):
+        try:
+            mkdir('testzone')
+        except Exception:
+            pass
+
+        with open('testzone/page.html', 'w') as f:
+            f.write('<html><h1>Hello</h1></html>')
+
+        try:
+            mkdir('testzone/folder')
+        except Exception:
+            pass
+
+        handler = partial(KeepAliveHandler, directory='testzone')
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}/'
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        rmtree('testzone')
+
+    def test_get(self):
+        async def get():
+            session = AsyncHTTPSession()
+            response = await session.get(self.base_url + 'page.html')
+            await session.close()
+            return response
+
+        response = run(get())
+        assert response.status == 200
+        assert response.body == b'<html><h1>Hello</h1></html>'
+
+    def test_get_REUSE(self):
+        async def get():
+            session = AsyncHTTPSession()
+            for _ in range(5):
+                await session.get(self.base_url + 'page.html')
+            await session.close()
+            return session
+
+        assert run(get()).stats() == {
+                'requests': 5,
+                'connections_opened': 1,
+                'connections_reused': 4,
+                }
+
+    def test_get_CONCURRENT(self):
+        async def get():
+            session = AsyncHTTPSession(pool_size=2)
+            responses = await asyncio.gather(
+                    *(session.get(self.base_url + 'page.html')
+                      for _ in range(10)))
+            await session.close()
+            return responses
+
+        responses = run(get())
+        assert [r.status for r in responses] == [200] * 10
+
+    def test_get_REDIRECT(self):
+        async def get():
+            session = AsyncHTTPSession()
+            # the directory url is redirected to the url ending with '/'
+            response = await session.get(self.base_url + 'folder')
+            await session.close()
+            return response
+
+        assert run(get()).url == self.base_url + 'folder/'
+
+    def test_get_NOT_FOUND(self):
+        async def get():
+            session = AsyncHTTPSession()
+            try:
+                await session.get(self.base_url + 'missing.html')
+            finally:
+                await session.close()
+
+        with pytest.raises(HTTPError):
+            run(get())
+
+    def test_get_CLOSED_BY_SERVER(self):
+        async def get():
+            session = AsyncHTTPSession()
+            await session.get(self.base_url + 'page.html')
+            for reader, writer in session._pools[('http', '127.0.0.1',
+                                                  self.server.server_port)]:
+                writer.transport.abort()
+            response = await session.get(self.base_url + 'page.html')
+            await session.close()
+            return response
+
+        assert run(get()).status == 200
+
+    def test_get_ERROR(self):
+        async def get():
+            session = AsyncHTTPSession(timeout=2)
+            await session.get('http://127.0.0.1:1/')
+
+        with pytest.raises(URLError):
+            run(get())
@@ -5,13 +5,16 @@
 The purpose of this module is to test the Book class
 '''
 
+from os import chdir, mkdir
+from shutil import rmtree
 import pytest
 import os.path
 import csv
 
 from bs4 import BeautifulSoup
 
-from book import Book
+from book import Book, extract_product, parse_product
+from replay import Corpus, ReplayServer, PRODUCT_PAGE as SAMPLE_PRODUCT_PAGE
 from utils import FileIO
 
 
@@ -19,35 +22,157 @@ from utils import FileIO
 # Generic
 ##################################################
 
-def test_connect_with_bs4_TYPE():
-    url = 'http://books.toscrape.com'
-    assert type(FileIO.connect_with_bs4(url)) == BeautifulSoup
-
-
-def test_connect_with_bs4_ERROR():
-
-    with pytest.raises(Exception):
-        FileIO.connect_with_bs4('http://www.xxxfakexxx.xxx')
+def test_from_dict():
+    row = {
+            'product_page_url': 'http://www.fake.url',
+            'universal_product_code': 'fake-upc',
+            'title': 'fake-title',
+            'number_available': '22',
+            'review_rating': '3',
+            'image_local': 'fake.jpg',
+          }
+    book = Book.from_dict(row)
+    assert book.product_page_url == 'http://www.fake.url'
+    assert book.title == 'fake-title'
+    assert book.number_available == 22
+    assert book.review_rating == 3
+    assert book.price_including_tax is None
+    assert book.get_headers() == Book('url').get_headers()
+
+
+PRODUCT_PAGE = '''<html><body>
+<ul class="breadcrumb"><li><a href="../../index.html">Home</a></li>
+<li><a href="../category/books_1/index.html">Books</a></li>
+<li><a href="../category/books/poetry_23/index.html">Poetry</a></li></ul>
+<article class="product_page"><img src="../../media/cache/fe/72/a.jpg"/>
+<h1>A Light in the Attic</h1><p class="star-rating Three"></p>
+<div id="product_description"><h2>Product Description</h2></div>
+<p>It's hard to imagine</p>
+<table><tr><th>UPC</th><td>a897fe39b1053632</td></tr>
+<tr><th>Price (excl. tax)</th><td>£51.77</td></tr>
+<tr><th>Price (incl. tax)</th><td>£51.77</td></tr>
+<tr><th>Availability</th><td>In stock (22 available)</td></tr></table>
+</article></body></html>'''
+
+
+def test_extract_product():
+    url = 'http://books.toscrape.com/catalogue/a-light-in-the-attic_1000/index.html'
+    soup = BeautifulSoup(PRODUCT_PAGE, 'html.parser')
+    fields, errors = extract_product(soup, url)
+
+    assert errors == []
+    assert fields == {
+            'universal_product_code': 'a897fe39b1053632',
+            'title': 'A Light in the Attic',
+            'price_including_tax': '£51.77',
+            'price_excluding_tax': '£51.77',
+            'number_available': 22,
+            'product_description': "It's hard to imagine",
+            'category': 'Poetry',
+            'review_rating': 3,
+            'image_url': 'http://books.toscrape.com/media/cache/fe/72/a.jpg',
+            }
+
+
+def test_extract_product_ERROR():
+    soup = BeautifulSoup(PRODUCT_PAGE.replace('UPC', 'XXX'), 'html.parser')
+    fields, errors = extract_product(soup, 'http://www.fake.url')
+
+    assert fields['universal_product_code'] is None
+    assert fields['title'] == 'A Light in the Attic'
+    assert errors == ["Can't find the UPC ::\nhttp://www.fake.url"]
+
+
+def test_parse_product_WORKERS():
+    url = 'http://books.toscrape.com/catalogue/a-light-in-the-attic_1000/index.html'
+    html = PRODUCT_PAGE.encode('utf8')
+    expected = parse_product(html, url)
+
+    FileIO.set_parse_workers(2)
+    try:
+        books = [Book(url) for _ in range(4)]
+        for book in books:
+            book.collect_from(html)
+    finally:
+        FileIO.set_parse_workers(0)
+
+    assert FileIO.parse_pool is None
+    assert expected[1] == []
+    assert [book.title for book in books] == [expected[0]['title']] * 4
+    assert books[0].review_rating == expected[0]['review_rating']
 
 
 ##################################################
 # Book
 ##################################################
 
+DESCRIPTION = '''It's hard to imagine a world without A Light in the Attic. This now-classic collection of poetry and drawings from Shel Silverstein celebrates its 20th anniversary with this special edition. Silverstein's humorous and creative verse can amuse the dowdiest of readers. Lemon-faced adults and fidgety kids sit still and read these rhythmic words and laugh and smile and love th It's hard to imagine a world without A Light in the Attic. This now-classic collection of poetry and drawings from Shel Silverstein celebrates its 20th anniversary with this special edition. Silverstein's humorous and creative verse can amuse the dowdiest of readers. Lemon-faced adults and fidgety kids sit still and read these rhythmic words and laugh and smile and love that Silverstein. Need proof of his genius? RockabyeRockabye baby, in the treetopDon't you know a treetopIs no safe place to rock?And who put you up there,And your cradle, too?Baby, I think someone down here'sGot it in for you. Shel, you never sounded so good. ...more'''
+
+# the product pages served by the replay server (see replay.sample_site)
+A_LIGHT_IN_THE_ATTIC = {
+        'title': 'A Light in the Attic',
+        'description': DESCRIPTION,
+        'image': 'media/cache/fe/72/fe72f0532301ec28892ae79a629a293c.jpg',
+        'price': '£51.77',
+        'rating': 'Three',
+        'upc': 'a897fe39b1053632',
+        'available': 22,
+        'category': 'Poetry',
+        'category_slug': 'poetry_23',
+        }
+
+SOUMISSION = {
+        'title': 'Soumission',
+        'description': 'Dans une France assez proche de la nôtre...',
+        'image': 'media/cache/3e/ef/3eef99c9d9adef34639f510662022830.jpg',
+        'price': '£50.10',
+        'rating': 'One',
+        'upc': '6957f44c3847a760',
+        'available': 20,
+        'category': 'Fiction',
+        'category_slug': 'fiction_10',
+        }
+
+
 class TestBook():
 
     @classmethod
     def setup_class(cls):
+        mkdir('testzone')
+        chdir('testzone')
+
+        corpus = Corpus('site')
+        for slug, book in (('a-light-in-the-attic_1000', A_LIGHT_IN_THE_ATTIC),
+                           ('soumission_998', SOUMISSION)):
+            corpus.save(f'http://books.toscrape.com/catalogue/{slug}/index.html',
+                        SAMPLE_PRODUCT_PAGE.format(**book).encode())
+        cls.server = ReplayServer('site').start()
+
         fake_url = 'http://www.fake.url'
         cls.book1 = Book(fake_url)
 
-        prod_url = 'http://books.toscrape.com/catalogue/a-light-in-the-attic_1000/index.html'
+        prod_url = cls.server.url + 'catalogue/a-light-in-the-attic_1000/index.html'
         cls.book2 = Book(prod_url)
         cls.book2.collect()
 
-        prod_url = 'http://books.toscrape.com/catalogue/soumission_998/index.html'
+        prod_url = cls.server.url + 'catalogue/soumission_998/index.html'
         cls.book3 = Book(prod_url)
 
+    @classmethod
+    def teardown_class(cls):
+        cls.server.close()
+        chdir('..')
+        rmtree('testzone')
+
+    def test_connect_with_bs4_TYPE(self):
+        url = self.server.url + 'catalogue/a-light-in-the-attic_1000/index.html'
+        assert type(FileIO.connect_with_bs4(url)) == BeautifulSoup
+
+    def test_connect_with_bs4_ERROR(self):
+
+        with pytest.raises(Exception):
+            FileIO.connect_with_bs4(self.server.url + 'missing.html')
+
     def test_empty_init(self):
         with pytest.raises(Exception):
             Book()
@@ -116,7 +241,7 @@ class TestBook():
         assert self.book2.number_available == 22
 
     def test_parse_product_description(self):
-        assert self.book2.product_description == '''It's hard to imagine a world without A Light in the Attic. This now-classic collection of poetry and drawings from Shel Silverstein celebrates its 20th anniversary with this special edition. Silverstein's humorous and creative verse can amuse the dowdiest of readers. Lemon-faced adults and fidgety kids sit still and read these rhythmic words and laugh and smile and love th It's hard to imagine a world without A Light in the Attic. This now-classic collection of poetry and drawings from Shel Silverstein celebrates its 20th anniversary with this special edition. Silverstein's humorous and creative verse can amuse the dowdiest of readers. Lemon-faced adults and fidgety kids sit still and read these rhythmic words and laugh and smile and love that Silverstein. Need proof of his genius? RockabyeRockabye baby, in the treetopDon't you know a treetopIs no safe place to rock?And who put you up there,And your cradle, too?Baby, I think someone down here'sGot it in for you. Shel, you never sounded so good. ...more'''
+        assert self.book2.product_description == DESCRIPTION
 
     def test_parse_category(self):
         assert self.book2.category == "Poetry"
@@ -125,7 +250,7 @@ class TestBook():
         assert self.book2.review_rating == 3
 
     def test_parse_image_url(self):
-        url = "http://books.toscrape.com/media/cache/fe/72/fe72f0532301ec28892ae79a629a293c.jpg"
+        url = self.server.url + "media/cache/fe/72/fe72f0532301ec28892ae79a629a293c.jpg"
         assert self.book2.image_url == url
 
     # --- CSV ---
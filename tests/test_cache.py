@@ -0,0 +1,97 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+'''
+The purpose of this module is to test the HTTPCache class
+defined in cache.py
+'''
+from shutil import rmtree
+
+from cache import HTTPCache
+from session import Response
+
+
+class FakeServer:
+    """ Answer like a server supporting the conditional requests """
+
+    def __init__(self):
+        self.pages = {}
+        self.requests = []
+
+    def get(self, url, headers):
+        self.requests.append((url, headers))
+        body, etag = self.pages[url]
+        if headers.get('If-None-Match') == etag:
+            return Response(url, 304, {'ETag': etag}, b'')
+        return Response(url, 200, {'ETag': etag}, body)
+
+
+##################################################
+# HTTPCache
+##################################################
+
+class TestHTTPCache:
+
+    def setup_method(self):
+        self.server = FakeServer()
+        self.server.pages['http://a'] = (b'a' * 100, '"a1"')
+        self.server.pages['http://b'] = (b'b' * 100, '"b1"')
+        self.server.pages['http://c'] = (b'c' * 100, '"c1"')
+
+    def teardown_method(self):
+        rmtree('testcache', ignore_errors=True)
+
+    def test_fetch_MISS(self):
+        cache = HTTPCache('testcache')
+        assert cache.fetch('http://a', self.server.get) == b'a' * 100
+        assert cache.stats()['misses'] == 1
+        assert self.server.requests == [('http://a', {})]
+
+    def test_fetch_REVALIDATED(self):
+        HTTPCache('testcache').fetch('http://a', self.server.get)
+
+        cache = HTTPCache('testcache')
+        assert cache.fetch('http://a', self.server.get) == b'a' * 100
+        assert cache.stats()['revalidated'] == 1
+        assert self.server.requests[-1] == ('http://a',
+                                            {'If-None-Match': '"a1"'})
+
+    def test_fetch_CHANGED(self):
+        cache = HTTPCache('testcache')
+        cache.fetch('http://a', self.server.get)
+        self.server.pages['http://a'] = (b'new', '"a2"')
+
+        assert cache.fetch('http://a', self.server.get) == b'new'
+        assert cache.fetch('http://a', self.server.get) == b'new'
+        assert cache.stats()['misses'] == 2
+        assert cache.stats()['revalidated'] == 1
+
+    def test_fetch_TTL(self):
+        cache = HTTPCache('testcache', ttl=60)
+        cache.fetch('http://a', self.server.get)
+        cache.fetch('http://a', self.server.get)
+
+        assert cache.stats()['hits'] == 1
+        assert len(self.server.requests) == 1
+
+    def test_eviction(self):
+        cache = HTTPCache('testcache', max_size=250)
+        cache.fetch('http://a', self.server.get)
+        cache.fetch('http://b', self.server.get)
+        cache.fetch('http://a', self.server.get)  # b is now the oldest
+        cache.fetch('http://c', self.server.get)
+
+        assert cache.stats()['evictions'] == 1
+        assert cache.stats()['size'] == 200
+
+        cache = HTTPCache('testcache', max_size=250)
+        assert cache.stats()['size'] == 200
+        cache.fetch('http://b', self.server.get)
+        assert self.server.requests[-1] == ('http://b', {})
+
+    def test_clear(self):
+        cache = HTTPCache('testcache')
+        cache.fetch('http://a', self.server.get)
+        cache.clear()
+        assert cache.stats()['size'] == 0
+        assert HTTPCache('testcache').stats()['size'] == 0
@@ -4,11 +4,13 @@
 '''
 The purpose of this module is to test the Category class
 '''
-from os import chdir, mkdir, getcwd
+from os import chdir, mkdir, getcwd, remove
 import os.path
 import csv
+import re
 from shutil import rmtree
 
+from replay import ReplayServer, sample_site
 from scraper import Book, Category
 
 
@@ -28,12 +30,19 @@ class TestCategory:
         chdir('testzone')
         cls.cwd = getcwd()
 
-        url = 'http://books.toscrape.com/catalogue/category/books/fiction_10/index.html'
+        # a replayed copy of the website with a 65 books category
+        sample_site('site', (('Fiction', 65),))
+        cls.server = ReplayServer('site').start()
+
+        url = cls.server.url + 'catalogue/category/books/fiction_2/index.html'
         cls.cat1 = Category(None)
         cls.cat2 = Category(url, dl_image=False)
+        cls.cat3 = Category(url, dl_image=False, workers=8)
+        cls.cat4 = Category(url, dl_image=False, stream=True, root=cls.cwd)
 
     @classmethod
     def teardown_class(cls):
+        cls.server.close()
         chdir('..')
         try:
             rmtree('testzone')
@@ -80,9 +89,9 @@ class TestCategory:
         assert self.cat2.num_books == 65
 
     def test_parse_links(self):
-        link0 = "http://books.toscrape.com/catalogue/soumission_998/index.html"
-        link39 = "http://books.toscrape.com/catalogue/me-before-you-me-before-you-1_434/index.html"
-        link64 = "http://books.toscrape.com/catalogue/bright-lines_11/index.html"
+        link0 = self.server.url + "catalogue/fiction-book-1_1000/index.html"
+        link39 = self.server.url + "catalogue/fiction-book-40_961/index.html"
+        link64 = self.server.url + "catalogue/fiction-book-65_936/index.html"
 
         assert self.cat2.links[0][0] == link0
         assert self.cat2.links[39][0] == link39
@@ -90,9 +99,9 @@ class TestCategory:
         assert len(self.cat2.links) == 65
 
     def test_parse_books(self):
-        title0 = "Soumission"
-        upc3 = "709822d0b5bcb7f4"
-        availability21 = 14
+        title0 = "Fiction Book 1"
+        upc3 = "59fec65a29de53b6"
+        availability21 = 16
         rate39 = 1
         assert len(self.cat2.books) == 65
         assert self.cat2.books[0].title == title0
@@ -100,6 +109,11 @@ class TestCategory:
         assert self.cat2.books[21].number_available == availability21
         assert self.cat2.books[39].review_rating == rate39
 
+    def test_parse_books_CONCURRENT(self):
+        assert len(self.cat3.books) == len(self.cat2.books)
+        assert [b.to_dict() for b in self.cat3.books] == \
+               [b.to_dict() for b in self.cat2.books]
+
     # --- CSV ---
 
     def test_to_csv(self):
@@ -123,6 +137,13 @@ class TestCategory:
 
         os.remove(f'{file}.csv')
 
+    def test_to_csv_STREAM(self):
+        assert self.cat4.books == []
+
+        with open(f'{self.cat4.folder}/fiction.csv', newline='') as csvfile:
+            reader = csv.reader(csvfile, delimiter=' ', quotechar='|')
+            assert sum(1 for _ in reader) == 66
+
     def test_to_csv_CREATE_new_file(self):
         file = 'test-category'
         self.cat2.write_csv(file)
@@ -134,3 +155,69 @@ class TestCategory:
             assert sum(1 for _ in reader) == 66
 
         os.remove(f'{file}.csv')
+
+
+##################################################
+# Listing pages
+##################################################
+
+class TestListing:
+
+    def setup_method(self):
+        mkdir('testzone')
+        chdir('testzone')
+
+        # 25 books on 3 listing pages
+        sample_site('site', (('Travel', 25),), per_page=10)
+        self.server = ReplayServer('site').start()
+        self.url = self.server.url + 'catalogue/category/books/travel_2/'
+        self.page2 = 'site/catalogue/category/books/travel_2/page-2.html'
+
+    def teardown_method(self):
+        self.server.close()
+        chdir('..')
+        rmtree('testzone')
+
+    def collect(self, monkeypatch):
+        errors = []
+        monkeypatch.setattr('category.report_error',
+                            lambda error, **infos: errors.append(
+                                (error, infos['url'])))
+        category = Category(self.url + 'index.html', dl_image=False)
+        return category, errors
+
+    def test_links(self, monkeypatch):
+        category, errors = self.collect(monkeypatch)
+
+        assert errors == []
+        assert len(category.links) == 25
+        assert category.links[24][1] == 'Travel Book 25'
+
+    def test_links_MISSING_PAGE(self, monkeypatch):
+        remove(self.page2)
+        category, errors = self.collect(monkeypatch)
+
+        # the links stop before the missing page
+        assert len(errors) == 1
+        assert errors[0][0].startswith("Can't load the listing page ::")
+        assert errors[0][1] == self.url + 'page-2.html'
+        assert len(category.links) == 10
+        assert len(category.books) == 10
+
+    def test_links_SHORT_PAGE(self, monkeypatch):
+        # the page 2 lists 8 books instead of 10
+        with open(self.page2, encoding='utf8') as f:
+            html = f.read()
+        for book in re.findall('<li><article.*?</article></li>', html,
+                               re.DOTALL)[-2:]:
+            html = html.replace(book, '')
+        with open(self.page2, 'w', encoding='utf8') as f:
+            f.write(html)
+
+        category, errors = self.collect(monkeypatch)
+
+        # the links stop after the incomplete page
+        assert errors == [("Incomplete listing page ::\n" + self.url +
+                           'page-2.html', self.url + 'page-2.html')]
+        assert len(category.links) == 18
+        assert category.links[17][1] == 'Travel Book 18'
@@ -0,0 +1,92 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+'''
+The purpose of this module is to test the ColumnarWriter class
+defined in columnar.py (skipped when pyarrow isn't installed)
+'''
+from decimal import Decimal
+from os import mkdir
+from shutil import rmtree
+
+import pytest
+
+pa = pytest.importorskip('pyarrow')
+pq = pytest.importorskip('pyarrow.parquet')
+
+from columnar import ColumnarWriter, BOOK_TYPES  # noqa: E402
+
+FIELDS = ['title', 'price_including_tax', 'number_available', 'category']
+
+ROWS = [
+        {'title': 'A', 'price_including_tax': '£51.77',
+         'number_available': 22, 'category': 'Poetry'},
+        {'title': 'B', 'price_including_tax': '£13.99',
+         'number_available': '3', 'category': 'Travel'},
+        {'title': 'C', 'price_including_tax': None,
+         'number_available': 1, 'category': 'Poetry'},
+        ]
+
+
+##################################################
+# ColumnarWriter
+##################################################
+
+class TestColumnarWriter:
+
+    def setup_method(self):
+        mkdir('testzone')
+
+    def teardown_method(self):
+        rmtree('testzone')
+
+    def test_write_PARQUET(self):
+        filepath = 'testzone/books.parquet'
+        with ColumnarWriter(filepath, FIELDS, types=BOOK_TYPES) as writer:
+            writer.writerows(ROWS)
+            writer.flush('Poetry')
+
+        table = pq.read_table(filepath)
+        assert table.schema.field('price_including_tax').type == \
+            pa.decimal128(12, 2)
+        assert table.schema.field('number_available').type == pa.int64()
+        assert table.column('title').to_pylist() == ['A', 'C', 'B']
+        assert table.column('price_including_tax').to_pylist() == \
+            [Decimal('51.77'), None, Decimal('13.99')]
+        assert table.column('number_available').to_pylist() == [22, 1, 3]
+
+        # one row group per category
+        assert pq.ParquetFile(filepath).num_row_groups == 2
+
+    def test_write_ARROW(self):
+        filepath = 'testzone/books.arrow'
+        with ColumnarWriter(filepath, FIELDS, types=BOOK_TYPES) as writer:
+            assert writer.format == 'arrow'
+            writer.writerows(ROWS)
+
+        with pa.memory_map(filepath) as source:
+            reader = pa.ipc.open_file(source)
+            assert reader.num_record_batches == 2
+            assert reader.read_all().num_rows == 3
+
+    def test_write_EMPTY(self):
+        filepath = 'testzone/books.parquet'
+        ColumnarWriter(filepath, FIELDS, types=BOOK_TYPES).close()
+        assert pq.read_table(filepath).num_rows == 0
+
+    def test_read(self):
+        filepath = 'testzone/books.parquet'
+        with ColumnarWriter(filepath, FIELDS, types=BOOK_TYPES) as writer:
+            writer.writerows(ROWS)
+
+        # the previous file is read as a CSV file would be
+        with ColumnarWriter(filepath, FIELDS, types=BOOK_TYPES) as writer:
+            assert writer.read(category='Poetry') == [
+                    {'title': 'A', 'price_including_tax': '£51.77',
+                     'number_available': '22', 'category': 'Poetry'},
+                    {'title': 'C', 'price_including_tax': '',
+                     'number_available': '1', 'category': 'Poetry'},
+                    ]
+            writer.writerow(ROWS[1])
+
+        assert pq.read_table(filepath).num_rows == 1
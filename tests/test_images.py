@@ -0,0 +1,73 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+'''
+The purpose of this module is to test the class defined in images.py
+'''
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from os import mkdir, path
+from shutil import rmtree
+from threading import Thread
+
+from images import ImageDownloader
+from utils import progress_monitor
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+##################################################
+# ImageDownloader
+##################################################
+
+class TestImageDownloader:
+
+    @classmethod
+    def setup_class(cls):
+        try:
+            mkdir('testzone')
+        except Exception:
+            pass
+
+        for i in range(5):
+            with open(f'testzone/image{i}.jpg', 'wb') as f:
+                f.write(bytes([i]) * 1000)
+
+        handler = partial(QuietHandler, directory='testzone')
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}/'
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        rmtree('testzone')
+
+    def test_submit(self):
+        queued = progress_monitor._images['queued']
+
+        with ImageDownloader(workers=2, queue_size=2) as downloader:
+            for i in range(5):
+                downloader.submit(f'{self.base_url}image{i}.jpg',
+                                  f'testzone/copy{i}.jpg')
+
+        for i in range(5):
+            with open(f'testzone/copy{i}.jpg', 'rb') as f:
+                assert f.read() == bytes([i]) * 1000
+
+        assert progress_monitor._images['queued'] == queued + 5
+
+    def test_submit_ERROR(self):
+        failed = progress_monitor._images['failed']
+
+        with ImageDownloader(workers=1) as downloader:
+            downloader.submit(f'{self.base_url}missing.jpg',
+                              'testzone/missing.jpg')
+
+        assert path.exists('testzone/missing.jpg') is False
+        assert progress_monitor._images['failed'] == failed + 1
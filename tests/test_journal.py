@@ -0,0 +1,147 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+'''
+The purpose of this module is to test the CrawlJournal class
+defined in journal.py
+'''
+from os import chdir, mkdir, rename
+from shutil import rmtree
+import csv
+import glob
+
+from journal import CrawlJournal
+from replay import ReplayServer, sample_site
+from scraper import Scraper
+
+CATEGORY_URL = 'http://books.toscrape.com/catalogue/category/books/poetry_23/index.html'
+BOOK_URL = 'http://books.toscrape.com/catalogue/a-light-in-the-attic_1000/index.html'
+
+
+##################################################
+# CrawlJournal
+##################################################
+
+class TestCrawlJournal:
+
+    def setup_method(self):
+        mkdir('testzone')
+        self.journal = CrawlJournal('testzone/journal.sqlite')
+
+    def teardown_method(self):
+        self.journal.close()
+        rmtree('testzone')
+
+    def test_category(self):
+        assert self.journal.category(CATEGORY_URL) is None
+
+        links = [(BOOK_URL, 'A Light in the Attic')]
+        listing = {BOOK_URL: {'title': 'A Light in the Attic'}}
+        self.journal.add_category(CATEGORY_URL, 'Poetry', 1, links, listing)
+
+        state = self.journal.category(CATEGORY_URL)
+        assert state == {
+                'name': 'Poetry',
+                'num_books': 1,
+                'links': links,
+                'listing': listing,
+                'done': False,
+                }
+
+        self.journal.done_category(CATEGORY_URL)
+        assert self.journal.category(CATEGORY_URL)['done'] is True
+
+    def test_books(self):
+        row = {'product_page_url': BOOK_URL, 'title': 'A Light in the Attic',
+               'number_available': 22}
+        self.journal.add_book(CATEGORY_URL, row)
+
+        assert self.journal.books(CATEGORY_URL) == {BOOK_URL: row}
+        assert self.journal.books('http://other') == {}
+
+    def test_images(self):
+        assert self.journal.has_image('testzone/a.jpg') is False
+        self.journal.add_image('testzone/a.jpg', 'http://a/a.jpg')
+        assert self.journal.has_image('testzone/a.jpg') is True
+
+    def test_REOPEN(self):
+        self.journal.add_book(CATEGORY_URL, {'product_page_url': BOOK_URL})
+        self.journal.close()
+
+        self.journal = CrawlJournal('testzone/journal.sqlite')
+        assert BOOK_URL in self.journal.books(CATEGORY_URL)
+
+    def test_clear(self):
+        self.journal.add_category(CATEGORY_URL, 'Poetry', 0, [], {})
+        self.journal.add_book(CATEGORY_URL, {'product_page_url': BOOK_URL})
+        self.journal.add_image('testzone/a.jpg', 'http://a/a.jpg')
+        self.journal.clear()
+
+        assert self.journal.category(CATEGORY_URL) is None
+        assert self.journal.books(CATEGORY_URL) == {}
+        assert self.journal.has_image('testzone/a.jpg') is True
+
+
+##################################################
+# Resume
+##################################################
+
+class TestResume:
+
+    def setup_method(self):
+        mkdir('testzone')
+        chdir('testzone')
+        sample_site('site')
+        self.server = ReplayServer('site').start()
+        self.travel = self.server.url + \
+            'catalogue/category/books/travel_2/index.html'
+
+    def teardown_method(self):
+        self.server.close()
+        chdir('..')
+        rmtree('testzone')
+
+    def test_resume(self):
+        # a product page of the Travel category can't be fetched
+        page = glob.glob('site/catalogue/travel-book-3_*/index.html')[0]
+        rename(page, page + '.bak')
+        Scraper(self.server.url, workers=4, journaling=True)
+
+        journal = CrawlJournal('data/.journal.sqlite')
+        assert journal.category(self.travel)['done'] is False
+        assert len(journal.books(self.travel)) == 10
+        journal.close()
+
+        # only the missing book (and its image) is fetched when resuming
+        rename(page + '.bak', page)
+        requests = self.server.requests
+        Scraper(self.server.url, workers=4, resume=True)
+        assert self.server.requests - requests == 3  # home, page, image
+
+        journal = CrawlJournal('data/.journal.sqlite')
+        assert journal.category(self.travel)['done'] is True
+        assert len(journal.books(self.travel)) == 11
+        journal.close()
+
+        with open('data/Travel/travel.csv', newline='') as f:
+            assert len(list(csv.DictReader(f))) == 11
+
+    def test_resume_INTERRUPTED_BOOKS(self, monkeypatch):
+        # the books of Travel can't all be recorded
+        add_book = CrawlJournal.add_book
+
+        def failing_add_book(journal, category_url, row):
+            if row['title'] == 'Travel Book 5':
+                raise OSError('disk full')
+            add_book(journal, category_url, row)
+
+        monkeypatch.setattr(CrawlJournal, 'add_book', failing_add_book)
+        Scraper(self.server.url, workers=4, journaling=True)
+
+        journal = CrawlJournal('data/.journal.sqlite')
+        assert journal.category(self.travel)['done'] is False
+        journal.close()
+
+    def test_no_journal(self):
+        Scraper(self.server.url, workers=4)
+        assert not glob.glob('data/.journal.sqlite*')
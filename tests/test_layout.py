@@ -0,0 +1,52 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+'''
+The purpose of this module is to test the OutputLayout class
+'''
+from os import chdir, mkdir, getcwd
+from shutil import rmtree
+import os.path
+
+from layout import OutputLayout
+
+
+##################################################
+# OutputLayout
+##################################################
+
+class TestOutputLayout:
+
+    def setup_method(self):
+        mkdir('testzone')
+        self.cwd = getcwd()
+        self.layout = OutputLayout('testzone/data')
+
+    def teardown_method(self):
+        chdir(self.cwd)
+        rmtree('testzone')
+
+    def test_paths(self):
+        root = os.path.join(self.cwd, 'testzone', 'data')
+        assert self.layout.root == root
+        assert self.layout.path('books.sqlite') == \
+            os.path.join(root, 'books.sqlite')
+        assert self.layout.category_csv('Science Fiction') == \
+            os.path.join(root, 'Science Fiction', 'science_fiction')
+
+    def test_paths_CHDIR(self):
+        # the paths don't depend on the current directory
+        chdir('testzone')
+        assert self.layout.root == os.path.join(self.cwd, 'testzone', 'data')
+
+    def test_create(self):
+        assert self.layout.create() == self.layout.root
+        folder = self.layout.category_folder('Poetry')
+        assert os.path.isdir(folder)
+
+        self.layout.create(delete_prev=False)
+        assert os.path.isdir(folder)
+
+        self.layout.create()
+        assert not os.path.exists(folder)
+        assert getcwd() == self.cwd
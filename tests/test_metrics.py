@@ -0,0 +1,114 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+'''
+The purpose of this module is to test the classes defined in metrics.py
+'''
+from os import mkdir
+from shutil import rmtree
+import io
+import json
+import time
+
+import pytest
+
+from metrics import Histogram, Metrics, JSONExporter, PrometheusExporter, \
+    StatsLineExporter
+
+
+##################################################
+# Histogram
+##################################################
+
+def test_histogram():
+    histogram = Histogram(bounds=(1, 2, 3))
+    for value in (0.5, 1.5, 1.5, 2.5, 10):
+        histogram.observe(value)
+
+    assert histogram.counts == [1, 2, 1, 1]
+    assert histogram.count == 5
+    assert histogram.sum == 16
+    assert histogram.max == 10
+
+    assert histogram.percentile(20) == 1  # the upper bound of the 1st bucket
+    assert histogram.percentile(40) == 1.5  # interpolated in the 2nd bucket
+    assert histogram.percentile(100) == 10
+
+
+def test_histogram_EMPTY():
+    assert Histogram().percentile(50) is None
+
+
+##################################################
+# Metrics
+##################################################
+
+class TestMetrics:
+
+    def setup_method(self):
+        mkdir('testzone')
+        self.metrics = Metrics()
+
+    def teardown_method(self):
+        rmtree('testzone')
+
+    def test_time(self):
+        with self.metrics.time('fetch') as timer:
+            time.sleep(0.01)
+            timer.size = 100
+
+        with pytest.raises(ValueError):
+            with self.metrics.time('fetch'):
+                raise ValueError()
+
+        stage = self.metrics.snapshot()['stages']['fetch']
+        assert stage['count'] == 2
+        assert stage['errors'] == 1
+        assert stage['bytes'] == 100
+        assert stage['max_ms'] >= 10
+        assert stage['buckets'][-1] == ('+Inf', 2)
+
+    def test_reset(self):
+        self.metrics.observe('parse', 0.1)
+        self.metrics.reset()
+        assert self.metrics.snapshot()['stages'] == {}
+
+    def test_json(self):
+        self.metrics.add_exporter(JSONExporter('testzone/metrics.json'))
+        self.metrics.observe('parse', 0.002)
+        self.metrics.complete()
+
+        with open('testzone/metrics.json') as f:
+            summary = json.load(f)
+        assert summary['stages']['parse']['count'] == 1
+        assert summary['stages']['parse']['total_s'] == 0.002
+
+    def test_prometheus(self):
+        self.metrics.add_exporter(PrometheusExporter('testzone/metrics.prom'))
+        self.metrics.observe('fetch', 0.003, size=10)
+        self.metrics.observe('fetch', 0.2, error=True)
+        self.metrics.complete()
+
+        with open('testzone/metrics.prom') as f:
+            lines = f.read().splitlines()
+        assert '# TYPE bookscraper_stage_seconds histogram' in lines
+        assert 'bookscraper_stage_seconds_bucket{stage="fetch",le="0.005"} 1' \
+            in lines
+        assert 'bookscraper_stage_seconds_bucket{stage="fetch",le="+Inf"} 2' \
+            in lines
+        assert 'bookscraper_stage_seconds_count{stage="fetch"} 2' in lines
+        assert 'bookscraper_stage_errors_total{stage="fetch"} 1' in lines
+        assert 'bookscraper_stage_bytes_total{stage="fetch"} 10' in lines
+
+    def test_periodic(self):
+        stream = io.StringIO()
+        self.metrics.add_exporter(StatsLineExporter(stream))
+        self.metrics.observe('csv', 0.001)
+
+        self.metrics.start(0.05)
+        time.sleep(0.2)
+        self.metrics.complete()
+
+        lines = stream.getvalue().splitlines()
+        assert len(lines) >= 3  # the periodic lines and the final one
+        assert 'csv 1 x 1.0ms' in lines[-1]
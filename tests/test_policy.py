@@ -0,0 +1,150 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+'''
+The purpose of this module is to test the classes defined in policy.py
+'''
+from urllib.error import HTTPError, URLError
+import asyncio
+
+import pytest
+
+from policy import TokenBucket, AdaptiveLimiter, FetchPolicy
+
+
+class FlakyServer:
+    """ Fail with the given errors, then answer 'ok' """
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def send(self, url, headers=None):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+    async def send_async(self, url, headers=None):
+        return self.send(url, headers)
+
+
+def http_error(code, headers=None):
+    return HTTPError('http://a', code, 'error', headers or {}, None)
+
+
+##################################################
+# TokenBucket
+##################################################
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, burst=2)
+
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.01)
+
+
+##################################################
+# AdaptiveLimiter
+##################################################
+
+def test_adaptive_limiter():
+    limiter = AdaptiveLimiter(initial=4, minimum=1, maximum=5)
+
+    for _ in range(20):
+        limiter.acquire()
+        limiter.release(latency=0.1)
+    assert limiter.limit == 5
+
+    limiter.acquire()
+    limiter.release(ok=False)
+    assert limiter.limit == 2.5
+
+
+def test_adaptive_limiter_LATENCY():
+    limiter = AdaptiveLimiter(initial=4)
+
+    limiter.acquire()
+    limiter.release(latency=0.1)
+    limit = limiter.limit
+
+    limiter.acquire()
+    limiter.release(latency=1.0)
+    assert limiter.limit == pytest.approx(limit * 0.9)
+
+
+##################################################
+# FetchPolicy
+##################################################
+
+class TestFetchPolicy:
+
+    def setup_method(self):
+        self.policy = FetchPolicy(retries=2, backoff=0.001)
+
+    def test_get(self):
+        server = FlakyServer()
+        assert self.policy.get('http://a', server.send) == 'ok'
+        assert self.policy.stats()['retries'] == 0
+
+    def test_get_RETRY(self):
+        server = FlakyServer(http_error(503), URLError(TimeoutError()))
+        assert self.policy.get('http://a', server.send) == 'ok'
+        assert server.calls == 3
+        assert self.policy.stats()['retries'] == 2
+
+    def test_get_NO_RETRY(self):
+        server = FlakyServer(http_error(404))
+        with pytest.raises(HTTPError):
+            self.policy.get('http://a', server.send)
+        assert server.calls == 1
+
+    def test_get_UNKNOWN_HOST(self):
+        server = FlakyServer(URLError('unknown url type'))
+        with pytest.raises(URLError):
+            self.policy.get('http://a', server.send)
+        assert server.calls == 1
+
+    def test_get_FAILURE(self):
+        server = FlakyServer(*[http_error(500)] * 3)
+        with pytest.raises(HTTPError):
+            self.policy.get('http://a', server.send)
+        assert server.calls == 3
+        assert self.policy.stats()['failures'] == 1
+
+    def test_get_RETRY_AFTER(self, monkeypatch):
+        delays = []
+        monkeypatch.setattr('time.sleep', delays.append)
+
+        server = FlakyServer(http_error(429, {'Retry-After': '2'}))
+        self.policy.configure(max_backoff=5)
+        self.policy.get('http://a', server.send)
+        assert delays == [2]
+
+    def test_get_RATE(self, monkeypatch):
+        delays = []
+        monkeypatch.setattr('time.sleep', delays.append)
+
+        self.policy.configure(rate=10, burst=1)
+        for _ in range(3):
+            self.policy.get('http://a/page', FlakyServer().send)
+        self.policy.get('http://b/page', FlakyServer().send)
+
+        # the second host has its own bucket
+        assert len(delays) == 2
+        assert self.policy.stats()['throttled'] > 0
+
+    def test_get_ADAPTIVE(self):
+        self.policy.configure(adaptive=True, max_concurrency=8)
+        server = FlakyServer(http_error(503))
+        self.policy.get('http://a', server.send)
+        assert self.policy.stats()['concurrency'] == 2
+
+    def test_get_async(self):
+        server = FlakyServer(http_error(502))
+        result = asyncio.run(self.policy.get_async('http://a',
+                                                   server.send_async))
+        assert result == 'ok'
+        assert self.policy.stats()['retries'] == 1
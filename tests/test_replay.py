@@ -0,0 +1,233 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+'''
+The purpose of this module is to test the classes defined in replay.py,
+and to run the Book, Category and Scraper classes offline against a
+replayed copy of the website
+'''
+from os import chdir, mkdir, walk
+from shutil import rmtree
+from threading import Thread
+from urllib.error import HTTPError
+import csv
+import filecmp
+import os.path
+import sqlite3
+import time
+
+import pytest
+
+from async_scraper import AsyncScraper
+from book import Book
+from category import Category
+from layout import OutputLayout
+from metrics import metrics
+from policy import FetchPolicy
+from replay import Corpus, ReplayServer, sample_site
+from scraper import Scraper
+from session import http_session
+from utils import FileIO
+
+
+def corpus_files(dirname):
+    return sorted(os.path.relpath(os.path.join(folder, name), dirname)
+                  for folder, _, names in walk(dirname) for name in names)
+
+
+##################################################
+# Corpus
+##################################################
+
+def test_corpus_path():
+    corpus = Corpus('.')
+    assert corpus.path('http://books.toscrape.com') == \
+        os.path.abspath('index.html')
+    assert corpus.path('http://books.toscrape.com/catalogue/') == \
+        os.path.abspath('catalogue/index.html')
+    assert corpus.path('http://a/media/../x.jpg?size=2') == \
+        os.path.abspath('media/x.jpg')
+
+
+##################################################
+# ReplayServer
+##################################################
+
+class TestReplayServer:
+
+    @classmethod
+    def setup_class(cls):
+        mkdir('testzone')
+        chdir('testzone')
+        sample_site('site')
+        cls.server = ReplayServer('site').start()
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.close()
+        chdir('..')
+        rmtree('testzone')
+
+    def test_serve(self):
+        body = http_session.get(self.server.url).body
+        with open('site/index.html', 'rb') as f:
+            assert body == f.read()
+
+        with pytest.raises(HTTPError):
+            http_session.get(self.server.url + 'missing.html')
+
+    def test_latency(self):
+        with ReplayServer('site', latency=0.2) as server:
+            start = time.monotonic()
+            http_session.get(server.url)
+            assert time.monotonic() - start >= 0.2
+
+    def test_errors(self):
+        with ReplayServer('site', error_rate=0.5, seed=1) as server:
+            policy = FetchPolicy(retries=20, backoff=0.001)
+            for _ in range(10):
+                policy.get(server.url, http_session.get)
+
+            assert server.errors > 0
+            assert server.requests == 10 + server.errors
+            assert policy.stats()['retries'] == server.errors
+
+    def test_fetch_BUDGET(self):
+        budget = FileIO.request_budget(2)
+
+        with ReplayServer('site', latency=0.1) as server:
+            url = server.url + 'index.html'
+            threads = [Thread(target=FileIO.fetch, args=(url, budget))
+                       for _ in range(6)]
+            start = time.monotonic()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            # 2 requests at a time: 3 rounds of 0.1 second
+            assert time.monotonic() - start >= 0.3
+            assert server.requests == 6
+
+    def test_book(self):
+        url = self.server.url + 'catalogue/poetry-book-1_989/index.html'
+        book = Book(url)
+        book.collect()
+
+        assert book.title == 'Poetry Book 1'
+        assert book.category == 'Poetry'
+        assert book.price_including_tax.startswith('£')
+        assert book.image_url.startswith(self.server.url + 'media/cache/')
+
+    def test_category(self):
+        url = self.server.url + 'catalogue/category/books/poetry_3/index.html'
+        category = Category(url, dl_image=False, root='.')
+
+        # the listing has 2 pages
+        assert category.name == 'Poetry'
+        assert len(category.books) == 25
+        assert [book.title for book in category.books[:2]] == \
+            ['Poetry Book 1', 'Poetry Book 2']
+
+    def test_scraper(self):
+        site = Scraper(self.server.url, workers=4)
+
+        assert site.num_books == 36
+        assert [len(category.books) for category in site.categories] == \
+            [11, 25]
+
+        with open('data/Travel/travel.csv', newline='') as f:
+            assert len(list(csv.DictReader(f))) == 11
+        assert os.path.exists('data/Travel/Travel_Book_1.jpg')
+
+    def test_scraper_CATEGORY_ERROR(self, monkeypatch):
+        # the listing page of Travel is missing
+        sample_site('broken')
+        os.remove('broken/catalogue/category/books/travel_2/index.html')
+        errors = []
+        monkeypatch.setattr('scraper.report_error',
+                            lambda error, **infos: errors.append(infos))
+
+        with ReplayServer('broken') as server:
+            site = Scraper(server.url, workers=4,
+                           layout=OutputLayout('broken_data'))
+
+        # the other categories are kept
+        assert [category.name for category in site.categories] == ['Poetry']
+        assert errors == [{'url': server.url + 'catalogue/category/books/'
+                                  'travel_2/index.html', 'stage': 'listing'}]
+
+    def test_scraper_LAYOUT(self):
+        cwd = os.getcwd()
+        sites = [Scraper(self.server.url, workers=4,
+                         layout=OutputLayout(f'output/{name}'))
+                 for name in ('first', 'second')]
+
+        assert os.getcwd() == cwd
+        assert not os.path.exists('Travel')
+        for site in sites:
+            assert site.root.startswith(os.path.join(cwd, 'output'))
+            assert os.path.exists(os.path.join(site.root, 'Travel',
+                                               'travel.csv'))
+            assert os.path.exists(os.path.join(site.root, 'Poetry',
+                                               'Poetry_Book_1.jpg'))
+
+    def test_scraper_CONCURRENT(self):
+        # two crawls at once, each recording its images in its own journal
+        sites = {}
+
+        def crawl(name):
+            sites[name] = Scraper(self.server.url, workers=4,
+                                  image_workers=2, max_requests=3,
+                                  layout=OutputLayout(f'concurrent/{name}'),
+                                  journaling=True)
+
+        threads = [Thread(target=crawl, args=(name,)) for name in 'ab']
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for site in sites.values():
+            db = sqlite3.connect(os.path.join(site.root, '.journal.sqlite'))
+            paths = [path for path, in db.execute("SELECT path FROM images")]
+            db.close()
+
+            assert len(paths) == 36
+            assert all(path.startswith(site.root + os.sep) for path in paths)
+
+    def test_async_scraper(self):
+        site = AsyncScraper(self.server.url, max_requests=10,
+                            layout=OutputLayout('async'))
+
+        assert [len(category.books) for category in site.categories] == \
+            [11, 25]
+        with open('async/Travel/travel.csv', newline='') as f:
+            assert len(list(csv.DictReader(f))) == 11
+
+    def test_async_scraper_IMAGE_STORE(self):
+        # the images go through FileIO.download_image (store and metric)
+        metrics.reset()
+        FileIO.set_image_store('images')
+        try:
+            AsyncScraper(self.server.url, max_requests=10,
+                         layout=OutputLayout('async_store'))
+            assert FileIO.image_store.stats()['downloaded'] == 36
+        finally:
+            FileIO.set_image_store(None)
+
+        assert metrics.snapshot()['stages']['image']['count'] == 36
+        assert os.stat('async_store/Travel/Travel_Book_1.jpg').st_nlink == 2
+
+    def test_record(self):
+        FileIO.set_recorder('record')
+        try:
+            Scraper(self.server.url, workers=4)
+        finally:
+            FileIO.set_recorder(None)
+
+        # the record of a replayed copy is the same copy
+        assert corpus_files('record') == corpus_files('site')
+        assert all(filecmp.cmp(os.path.join('site', name),
+                               os.path.join('record', name), False)
+                   for name in corpus_files('site'))
@@ -5,8 +5,35 @@
 The purpose of this module is to test the Scrap class
 '''
 
+from os import chdir, mkdir, remove
+from shutil import rmtree
+import csv
+import glob
+import os.path
+import re
+
 from scraper import Scraper
+from async_scraper import AsyncScraper
 from category import Category
+from replay import ReplayServer, sample_site
+
+# the categories of the replayed copy of the website
+CATEGORIES = (('Travel', 11), ('Mystery', 32), ('Historical Fiction', 26),
+              ('Crime', 1))
+
+
+def start_server():
+    mkdir('testzone')
+    chdir('testzone')
+    sample_site('site', CATEGORIES)
+    return ReplayServer('site').start()
+
+
+def stop_server(server):
+    server.close()
+    chdir('..')
+    rmtree('testzone')
+
 
 ##################################################
 # Scraper
@@ -17,10 +44,15 @@ class TestScraper:
 
     @classmethod
     def setup_class(cls):
-        url = 'http://books.toscrape.com/index.html'
+        cls.server = start_server()
+        url = cls.server.url + 'index.html'
         cls.site1 = Scraper(None)
         cls.site2 = Scraper(url)
 
+    @classmethod
+    def teardown_class(cls):
+        stop_server(cls.server)
+
     # --- Incoming Getters & Setters ---
 
     def test_url(self):
@@ -47,22 +79,126 @@ class TestScraper:
     #    assert self.site2.product_page_url == url
 
     def test_parse_num_books(self):
-        assert self.site2.num_books == 1000
+        assert self.site2.num_books == 70
 
     def test_parse_links(self):
-        link0 = "http://books.toscrape.com/catalogue/category/books/travel_2/index.html"
-        link10 = "http://books.toscrape.com/catalogue/category/books/religion_12/index.html"
-        link20 = "http://books.toscrape.com/catalogue/category/books/science_22/index.html"
-        link49 = "http://books.toscrape.com/catalogue/category/books/crime_51/index.html"
+        url = self.server.url + 'catalogue/category/books/'
+        link0 = url + "travel_2/index.html"
+        link1 = url + "mystery_3/index.html"
+        link2 = url + "historical-fiction_4/index.html"
+        link3 = url + "crime_5/index.html"
 
         assert self.site2.links[0] == (link0, 'Travel')
-        assert self.site2.links[10] == (link10, 'Religion')
-        assert self.site2.links[20] == (link20, 'Science')
-        assert self.site2.links[49] == (link49, 'Crime')
-        assert len(self.site2.links) == 50
+        assert self.site2.links[1] == (link1, 'Mystery')
+        assert self.site2.links[2] == (link2, 'Historical Fiction')
+        assert self.site2.links[3] == (link3, 'Crime')
+        assert len(self.site2.links) == 4
 
     def test_parse_categories(self):
         assert self.site2.categories[0].num_books == 11
         assert self.site2.categories[1].num_books == 32
-        assert self.site2.categories[10].num_books == 7
-        assert self.site2.categories[49].num_books == 1
+        assert self.site2.categories[2].num_books == 26
+        assert self.site2.categories[3].num_books == 1
+
+
+##################################################
+# AsyncScraper
+##################################################
+
+
+class TestAsyncScraper:
+
+    @classmethod
+    def setup_class(cls):
+        cls.server = start_server()
+        url = cls.server.url + 'index.html'
+        cls.site = AsyncScraper(url, max_requests=50)
+
+    @classmethod
+    def teardown_class(cls):
+        stop_server(cls.server)
+
+    def test_parse_num_books(self):
+        assert self.site.num_books == 70
+
+    def test_parse_links(self):
+        url = self.server.url + 'catalogue/category/books/'
+        link0 = url + "travel_2/index.html"
+        link3 = url + "crime_5/index.html"
+
+        assert self.site.links[0] == (link0, 'Travel')
+        assert self.site.links[3] == (link3, 'Crime')
+        assert len(self.site.links) == 4
+
+    def test_parse_categories(self):
+        assert self.site.categories[0].num_books == 11
+        assert self.site.categories[1].num_books == 32
+        assert len(self.site.categories[1].books) == 32
+        assert self.site.categories[3].num_books == 1
+
+
+##################################################
+# Incremental
+##################################################
+
+
+class TestIncremental:
+
+    def setup_method(self):
+        mkdir('testzone')
+        chdir('testzone')
+        sample_site('site')
+        self.server = ReplayServer('site').start()
+
+        # the first (full) scraping
+        Scraper(self.server.url, workers=4)
+        assert self.server.requests == 76
+
+    def teardown_method(self):
+        self.server.close()
+        chdir('..')
+        rmtree('testzone')
+
+    def rescrap(self):
+        """ Return the number of requests of an incremental scraping """
+        requests = self.server.requests
+        Scraper(self.server.url, workers=4, incremental=True)
+        return self.server.requests - requests
+
+    def read_travel(self):
+        with open('data/Travel/travel.csv', newline='') as f:
+            return list(csv.DictReader(f))
+
+    def test_UNCHANGED(self):
+        rows = self.read_travel()
+
+        # only the home page and the 3 listing pages
+        assert self.rescrap() == 4
+        assert self.read_travel() == rows
+
+    def test_PRICE_CHANGED(self):
+        # the price of the first Travel book changes on the website
+        product = glob.glob('site/catalogue/travel-book-1_*/index.html')[0]
+        listing = 'site/catalogue/category/books/travel_2/index.html'
+        with open(product, encoding='utf8') as f:
+            price = re.search('£[0-9.]+', f.read()).group()
+
+        for path, count in ((product, -1), (listing, 1)):
+            with open(path, encoding='utf8') as f:
+                html = f.read()
+            with open(path, 'w', encoding='utf8') as f:
+                f.write(html.replace(price, '£99.99', count))
+
+        # the listing pages and the product page of the changed book
+        assert self.rescrap() == 5
+        rows = self.read_travel()
+        assert len(rows) == 11
+        assert rows[0]['price_including_tax'] == '£99.99'
+
+    def test_IMAGE_MISSING(self):
+        remove('data/Travel/Travel_Book_1.jpg')
+
+        # the listing pages and the missing image
+        assert self.rescrap() == 5
+        assert os.path.exists('data/Travel/Travel_Book_1.jpg')
+        assert len(self.read_travel()) == 11
@@ -0,0 +1,105 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+'''
+The purpose of this module is to test the HTTPSession class
+defined in session.py
+'''
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from os import mkdir
+from shutil import rmtree
+from threading import Thread
+from urllib.error import HTTPError, URLError
+
+import pytest
+
+from session import HTTPSession
+
+
+class KeepAliveHandler(SimpleHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+
+##################################################
+# HTTPSession
+##################################################
+
+class TestHTTPSession:
+
+    @classmethod
+    def setup_class(cls):
+        try:
+            mkdir('testzone')
+        except Exception:
+            pass
+
+        with open('testzone/page.html', 'w') as f:
+            f.write('<html><h1>Hello</h1></html>')
+
+        handler = partial(KeepAliveHandler, directory='testzone')
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}/'
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        rmtree('testzone')
+
+    def test_get(self):
+        session = HTTPSession()
+        response = session.get(self.base_url + 'page.html')
+        assert response.status == 200
+        assert response.body == b'<html><h1>Hello</h1></html>'
+        session.close()
+
+    def test_get_REUSE(self):
+        session = HTTPSession()
+        for _ in range(5):
+            session.get(self.base_url + 'page.html')
+
+        assert session.stats() == {
+                'requests': 5,
+                'connections_opened': 1,
+                'connections_reused': 4,
+                }
+        session.close()
+
+    def test_get_POOL_SIZE(self):
+        session = HTTPSession(pool_size=0)
+        for _ in range(3):
+            session.get(self.base_url + 'page.html')
+
+        assert session.stats()['connections_opened'] == 3
+        assert session.stats()['connections_reused'] == 0
+
+    def test_get_USER_AGENT(self):
+        session = HTTPSession(user_agent='BookScraper')
+        assert session.user_agent == 'BookScraper'
+        session.configure(user_agent='Other')
+        assert session.user_agent == 'Other'
+
+    def test_get_NOT_FOUND(self):
+        session = HTTPSession()
+        with pytest.raises(HTTPError):
+            session.get(self.base_url + 'missing.html')
+        session.close()
+
+    def test_get_CLOSED_BY_SERVER(self):
+        session = HTTPSession()
+        session.get(self.base_url + 'page.html')
+        for conn in session._pools[('http', '127.0.0.1',
+                                    self.server.server_port)]:
+            conn.sock.close()
+        assert session.get(self.base_url + 'page.html').status == 200
+        session.close()
+
+    def test_get_ERROR(self):
+        session = HTTPSession(timeout=2)
+        with pytest.raises(URLError):
+            session.get('http://www.xxxfakexxx.xxx')
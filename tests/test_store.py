@@ -0,0 +1,88 @@
+#! /usr/bin/env python3
+# coding: utf-8
+
+'''
+The purpose of this module is to test the ImageStore class
+defined in store.py
+'''
+from os import mkdir, path
+from shutil import rmtree
+
+from store import ImageStore
+
+
+class FakeServer:
+    """ Return the images and record the requested urls """
+
+    def __init__(self):
+        self.images = {}
+        self.requests = []
+
+    def fetch(self, url):
+        self.requests.append(url)
+        return self.images[url]
+
+
+##################################################
+# ImageStore
+##################################################
+
+class TestImageStore:
+
+    def setup_method(self):
+        mkdir('testzone')
+        self.server = FakeServer()
+        self.server.images['http://a/x.jpg'] = b'a' * 100
+        self.server.images['http://b/y.jpg'] = b'b' * 100
+
+    def teardown_method(self):
+        rmtree('testzone', ignore_errors=True)
+        rmtree('teststore', ignore_errors=True)
+
+    def test_save(self):
+        store = ImageStore('teststore')
+        store.save('http://a/x.jpg', 'testzone/a.jpg', self.server.fetch)
+
+        with open('testzone/a.jpg', 'rb') as f:
+            assert f.read() == b'a' * 100
+        assert store.stats()['downloaded'] == 1
+        assert store.stats()['downloaded_bytes'] == 100
+
+    def test_save_REUSED(self):
+        ImageStore('teststore').save('http://a/x.jpg', 'testzone/a.jpg',
+                                     self.server.fetch)
+
+        store = ImageStore('teststore')
+        store.save('http://a/x.jpg', 'testzone/a.jpg', self.server.fetch)
+        store.save('http://a/x.jpg', 'testzone/a2.jpg', self.server.fetch)
+
+        assert self.server.requests == ['http://a/x.jpg']
+        assert store.stats()['reused'] == 2
+        assert path.samefile('testzone/a.jpg', 'testzone/a2.jpg')
+
+    def test_save_CORRUPTED(self):
+        store = ImageStore('teststore', verify=True)
+        store.save('http://a/x.jpg', 'testzone/a.jpg', self.server.fetch)
+
+        # same size, other content: only detected by the sha256
+        with open('testzone/a.jpg', 'r+b') as f:
+            f.write(b'z')
+
+        store.save('http://a/x.jpg', 'testzone/a.jpg', self.server.fetch)
+
+        with open('testzone/a.jpg', 'rb') as f:
+            assert f.read() == b'a' * 100
+        assert len(self.server.requests) == 2
+
+    def test_claim(self):
+        store = ImageStore('teststore')
+
+        assert store.claim('testzone/a.jpg', 'http://a/x.jpg') == \
+            'testzone/a.jpg'
+        assert store.claim('testzone/a.jpg', 'http://a/x.jpg') == \
+            'testzone/a.jpg'
+
+        other = store.claim('testzone/a.jpg', 'http://b/y.jpg')
+        assert other != 'testzone/a.jpg'
+        assert other.startswith('testzone/a_') and other.endswith('.jpg')
+        assert store.claim('testzone/a.jpg', 'http://b/y.jpg') == other
@@ -7,9 +7,19 @@ defined in utils.py
 '''
 from os import getcwd, chdir, mkdir, rmdir, remove
 from os import path
+from shutil import rmtree
 from urllib.request import urljoin
+from threading import Thread
+import csv
+import json
+import sqlite3
+import time
 
-from utils import FileIO, log_error
+from bs4 import SoupStrainer
+
+from replay import Corpus, ReplayServer
+from utils import FileIO, CSVWriter, SQLiteWriter, Progress, ErrorChannel, \
+    log_error, error_channel, DEFAULT_PARSER
 
 ##################################################
 # FileIO
@@ -68,9 +78,304 @@ class TestFileIO:
         assert path.exists(f"{filepath}.csv") is True
         remove(f"{filepath}.csv")
 
+    def test_read(self):
+        filepath = 'testread'
+        FileIO.write(filepath, ['a', 'b'], {'a': 'a', 'b': 'b'}, 'w')
+        FileIO.write(filepath, ['a', 'b'], {'a': 'hello', 'b': 42})
+        assert FileIO.read(filepath) == [{'a': 'hello', 'b': '42'}]
+        assert FileIO.read('testmissing') == []
+        remove(f"{filepath}.csv")
+
+    def test_parse(self):
+        html = '<div><h1>Title</h1></div><p>é</p>'.encode('utf8')
+        assert FileIO.parse(html).find('p').string == 'é'
+
+    def test_parse_STRAIN(self):
+        html = b'<div><h1>Title</h1></div><p>text</p>'
+        strainer = SoupStrainer('p')
+
+        FileIO.set_parser('html.parser', strain=True)
+        assert FileIO.parse(html, strainer).find('h1') is None
+        assert FileIO.parse(html, strainer).find('p').string == 'text'
+
+        FileIO.set_parser('html.parser', strain=False)
+        assert FileIO.parse(html, strainer).find('h1').string == 'Title'
+
+        FileIO.set_parser()
+        assert FileIO.parser == DEFAULT_PARSER
+
     def test_download_image(self):
         url = "http://books.toscrape.com/media/cache/c0/59/c05972805aa7201171b8fc71a5b00292.jpg"
+        Corpus('testsite').save(url, b'image')
+
         name = "testdownload.jpg"
-        FileIO.download_image(url, name)
-        assert path.exists(name)
+        with ReplayServer('testsite') as server:
+            FileIO.download_image(url.replace('http://books.toscrape.com/',
+                                              server.url), name)
+
+        with open(name, 'rb') as f:
+            assert f.read() == b'image'
         remove(name)
+        rmtree('testsite')
+
+
+##################################################
+# CSVWriter
+##################################################
+
+
+class TestCSVWriter:
+
+    @classmethod
+    def setup_class(cls):
+        try:
+            mkdir('testzone')
+        except Exception:
+            pass
+
+        chdir('testzone')
+
+    @classmethod
+    def teardown_class(cls):
+        chdir('..')
+        try:
+            rmdir('testzone')
+        except Exception:
+            pass
+
+    def read_rows(self, filepath):
+        with open(f"{filepath}.csv", newline='') as csvfile:
+            return list(csv.reader(csvfile))
+
+    def test_write(self):
+        filepath = 'testwriter'
+        with CSVWriter(filepath, ['a', 'b'], 'w') as writer:
+            writer.writerow({'a': 1, 'b': 2})
+            writer.writerows([{'a': 3, 'b': 4}, {'a': 5, 'b': 6}])
+
+        assert self.read_rows(filepath) == [['a', 'b'], ['1', '2'],
+                                            ['3', '4'], ['5', '6']]
+        remove(f"{filepath}.csv")
+
+    def test_write_APPEND(self):
+        filepath = 'testwriter'
+        for _ in range(2):
+            with CSVWriter(filepath, ['a'], 'a') as writer:
+                writer.writerow({'a': 'hello'})
+
+        assert self.read_rows(filepath) == [['a'], ['hello'], ['hello']]
+
+        with CSVWriter(filepath, ['a'], 'w') as writer:
+            writer.writerow({'a': 'hello'})
+
+        assert self.read_rows(filepath) == [['a'], ['hello']]
+        remove(f"{filepath}.csv")
+
+    def test_write_BATCH(self):
+        filepath = 'testwriter'
+        writer = CSVWriter(filepath, ['a'], 'w', batch_size=2)
+        writer.writerow({'a': 1})
+        assert ['1'] not in self.read_rows(filepath)
+        writer.writerow({'a': 2})
+        assert self.read_rows(filepath) == [['a'], ['1'], ['2']]
+        writer.writerow({'a': 3})
+        writer.close()
+        assert self.read_rows(filepath) == [['a'], ['1'], ['2'], ['3']]
+        remove(f"{filepath}.csv")
+
+
+class TestSQLiteWriter:
+
+    @classmethod
+    def setup_class(cls):
+        try:
+            mkdir('testzone')
+        except Exception:
+            pass
+
+        chdir('testzone')
+
+    @classmethod
+    def teardown_class(cls):
+        chdir('..')
+        try:
+            rmdir('testzone')
+        except Exception:
+            pass
+
+    def read_rows(self, filepath):
+        db = sqlite3.connect(filepath)
+        rows = db.execute("SELECT a, b FROM books ORDER BY a").fetchall()
+        db.close()
+        return rows
+
+    def test_write(self):
+        filepath = 'testwriter.sqlite'
+        with SQLiteWriter(filepath, ['a', 'b'], key='a', indexes=['b'],
+                          types={'a': 'INTEGER'}) as writer:
+            writer.writerow({'a': 1, 'b': 'x'})
+            writer.writerows([{'a': 2, 'b': 'y'}, {'a': 1, 'b': 'z'}])
+
+        # the rows with the same key are replaced
+        assert self.read_rows(filepath) == [(1, 'z'), (2, 'y')]
+        remove(filepath)
+
+    def test_write_BATCH(self):
+        filepath = 'testwriter.sqlite'
+        writer = SQLiteWriter(filepath, ['a', 'b'], batch_size=2)
+        writer.writerow({'a': '1'})
+        assert self.read_rows(filepath) == []
+        writer.writerow({'a': '2'})
+        assert self.read_rows(filepath) == [('1', None), ('2', None)]
+        writer.close()
+        remove(filepath)
+
+    def test_read(self):
+        filepath = 'testwriter.sqlite'
+        with SQLiteWriter(filepath, ['a', 'b'],
+                          types={'a': 'INTEGER'}) as writer:
+            writer.writerows([{'a': 1, 'b': 'x'}, {'a': 2, 'b': None}])
+
+            assert writer.read(b='x') == [{'a': '1', 'b': 'x'}]
+            assert writer.read() == [{'a': '1', 'b': 'x'},
+                                     {'a': '2', 'b': ''}]
+        remove(filepath)
+
+
+##################################################
+# Progress
+##################################################
+
+class TestProgress:
+
+    def update_books(self, progress, number, category):
+        for done in range(1, number + 1):
+            progress.catbooks_update(done, number, f'book {done}', category)
+
+    def test_bar_RATE(self, capsys):
+        # no redraw by the ticker during the test: only the final frame
+        progress = Progress(mode='bar', max_rate=0.001)
+        progress.allbooks_init(4000, 'site')
+
+        # many updates from several threads
+        threads = [Thread(target=self.update_books,
+                          args=(progress, 1000, f'category {number}'))
+                   for number in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        progress.complete()
+
+        output = capsys.readouterr().out
+        # a single frame (not one per update): each frame ends by moving
+        # the cursor back to its first line
+        assert output.count('\r' + '\033[A' * 5 + '\n') == 1
+        assert '4000/4000 books' in output
+
+    def test_log(self, capsys):
+        progress = Progress(mode='log', log_interval=0.05)
+        progress.allbooks_init(100, 'site')
+        self.update_books(progress, 50, 'poetry')
+        time.sleep(0.2)
+        progress.errors_update()
+        progress.complete()
+
+        lines = [line for line in capsys.readouterr().out.splitlines()
+                 if 'books/s' in line]
+        assert lines[0].startswith(' 50/100 books')
+        assert '\033' not in lines[0]  # no terminal control
+        assert '1 error(s)' in lines[-1]
+
+    def test_off(self, capsys):
+        progress = Progress(mode='off')
+        progress.allbooks_init(10, 'site')
+        self.update_books(progress, 10, 'poetry')
+        time.sleep(0.1)
+
+        assert capsys.readouterr().out == ''
+
+    def test_throughput(self):
+        now = [100]
+        progress = Progress(mode='off', clock=lambda: now[0])
+        progress.allbooks_init(100, 'site')
+        assert progress.throughput() == (0.0, None)
+
+        now[0] = 102
+        self.update_books(progress, 20, 'poetry')
+        assert progress.throughput() == (10.0, 8.0)
+
+        # only the last 5 seconds (or so) are kept
+        now[0] = 110
+        self.update_books(progress, 10, 'travel')
+        assert progress.throughput() == (1.25, 56.0)
+
+
+##################################################
+# ErrorChannel
+##################################################
+
+class TestErrorChannel:
+
+    def setup_method(self):
+        mkdir('testzone')
+        self.channel = ErrorChannel(name='bookscraper.test')
+        self.channel.configure('testzone/errors.log', 'testzone/errors.jsonl')
+
+    def teardown_method(self):
+        self.channel.close()
+        rmtree('testzone')
+
+    def report_errors(self, number, thread):
+        for index in range(number):
+            self.channel.error(f"Can't find the UPC ::\nbook {index}",
+                               url=f'http://site/{thread}/{index}',
+                               stage='extract', field='universal_product_code')
+
+    def test_error_THREADS(self):
+        threads = [Thread(target=self.report_errors, args=(100, number))
+                   for number in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.channel.error(ValueError('no image'), stage='image')
+        self.channel.flush()
+
+        assert self.channel.count == 801
+        assert self.channel.fields == {'universal_product_code': 800}
+        assert self.channel.stages == {'extract': 800, 'image': 1}
+
+        with open('testzone/errors.log') as f:
+            assert len(f.read().splitlines()) == 801 * 2 - 1
+
+        with open('testzone/errors.jsonl') as f:
+            records = [json.loads(line) for line in f]
+        assert len(records) == 801
+        assert len({record['url'] for record in records[:-1]}) == 800
+        assert records[0]['field'] == 'universal_product_code'
+        assert records[-1]['type'] == 'ValueError'
+        assert records[-1]['error'] == 'no image'
+
+    def test_configure(self):
+        self.report_errors(3, 0)
+        self.channel.configure('testzone/errors.log')
+
+        assert self.channel.count == 0
+        assert self.channel.report is None
+        with open('testzone/errors.log') as f:
+            assert f.read() == ''
+
+
+def test_log_error():
+    class Page:
+        product_page_url = 'http://site/book'
+
+        @log_error
+        def collect(self):
+            raise ValueError('unreachable')
+
+    before = error_channel.stages['test_log_error.<locals>.Page.collect']
+    assert Page().collect() is None
+    assert error_channel.stages['test_log_error.<locals>.Page.collect'] == \
+        before + 1
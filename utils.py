@@ -5,39 +5,231 @@
     the generic functions
 '''
 
-from os import get_terminal_size, chdir, mkdir, getcwd, path
-from shutil import rmtree
-from urllib.request import urlopen, urlretrieve, build_opener, install_opener
+from os import chdir, mkdir, getcwd, path
+import os.path
+from shutil import rmtree, get_terminal_size
+from threading import RLock, BoundedSemaphore, Event, Thread
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import multiprocessing
+from collections import deque, Counter
+from datetime import datetime
+from functools import wraps
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+import atexit
 import csv
+import json
 import logging
+import sqlite3
+import sys
+import time
 
 from bs4 import BeautifulSoup
 
+try:
+    import lxml  # noqa: F401 (optional, faster HTML parser)
+    DEFAULT_PARSER = 'lxml'
+except ImportError:
+    DEFAULT_PARSER = 'html.parser'
+
+from session import http_session
+from policy import fetch_policy
+from cache import HTTPCache
+from store import ImageStore
+from replay import Corpus
+from metrics import metrics
+
 
 ##################################################
 # Logging
 ##################################################
 
 
-def log_error(function, logfile='errors.log', extended_infos=False):
+class JSONLinesHandler(logging.FileHandler):
+    """ Write each error record as a JSON object on its own line """
+
+    def format(self, record):
+        return json.dumps({
+                'time': datetime.fromtimestamp(record.created)
+                                .isoformat(timespec='milliseconds'),
+                'stage': getattr(record, 'stage', None),
+                'field': getattr(record, 'field', None),
+                'url': getattr(record, 'url', None),
+                'type': getattr(record, 'error_type', None),
+                'error': record.getMessage(),
+                }, ensure_ascii=False)
+
+
+class ErrorChannel:
+    """ The purpose of this class is to record the scraping errors
+        without slowing down (or blocking) the scraping threads
+
+    The errors are put in a queue with their url, stage and field, and
+    written by a background listener in the text log (and in a JSON-lines
+    report if requested); the counters are kept in memory.
+
+    Attributes
+    ----------
+    logfile : str
+        the absolute path of the text log
+    report : str
+        the absolute path of the JSON-lines report (None: no report)
+    count : int
+        the number of errors recorded
+    fields : Counter
+        the number of errors of each book field
+    stages : Counter
+        the number of errors of each stage
+
+    Methods
+    -------
+    configure(logfile='errors.log', report=None)
+        reset the counters and (re)open the log and the report
+    error(error, url=None, stage=None, field=None, exc_info=False)
+        record the error
+    flush()
+        wait until the recorded errors are written
+    close()
+        write the recorded errors and close the files
+    """
+
+    def __init__(self, logfile='errors.log', report=None, name='bookscraper'):
+        self.logfile = os.path.abspath(logfile)
+        self.report = os.path.abspath(report) if report else None
+        self.count = 0
+        self.fields = Counter()
+        self.stages = Counter()
+        self._lock = RLock()
+        self._queue = SimpleQueue()
+        self._listener = None
+
+        # a dedicated logger: the root logger is left to the application
+        self._logger = logging.getLogger(name)
+        self._logger.propagate = False
+        self._logger.setLevel(logging.WARNING)
+        self._logger.handlers = [QueueHandler(self._queue)]
+
+    def configure(self, logfile='errors.log', report=None):
+        """ Reset the counters and (re)open the text log and the JSON-lines
+            report (both truncated) """
+
+        with self._lock:
+            self.close()
+            self.logfile = os.path.abspath(logfile)
+            self.report = os.path.abspath(report) if report else None
+            self.count = 0
+            self.fields.clear()
+            self.stages.clear()
+            self.__start()
+
+    def error(self, error, url=None, stage=None, field=None, exc_info=False):
+        """ Record the error (the files are written in background)
+
+        Parameters
+        ----------
+        error : str or Exception
+            The error message (or the exception)
+        url : str (default is None)
+            The url of the page concerned
+        stage : str (default is None)
+            The stage of the scraping ('listing', 'extract'...)
+        field : str (default is None)
+            The book field that couldn't be collected
+        exc_info : bool (default is False)
+            Add the traceback to the log
+        """
+
+        with self._lock:
+            if self._listener is None:
+                self.__start()
+            self.count += 1
+            if field is not None:
+                self.fields[field] += 1
+            if stage is not None:
+                self.stages[stage] += 1
+
+        self._logger.error(error, exc_info=exc_info, extra={
+                'url': url, 'stage': stage, 'field': field,
+                'error_type': type(error).__name__
+                if isinstance(error, BaseException) else None})
+
+    def flush(self):
+        """ Wait until the recorded errors are written in the files """
+        with self._lock:
+            if self._listener is not None:
+                self._listener.stop()  # writes the queued records
+                self._listener.start()
+                for handler in self._listener.handlers:
+                    handler.flush()
+
+    def close(self):
+        """ Write the recorded errors and close the files """
+        with self._lock:
+            if self._listener is not None:
+                self._listener.stop()
+                for handler in self._listener.handlers:
+                    handler.close()
+                self._listener = None
+
+    # --- PRIVATE METHODS ---
+
+    def __start(self):
+        text = logging.FileHandler(self.logfile, mode='w', encoding='utf8')
+        text.setFormatter(logging.Formatter('%(asctime)s - %(message)s'))
+        handlers = [text]
+        if self.report is not None:
+            handlers.append(JSONLinesHandler(self.report, mode='w',
+                                             encoding='utf8'))
+
+        self._listener = QueueListener(self._queue, *handlers)
+        self._listener.start()
+
 
-    logging.basicConfig(
-                            filename=logfile,
-                            filemode='w',
-                            format='%(asctime)s - %(message)s',
-                            level=logging.WARNING,
-                            )
+def error_url(args):
+    """ Return the url of the page concerned by a call, from its arguments
+        (a book, a category, a scraper or an url) """
 
+    for attribute in ('product_page_url', 'category_url', 'site_url'):
+        for arg in args:
+            url = getattr(arg, attribute, None)
+            if isinstance(url, str):
+                return url
+
+    for arg in args:
+        if isinstance(arg, str) and '://' in arg:
+            return arg
+    return None
+
+
+def log_error(function, extended_infos=False):
+    """ Report the exceptions raised by the function (which then returns
+        None), with the name of the function as stage """
+
+    stage = function.__qualname__
+
+    @wraps(function)
     def wrapper(*args, **kwargs):
         try:
             return function(*args, **kwargs)
         except Exception as e:
-            logging.error(e, exc_info=extended_infos)
-            progress_monitor.errors_update()
+            report_error(e, extended_infos, url=error_url(args), stage=stage)
 
     return wrapper
 
 
+def report_error(error, extended_infos=False, url=None, stage=None, field=None):
+    """ Record the given error (or message) in the log and count it """
+
+    error_channel.error(error, url, stage, field, extended_infos)
+    progress_monitor.errors_update()
+
+
+error_channel = ErrorChannel()
+atexit.register(error_channel.close)
+
+
 ##################################################
 # Progress
 ##################################################
@@ -47,6 +239,12 @@ class Progress():
     """ The purpose of this class is to display the current
         status of the website scraping
 
+    The updates only change the status (they may come from many threads
+    at the same time): the display is redrawn by a background ticker at
+    most <max_rate> times per second, with the throughput and the
+    remaining time. When the output isn't a terminal, a status line is
+    printed every <log_interval> seconds instead of the progress bars.
+
     Attributes
     ----------
     _categories : dict
@@ -55,98 +253,318 @@ class Progress():
         Current category books progress informations
     _allbooks : dict
         Overall books progress informations
+    _images : dict
+        Background images downloads informations
+    mode : str
+        'bar' (progress bars), 'log' (status lines) or 'off'
+        (None: 'bar' in a terminal, else 'log')
+    max_rate : float
+        the maximum number of redraws per second of the progress bars
+    log_interval : float
+        the number of seconds between two status lines
+    clock : function
+        the function returning the current time in seconds
+        (used for the throughput, default is time.monotonic)
 
     Methods
     -------
-    catbooks_update(current, total, label)
+    configure(mode, max_rate, log_interval)
+        change the display settings
+    catbooks_update(current, total, label, category=None)
         update the current category scraping progress
+        (the categories scraped at the same time are aggregated)
     category_update(current, total, label):
         update the  overall categories scraping progress
     allbooks_init(total, label)
         initilize the overall scraping informations
+    images_update(queued=0, done=0, failed=0)
+        update the background images downloads progress
+    throughput()
+        return the books scraped per second and the remaining seconds
     """
 
-    def __init__(self):
+    def __init__(self, mode=None, max_rate=10.0, log_interval=10.0,
+                 clock=time.monotonic):
         self._categories = {'current': 0, 'total': 0, 'label': ''}
         self._catbooks = {'current': 0, 'total': 0, 'label': ''}
         self._allbooks = {'current': 0, 'total': 0, 'label': ''}
+        self._active = {}  # categories in progress: {name: (current, total)}
+        self._images = {'queued': 0, 'done': 0, 'failed': 0}
         self.error_count = 0
+        self.mode = mode
+        self.max_rate = max_rate
+        self.log_interval = log_interval
+        self.clock = clock
+        self._lock = RLock()  # the updates may come from several threads
+        self._changed = False  # redraw needed
+        self._samples = deque()  # recent (time, books done) samples
+        self._ticker = None  # the Event stopping the display thread
+        self._ticker_thread = None
+
+    def configure(self, mode=None, max_rate=None, log_interval=None):
+        """ Change the display settings (None keeps the current value)
+
+        Parameters
+        ----------
+        mode : str
+            'bar' (progress bars), 'log' (status lines), 'off' or
+            'auto' ('bar' in a terminal, else 'log')
+        max_rate : float
+            The maximum number of redraws per second of the progress bars
+        log_interval : float
+            The number of seconds between two status lines
+        """
+
+        self.__stop_ticker()
+        if mode is not None:
+            self.mode = None if mode == 'auto' else mode
+        if max_rate is not None:
+            self.max_rate = max_rate
+        if log_interval is not None:
+            self.log_interval = log_interval
 
-    def catbooks_update(self, current, total, label):
-        self._catbooks = {
-                            'current': int(current),
-                            'total': int(total),
-                            'label': label,
-                        }
+    def catbooks_update(self, current, total, label, category=None):
+        with self._lock:
+            previous = self._active.get(category, (0, 0))[0]
+            self._active[category] = (int(current), int(total))
+            self._catbooks = {
+                                'current': sum(c for c, t in self._active.values()),
+                                'total': sum(t for c, t in self._active.values()),
+                                'label': label,
+                            }
 
-        if(current != 0):
-            self._allbooks['current'] += 1
+            self._allbooks['current'] += max(int(current) - previous, 0)
 
-        self.__update_display()
+            if current >= total:
+                del self._active[category]
+
+            self.__changed_status()
 
     def category_update(self, current, total, label):
-        self._categories = {
-                            'current': int(current),
-                            'total': int(total),
-                            'label': label,
-                          }
+        with self._lock:
+            self._categories = {
+                                'current': int(current),
+                                'total': int(total),
+                                'label': label,
+                              }
 
-        self.__update_display()
+            self.__changed_status()
 
     def allbooks_init(self, total, label):
-        self._allbooks = {
-                            'current': 0,
-                            'total': int(total),
-                            'label': label,
-                        }
+        with self._lock:
+            self._allbooks = {
+                                'current': 0,
+                                'total': int(total),
+                                'label': label,
+                            }
+            self._samples = deque([(self.clock(), 0)])
+
+    def throughput(self):
+        """ Return the number of books scraped per second (over the last
+            few seconds) and the estimated number of remaining seconds
+            (None when unknown)
+        """
+
+        with self._lock:
+            now = self.clock()
+            current = self._allbooks['current']
+            samples = self._samples
+            samples.append((now, current))
+            # keep a window of about 5 seconds (and at least 2 samples)
+            while len(samples) > 2 and now - samples[1][0] > 5:
+                samples.popleft()
+
+            start, done = samples[0]
+            if now - start <= 0 or current <= done:
+                return 0.0, None
+
+            rate = (current - done) / (now - start)
+            remaining = max(self._allbooks['total'] - current, 0)
+            return rate, remaining / rate
+
+    def images_update(self, queued=0, done=0, failed=0):
+        with self._lock:
+            self._images['queued'] += queued
+            self._images['done'] += done
+            self._images['failed'] += failed
+
+            self.__changed_status()
 
     def errors_update(self):
-        self.error_count += 1
+        with self._lock:
+            self.error_count += 1
+
+            self.__changed_status()
 
-        self.__update_display()
+    def complete(self, session=None):
+        # session: the HTTP session reported (default is http_session)
 
-    def complete(self):
+        self.__stop_ticker()
+        mode = self.__mode()
+        if mode != 'off':
+            self.__display(mode)  # the final status
 
         try:
             terminal_size = get_terminal_size()
             size = terminal_size.columns-1
 
-            print("\033[B"*6)
+            if mode == 'bar':
+                print("\033[B"*6)
 
             print("\n"+" Scraping process complete ".center(size, '*'[:size]))
 
             if self.error_count > 0:
                 print(f"\n Error count: {self.error_count}\n")
-                chdir(CURRENT_WORKING_DIRECTORY)
-                with open('errors.log', 'r') as f:
-                    for i, row in enumerate(f):
-                        if i % 2 == 0:
-                            print(' --'+row, end='\r')
-                        else:
-                            print(' '+row, end='\n')
-
-                        if i > 10:
-                            print("\n" + " Open errors.log for "
-                                         "a complete report ".center(size, '*'[:size]))
-                            break
+                fields = error_channel.fields
+                if fields:
+                    print(" Missing fields: " + ", ".join(
+                            f"{field} {count}"
+                            for field, count in fields.most_common()) + "\n")
+
+                error_channel.flush()
+                if path.exists(error_channel.logfile):
+                    with open(error_channel.logfile, 'r') as f:
+                        for i, row in enumerate(f):
+                            if i % 2 == 0:
+                                print(' --'+row, end='\r')
+                            else:
+                                print(' '+row, end='\n')
+
+                            if i > 10:
+                                print("\n" + " Open errors.log for "
+                                             "a complete report ".center(size, '*'[:size]))
+                                break
             else:
                 print("\n No scraping error\n")
 
+            images = self._images
+            if images['queued'] > 0:
+                print(f" Images: {images['done'] - images['failed']}/"
+                      f"{images['queued']} downloaded in background "
+                      f"({images['failed']} failed)\n")
+
+            stats = fetch_policy.stats()
+            if stats['retries'] or stats['failures'] or stats['throttled']:
+                print(f" Retries: {stats['retries']} "
+                      f"(still failing: {stats['failures']}), "
+                      f"rate limit wait: {stats['throttled']:.1f}s\n")
+            if stats['concurrency'] is not None:
+                print(f" Adaptive concurrency: {stats['concurrency']} "
+                      f"request(s) at the end\n")
+
+            stats = (session or http_session).stats()
+            print(f" Requests: {stats['requests']} "
+                  f"(connections opened: {stats['connections_opened']}, "
+                  f"reused: {stats['connections_reused']})\n")
+
+            if FileIO.cache is not None:
+                stats = FileIO.cache.stats()
+                print(f" Cache: {stats['hits']} hit(s), "
+                      f"{stats['revalidated']} revalidated, "
+                      f"{stats['misses']} miss(es), "
+                      f"{stats['evictions']} eviction(s)\n")
+
+            if FileIO.image_store is not None:
+                stats = FileIO.image_store.stats()
+                print(f" Image store: {stats['downloaded']} downloaded "
+                      f"({stats['downloaded_bytes'] / 1024**2:.1f} MB), "
+                      f"{stats['reused']} reused\n")
+
+            stages = metrics.snapshot()['stages']
+            if stages:
+                print(" Time per stage:")
+                for stage, values in stages.items():
+                    print(f"   {stage:<13}{values['count']:>7} x "
+                          f"{values['mean_ms']:8.2f} ms "
+                          f"(p95 {values['p95_ms']:.2f} ms, "
+                          f"total {values['total_s']:.1f} s)")
+                print()
+
         except OSError:
             pass
 
-    # --- PRIVATE METHODS ---
+        metrics.complete()  # the final export of the metrics
 
-    def __update_display(self):
+    # --- PRIVATE METHODS ---
 
+    def __changed_status(self):
+        # called with the lock held: the ticker redraws the display
+        self._changed = True
+        if self._ticker is None and self.__mode() != 'off':
+            self._ticker = Event()
+            self._ticker_thread = Thread(target=self.__tick,
+                                         args=(self._ticker,), daemon=True)
+            self._ticker_thread.start()
+
+    def __mode(self):
+        if self.mode is not None:
+            return self.mode
+        return 'bar' if sys.stdout.isatty() else 'log'
+
+    def __tick(self, stop):
+        mode = self.__mode()
+        interval = 1 / self.max_rate if mode == 'bar' else self.log_interval
+
+        while not stop.wait(interval):
+            with self._lock:
+                if not self._changed:
+                    continue
+                self._changed = False
+            self.__display(mode)
+
+    def __stop_ticker(self):
+        with self._lock:
+            stop, self._ticker = self._ticker, None
+            thread, self._ticker_thread = self._ticker_thread, None
+
+        if stop is not None:
+            stop.set()
+            thread.join()
+
+    def __display(self, mode):
         try:
-            terminal_size = get_terminal_size()
-            bar_size = terminal_size.columns - 20
-            num_lines = 5
+            if mode == 'bar':
+                frame = self.__get_frame()
+            else:
+                frame = self.__get_status_line() + '\n'
+            sys.stdout.write(frame)
+            sys.stdout.flush()
+        except OSError:
+            pass
+
+    def __get_speed(self):
+        rate, eta = self.throughput()
+        speed = f"{rate:.1f} books/s"
+        if eta is not None:
+            minutes, seconds = divmod(round(eta), 60)
+            speed += f" - ETA {minutes}:{seconds:02}"
+        return speed
 
+    def __get_status_line(self):
+        with self._lock:
+            allbooks = self._allbooks
+            cat = self._categories
+            images = self._images
+
+            line = f" {allbooks['current']}/{allbooks['total']} books"
+            if cat['total']:
+                line += f" - {cat['current']}/{cat['total']} categories"
+            if images['queued']:
+                line += f" - {images['done']}/{images['queued']} images"
+            line += f" - {self.__get_speed()}"
+            if self.error_count:
+                line += f" - {self.error_count} error(s)"
+            return line
+
+    def __get_frame(self):
+
+        terminal_size = get_terminal_size()
+        bar_size = terminal_size.columns - 20
+        num_lines = 5
+
+        with self._lock:
             # Clean terminal
-            print(" "*terminal_size.columns*num_lines)
-            print("\033[A"*(num_lines+1))
+            lines = [" "*terminal_size.columns*num_lines, "\033[A"*(num_lines+1)]
 
             # Display
             allbooks = self._allbooks
@@ -155,26 +573,35 @@ class Progress():
                 title = f"{allbooks['label']}"
             else:
                 title = f"{allbooks['label']} [There are {self.error_count} error(s) : check errors.log]"
-            print(f"{title.center(bar_size)[:bar_size]}")
-            print(f"{all_bar} {allbooks['current']}/{allbooks['total']} books")
+            lines.append(f"{title.center(bar_size)[:bar_size]}")
+            images = self._images
+            if images['queued'] == 0:
+                lines.append(f"{all_bar} {allbooks['current']}/{allbooks['total']} books"
+                             f" - {self.__get_speed()}")
+            else:
+                lines.append(f"{all_bar} {allbooks['current']}/{allbooks['total']} books"
+                             f" - {images['done']}/{images['queued']} images"
+                             f" - {self.__get_speed()}")
 
             cat = self._categories
             # cat_bar = self.__get_progressbar(cat, bar_size)
             # print(f"{cat_bar} {cat['current']}/{cat['total']} categories")
-            catlabel = f"Current category: {cat['label']}  "\
-                       f"[{cat['current']+1}/{cat['total']}]"
-            print(f"{catlabel.center(bar_size)[:bar_size]}")
+            if len(self._active) > 1:
+                catlabel = f"Current categories: {', '.join(map(str, self._active))}  "\
+                           f"[{cat['current']+1}/{cat['total']}]"
+            else:
+                catlabel = f"Current category: {cat['label']}  "\
+                           f"[{cat['current']+1}/{cat['total']}]"
+            lines.append(f"{catlabel.center(bar_size)[:bar_size]}")
 
             catbooks = self._catbooks
             catb_bar = self.__get_progressbar(catbooks, bar_size)
-            print(f"{catb_bar} {catbooks['current']}/{catbooks['total']} books")
-            print(f"{catbooks['label'].center(bar_size)[:bar_size]}", end='\r')
-
-            # Reset cursor position in terminal
-            print("\033[A"*num_lines)
+            lines.append(f"{catb_bar} {catbooks['current']}/{catbooks['total']} books")
+            lines.append(f"{catbooks['label'].center(bar_size)[:bar_size]}\r"
+                         # Reset cursor position in terminal
+                         + "\033[A"*num_lines)
 
-        except OSError:
-            pass
+        return '\n'.join(lines) + '\n'
 
     def __get_progressbar(self, source, bar_size):
 
@@ -206,21 +633,297 @@ class FileIO:
 
     Static Methods
     -------
-    connect_with_bs4()
+    request_budget(max_requests)
+        return a budget limiting the number of requests running at once
+    set_cache(dirname, max_size, ttl)
+        keep the fetched pages and images in the <dirname> folder
+    fetch(url, budget=None)
+        return the content of the given url (from the cache if enabled)
+    set_recorder(dirname)
+        record a copy of the fetched pages and images in <dirname>
+    set_image_store(dirname, verify)
+        keep a single copy of each image in the <dirname> folder
+    claim_image(name, url)
+        return a local image name that no other image uses
+    set_parser(parser, strain)
+        select the HTML parser and the partial parsing of the pages
+    parse(html, parse_only=None)
+        return a BeautifulSoup object from the given html
+    set_parse_workers(workers)
+        parse the product pages in <workers> processes
+    run_parser(function, *args)
+        call the given parsing function in the parse workers (if any)
+    connect_with_bs4(url, parse_only=None, budget=None)
         return a BeautifulSoup object from the given url
     init_root(root, reset_cwd=True, delete_prev=True)
         remove and re-create (if needed) the <root> folder and enter in it
-        use it only once !
+        use it only once ! (the scraping uses an OutputLayout instead)
     open_category(name)
         create the <name> folder and enter into it
+        (the scraping uses OutputLayout.category_folder instead)
     close_category()
         move to the parent folder
     write(path, fields, data, mode)
         write the given data the the given path.csv
+    read(path)
+        return the rows of the given path.csv as a list of dicts
+    download_image(url, name, journal=None, budget=None, fetch=None)
+        copy the remote image to the local <name> file
     """
 
+    cache = None  # optional HTTPCache used by every page and image request
+    image_store = None  # optional ImageStore linked into the category folders
+    parser = DEFAULT_PARSER  # 'lxml' when installed, else 'html.parser'
+    strain = False  # only parse the parts of the pages used by the scraper
+    parse_pool = None  # optional ProcessPoolExecutor parsing the product pages
+    recorder = None  # optional Corpus recording a copy of the fetched content
+
+    @staticmethod
+    def request_budget(max_requests):
+        """ Return a budget limiting the number of requests (listing pages,
+            product pages and images) running at the same time across all
+            the threads it is given to (see the budget parameter of fetch)
+
+        Parameters
+        ----------
+        max_requests : int
+            The maximum number of requests in flight (None or 0: no limit)
+
+        Returns
+        -------
+        BoundedSemaphore
+            The budget (None when there is no limit)
+        """
+
+        if max_requests:
+            return BoundedSemaphore(max_requests)
+        return None
+
+    @staticmethod
+    def set_cache(dirname, max_size=500*1024*1024, ttl=0):
+        """ Keep the fetched pages and images on the local storage
+            and only download them again when they have changed
+
+        Parameters
+        ----------
+        dirname : str
+            The folder where the responses are stored (None: no cache)
+        max_size : int (default is 500MB)
+            The maximum size of the stored responses (in bytes)
+        ttl : float (default is 0)
+            The number of seconds during which a stored response is used
+            without asking the server if it has changed
+        """
+
+        if dirname:
+            FileIO.cache = HTTPCache(dirname, max_size, ttl)
+        else:
+            FileIO.cache = None
+
+    @staticmethod
+    def fetch(url, budget=None):
+        """ Return the content of the given URL as bytes,
+            from the cache when it is enabled and up to date
+
+        Parameters
+        ----------
+        url : str
+            The internet address of the content
+        budget : BoundedSemaphore (default is None)
+            The request budget of the crawl (see request_budget)
+
+        Returns
+        -------
+        bytes
+            The body of the response
+        """
+
+        if FileIO.cache is not None:
+            body = FileIO.cache.fetch(url, partial(FileIO.__get,
+                                                   budget=budget))
+        else:
+            body = FileIO.__get(url, budget=budget).body
+
+        if FileIO.recorder is not None:
+            FileIO.recorder.save(url, body)
+
+        return body
+
+    @staticmethod
+    def set_recorder(dirname):
+        """ Record a copy of the fetched pages and images in the <dirname>
+            folder, laid out as the website so replay.py can serve it
+
+        Parameters
+        ----------
+        dirname : str
+            The folder of the copy (None: no record)
+        """
+
+        if dirname:
+            FileIO.recorder = Corpus(dirname)
+        else:
+            FileIO.recorder = None
+
+    @staticmethod
+    def set_image_store(dirname, verify=False):
+        """ Keep a single copy of each image in the <dirname> folder and
+            link it into the category folders (instead of downloading
+            the image for each folder and each run)
+
+        Parameters
+        ----------
+        dirname : str
+            The folder where the images are stored (None: no store)
+        verify : bool (default is False)
+            Determine if the sha256 of a stored image is checked before use
+        """
+
+        if dirname:
+            FileIO.image_store = ImageStore(dirname, verify)
+        else:
+            FileIO.image_store = None
+
+    @staticmethod
+    def claim_image(name, url):
+        """ Return the given local image name, or a variant of it if the
+            image store is enabled and the name is already used by another
+            image during this run
+
+        Parameters
+        ----------
+        name : str
+            The wanted path of the local file
+        url : str
+            The internet address of the image
+
+        Returns
+        -------
+        str
+            The path to use for the image
+        """
+
+        if FileIO.image_store is None:
+            return name
+        return FileIO.image_store.claim(name, url)
+
+    @staticmethod
+    def __get(url, headers=None, budget=None):
+        # rate limit, retries and adaptive concurrency (see policy.py)
+        return fetch_policy.get(url, partial(FileIO.__send, budget=budget),
+                                headers)
+
     @staticmethod
-    def connect_with_bs4(url):
+    def __send(url, headers=None, budget=None):
+        # the budget isn't held while waiting before a retry
+        with budget or nullcontext(), metrics.time('fetch') as timer:
+            response = http_session.get(url, headers)
+            timer.size = len(response.body)
+            return response
+
+    @staticmethod
+    def set_parser(parser=None, strain=False):
+        """ Select the parser used to build the BeautifulSoup objects
+
+        Parameters
+        ----------
+        parser : str (default is 'lxml' when installed)
+            The name of the parser ('lxml' or 'html.parser').
+            'html.parser' is used if the requested one isn't installed
+        strain : bool (default is False)
+            Determine if only the parts of the pages used by the scraper
+            are parsed (see the parse_only parameter of connect_with_bs4)
+        """
+
+        parser = parser or DEFAULT_PARSER
+        if parser == 'lxml' and DEFAULT_PARSER != 'lxml':
+            parser = 'html.parser'
+
+        FileIO.parser = parser
+        FileIO.strain = strain
+
+    @staticmethod
+    def parse(html, parse_only=None):
+        """ Parse the given html with the selected parser
+
+        Parameters
+        ----------
+        html : bytes
+            The utf8 encoded html data
+        parse_only : SoupStrainer (default is None)
+            The parts of the page to parse, used if FileIO.strain is True
+
+        Returns
+        -------
+        BeautifulSoup
+            An object containing parsed html data
+        """
+
+        if not FileIO.strain:
+            parse_only = None
+
+        # the raw bytes are given to the parser (no separate decode)
+        with metrics.time('parse'):
+            return BeautifulSoup(html, FileIO.parser, parse_only=parse_only,
+                                 from_encoding='utf8')
+
+    @staticmethod
+    def set_parse_workers(workers):
+        """ Parse the product pages in a pool of processes, so the
+            parsing isn't limited to a single core by the GIL
+            (the parser selected by set_parser is used in the processes,
+            so set_parser must be called first)
+
+        Parameters
+        ----------
+        workers : int
+            The number of parsing processes (None or 0: parse in the
+            scraping threads)
+
+        The processes are started with 'spawn' rather than forked: they
+        are created on the first page parsed, while the fetch and image
+        threads may hold locks (such as the metrics one) that a forked
+        copy of the process could never release.
+        """
+
+        if FileIO.parse_pool is not None:
+            FileIO.parse_pool.shutdown()
+            FileIO.parse_pool = None
+
+        if workers:
+            FileIO.parse_pool = ProcessPoolExecutor(
+                    workers, mp_context=multiprocessing.get_context('spawn'),
+                    initializer=FileIO.set_parser,
+                    initargs=(FileIO.parser, FileIO.strain))
+
+    @staticmethod
+    def run_parser(function, *args):
+        """ Call function(*args) in the parse workers and wait for its
+            result, or call it right away when there are no parse workers
+
+        Parameters
+        ----------
+        function : function
+            A module level function taking and returning plain data
+            (bytes, str, dict...) as they are sent between processes
+        *args
+            The arguments given to the function
+
+        Returns
+        -------
+        The value returned by the function
+        """
+
+        if FileIO.parse_pool is None:
+            return function(*args)
+
+        # the stages measured in the workers aren't reported, so the
+        # whole call (transfers included) is measured here
+        with metrics.time('parse_worker'):
+            return FileIO.parse_pool.submit(function, *args).result()
+
+    @staticmethod
+    def connect_with_bs4(url, parse_only=None, budget=None):
         """ Connect to the given URL, collect the html data
             and return a BeautifulSoup object to work with
 
@@ -228,6 +931,10 @@ class FileIO:
         ----------
         url : str
             The internet address to use in order to collect the data
+        parse_only : SoupStrainer (default is None)
+            The parts of the page to parse, used if FileIO.strain is True
+        budget : BoundedSemaphore (default is None)
+            The request budget of the crawl (see request_budget)
 
         Returns
         -------
@@ -235,11 +942,7 @@ class FileIO:
             An object containing parsed html data
         """
 
-        page = urlopen(url)
-        html = page.read().decode('utf8')
-        soup = BeautifulSoup(html, 'html.parser')
-
-        return soup
+        return FileIO.parse(FileIO.fetch(url, budget), parse_only)
 
     @staticmethod
     @log_error
@@ -297,11 +1000,33 @@ class FileIO:
             The file mode used to open the file (r,r+,w,w+,a,a+,x,x+)
         """
 
-        with open(f"{path}.csv", mode, newline='') as csvfile:
+        with metrics.time('csv'), \
+                open(f"{path}.csv", mode, newline='') as csvfile:
 
             writer = csv.DictWriter(csvfile, fieldnames=fields)
             writer.writerow(data)
 
+    @staticmethod
+    def read(path):
+        """ Read the books information from a given CSV file
+
+        Parameters
+        ----------
+        path : str
+            The path including its name but without the extension to the csv
+
+        Returns
+        -------
+        list
+            The rows of the CSV as dicts (empty if the file doesn't exist)
+        """
+
+        try:
+            with open(f"{path}.csv", 'r', newline='') as csvfile:
+                return list(csv.DictReader(csvfile))
+        except FileNotFoundError:
+            return []
+
     @staticmethod
     def close_category():
         """ move to the parent folder """
@@ -309,17 +1034,273 @@ class FileIO:
 
     @staticmethod
     @log_error
-    def download_image(url, name):
+    def download_image(url, name, journal=None, budget=None, fetch=None):
+        """ Copy the remote image to the local <name> file
 
-        # handling error 403
-        opener = build_opener()
-        opener.addheaders = [('User-Agent', 'Mozilla/5.0 \
-                (Windows NT 6.1; WOW64) AppleWebKit/537.36 \
-                (KHTML, like Gecko) Chrome/36.0.1941.0 Safari/537.36')]
-        install_opener(opener)
+        Parameters
+        ----------
+        url : str
+            The internet address of the image
+        name : str
+            The path of the local file
+        journal : CrawlJournal (default is None)
+            The record of the crawl where the downloaded image is added
+        budget : BoundedSemaphore (default is None)
+            The request budget of the crawl (see request_budget)
+        fetch : function (default is None)
+            The function returning the bytes of the url
+            (default is FileIO.fetch with the given budget)
 
-        try:
-            # copy remote image to local
-            return urlretrieve(url, name)
-        except Exception as e:
-            raise(e)
+        Returns
+        -------
+        str
+            The local file name
+        """
+
+        if fetch is None:
+            fetch = partial(FileIO.fetch, budget=budget)
+
+        with metrics.time('image'):
+            if FileIO.image_store is not None:
+                FileIO.image_store.save(url, name, fetch)
+            else:
+                body = fetch(url)
+
+                with open(name, 'wb') as f:
+                    f.write(body)
+
+        if journal is not None:
+            journal.add_image(name, url)
+
+        return name
+
+
+class CSVWriter:
+    """ The purpose of this class is to write many rows in a CSV file
+        opened only once, the rows being buffered and written by batches
+
+    It can be used as a context manager (the remaining rows are written
+    and the file is closed when leaving the block) and from several
+    threads at the same time.
+
+    Attributes
+    ----------
+    path : str
+        The path including its name but without the extension to the csv
+    fields : list
+        The columns identifiers
+    batch_size : int
+        The number of buffered rows triggering a write
+
+    Methods
+    -------
+    writerow(data)
+        add a row to the buffer (and write the buffer when full)
+    writerows(rows)
+        add several rows to the buffer
+    flush()
+        write the buffered rows to the file
+    close()
+        write the buffered rows and close the file
+    """
+
+    def __init__(self, path, fields, mode='a', batch_size=100):
+        """
+        Parameters
+        ----------
+        path : str
+            The path including its name but without the extension to the csv
+        fields : list
+            The columns identifiers
+        mode : str (default is 'a')
+            The file mode used to open the file (w,w+,a,a+,x,x+).
+            The header is written unless appending to an existing file
+        batch_size : int (default is 100)
+            The number of buffered rows triggering a write
+        """
+
+        self.path = path
+        self.fields = fields
+        self.batch_size = batch_size
+        self._rows = []
+        self._lock = RLock()
+
+        append = mode in ('a', 'a+') and os.path.exists(f"{path}.csv")
+
+        self._file = open(f"{path}.csv", mode, newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=fields)
+
+        if not append:
+            self._writer.writeheader()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def writerow(self, data):
+        """ Add the given row (dict) to the buffer """
+        with self._lock:
+            self._rows.append(data)
+            if len(self._rows) >= self.batch_size:
+                self.flush()
+
+    def writerows(self, rows):
+        """ Add the given rows (dicts) to the buffer """
+        for data in rows:
+            self.writerow(data)
+
+    def flush(self):
+        """ Write the buffered rows to the file """
+        with self._lock, metrics.time('csv'):
+            self._writer.writerows(self._rows)
+            self._rows = []
+            self._file.flush()
+
+    def close(self):
+        """ Write the buffered rows and close the file """
+        with self._lock:
+            if not self._file.closed:
+                self.flush()
+                self._file.close()
+
+
+class SQLiteWriter:
+    """ The purpose of this class is to write many rows in a table of a
+        SQLite database, the rows being buffered and inserted by batches
+        (one executemany in one transaction per batch)
+
+    It has the same methods as CSVWriter, so it can be used as a context
+    manager and from several threads at the same time. The rows are
+    inserted or replaced according to the key column.
+
+    Attributes
+    ----------
+    path : str
+        The path of the database file
+    table : str
+        The name of the table
+    fields : list
+        The columns identifiers
+    batch_size : int
+        The number of buffered rows triggering an insert
+
+    Methods
+    -------
+    writerow(data)
+        add a row to the buffer (and insert the buffer when full)
+    writerows(rows)
+        add several rows to the buffer
+    flush()
+        insert the buffered rows in the table
+    read(**where)
+        return the rows matching the given column values
+    close()
+        insert the buffered rows and close the database
+    """
+
+    def __init__(self, path, fields, table='books', key=None, indexes=(),
+                 types=None, batch_size=500):
+        """
+        Parameters
+        ----------
+        path : str
+            The path of the database file (created if needed)
+        fields : list
+            The columns identifiers
+        table : str (default is 'books')
+            The name of the table (created if needed)
+        key : str (default is None)
+            The column identifying the rows (primary key)
+        indexes : list (default is empty)
+            The other columns to index
+        types : dict (default is None)
+            The SQL type of the columns (default is TEXT)
+        batch_size : int (default is 500)
+            The number of buffered rows triggering an insert
+        """
+
+        self.path = path
+        self.table = table
+        self.fields = list(fields)
+        self.batch_size = batch_size
+        self._rows = []
+        self._lock = RLock()
+
+        types = types or {}
+        columns = ', '.join(
+                f"{field} {types.get(field, 'TEXT')}"
+                f"{' PRIMARY KEY' if field == key else ''}"
+                for field in self.fields)
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.execute(f"CREATE TABLE IF NOT EXISTS {table} ({columns})")
+            for field in indexes:
+                self._db.execute(f"CREATE INDEX IF NOT EXISTS "
+                                 f"{table}_{field} ON {table} ({field})")
+
+        self._insert = f"INSERT OR REPLACE INTO {table} " \
+                       f"({', '.join(self.fields)}) " \
+                       f"VALUES ({', '.join('?' * len(self.fields))})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def writerow(self, data):
+        """ Add the given row (dict) to the buffer """
+        with self._lock:
+            self._rows.append(tuple(data.get(field) for field in self.fields))
+            if len(self._rows) >= self.batch_size:
+                self.flush()
+
+    def writerows(self, rows):
+        """ Add the given rows (dicts) to the buffer """
+        for data in rows:
+            self.writerow(data)
+
+    def flush(self):
+        """ Insert the buffered rows in the table (in one transaction) """
+        with self._lock:
+            if self._rows:
+                with metrics.time('sqlite'), self._db:
+                    self._db.executemany(self._insert, self._rows)
+                self._rows = []
+
+    def read(self, **where):
+        """ Return the rows matching the given column values as dicts of
+            strings ('' for the missing values), as read from a CSV file
+
+        Parameters
+        ----------
+        **where
+            The values of the selected rows (column=value)
+
+        Returns
+        -------
+        list
+            The rows (dicts)
+        """
+
+        query = f"SELECT {', '.join(self.fields)} FROM {self.table}"
+        if where:
+            query += " WHERE " + ' AND '.join(f"{k} = ?" for k in where)
+
+        with self._lock:
+            self.flush()
+            rows = self._db.execute(query, tuple(where.values())).fetchall()
+
+        return [{field: '' if value is None else str(value)
+                 for field, value in zip(self.fields, row)} for row in rows]
+
+    def close(self):
+        """ Insert the buffered rows and close the database """
+        with self._lock:
+            if self._db is not None:
+                self.flush()
+                self._db.close()
+                self._db = None